@@ -1,16 +1,22 @@
 import re
+from typing import Optional
 from urllib.parse import urljoin, quote_plus
 
 import requests
+from requests.exceptions import RequestException
 
+from ..models import Work, User, Post
 from ..utils import get_random_ua
+from ..utils.jsons import response_json
+from ..utils.session import RetryPolicy
 
 SKEB_WEBISTE = 'https://skeb.jp'
 
 
 class SkebClient:
 
-    def __init__(self):
+    def __init__(self, retry_policy: Optional[RetryPolicy] = None):
+        self._retry_policy = retry_policy or RetryPolicy(max_retries=8, base_delay=1.0, max_delay=60.0)
         self._session = requests.session()
         self._session.headers.update({
             'Referer': 'https://skeb.jp',
@@ -19,9 +25,16 @@ class SkebClient:
             "Accept": "application/json, text/plain, */*",
         })
 
-    def _get(self, url, params=None):
+    def _get(self, url, params=None, factory=None):
+        retry_state = self._retry_policy.start()
         while True:
-            resp = self._session.get(urljoin(SKEB_WEBISTE, url), params=params or {})
+            try:
+                resp = self._session.get(urljoin(SKEB_WEBISTE, url), params=params or {})
+            except RequestException as err:
+                if retry_state.retry(error=err):
+                    continue
+                raise
+
             if not resp.ok and resp.status_code == 429:
                 if 'request_key' in resp.cookies:
                     continue
@@ -32,10 +45,12 @@ class SkebClient:
                     })
                     continue
 
+            if retry_state.retry(response=resp):
+                continue
             resp.raise_for_status()
-            return resp.json()
+            return response_json(resp, factory=factory)
 
-    def get_page(self, offset: int = 0, limit: int = 90):
+    def get_page(self, offset: int = 0, limit: int = 90, typed: bool = False):
         return self._get(
             '/api/works',
             {
@@ -43,63 +58,67 @@ class SkebClient:
                 'genre': 'art',
                 'offset': offset,
                 'limit': limit,
-            }
+            },
+            factory=Work.from_json if typed else None,
         )
 
-    def iter_art_pages(self, limit: int = 90):
+    def iter_art_pages(self, limit: int = 90, typed: bool = False):
         offset = 0
         while True:
-            items = self.get_page(offset, limit)
+            items = self.get_page(offset, limit, typed)
             yield from items
 
             if not items:
                 break
             offset += len(items)
 
-    def get_user_page(self, offset: int = 0, limit: int = 90, sort: str = 'popularity'):
+    def get_user_page(self, offset: int = 0, limit: int = 90, sort: str = 'popularity', typed: bool = False):
         return self._get(
             '/api/users',
             {
                 'sort': sort,
                 'offset': offset,
                 'limit': limit,
-            }
+            },
+            factory=User.from_json if typed else None,
         )
 
-    def iter_user_pages(self, limit: int = 90, sort: str = 'popularity'):
+    def iter_user_pages(self, limit: int = 90, sort: str = 'popularity', typed: bool = False):
         # sort : popularity / date / request_masters / first_requesters
         offset = 0
         while True:
-            items = self.get_user_page(offset, limit, sort)
+            items = self.get_user_page(offset, limit, sort, typed)
             yield from items
 
             if not items:
                 break
             offset += len(items)
 
-    def get_user_info(self, screen_name: str):
-        return self._get(f'/api/users/{quote_plus(screen_name)}')
+    def get_user_info(self, screen_name: str, typed: bool = False):
+        return self._get(f'/api/users/{quote_plus(screen_name)}', factory=User.from_json if typed else None)
 
-    def get_work_page(self, screen_name: str, role: str = 'client', sort='date', offset: int = 0):
+    def get_work_page(self, screen_name: str, role: str = 'client', sort='date', offset: int = 0,
+                      typed: bool = False):
         return self._get(
             f'/api/users/{quote_plus(screen_name)}/works',
             {
                 'role': role,
                 'sort': sort,
                 'offset': offset,
-            }
+            },
+            factory=Work.from_json if typed else None,
         )
 
-    def iter_work_pages(self, screen_name: str, role: str = 'client', sort='date'):
+    def iter_work_pages(self, screen_name: str, role: str = 'client', sort='date', typed: bool = False):
         # role : client/creator
         offset = 0
         while True:
-            items = self.get_work_page(screen_name, role, sort, offset)
+            items = self.get_work_page(screen_name, role, sort, offset, typed)
             yield from items
 
             if not items:
                 break
             offset += len(items)
 
-    def get_post(self, username, post_id):
-        return self._get(f'/api/users/{username}/works/{post_id}')
+    def get_post(self, username, post_id, typed: bool = False):
+        return self._get(f'/api/users/{username}/works/{post_id}', factory=Post.from_json if typed else None)
@@ -0,0 +1,2 @@
+from .tar import TarIndex, TarMember, TarMemberHashError, LocalTarReader, RemoteTarReader, hf_resolve_url
+from .view import PackDataset
@@ -0,0 +1,244 @@
+"""
+Readers of the published tar packs, with the member index JSON files created along with them
+(``{"filesize": ..., "hash": ..., "hash_lfs": ..., "files": {name: {"offset": ..., "size": ..., "sha256": ...}}}``).
+
+A single member can be read from a local copy of the pack with :class:`LocalTarReader` by ``mmap``,
+or from the remote pack with :class:`RemoteTarReader` by an HTTP range request, without downloading the
+whole pack.
+"""
+import hashlib
+import json
+import mmap
+import os
+from typing import Optional, Dict, List, NamedTuple, Union
+from urllib.parse import quote
+
+import requests
+
+from ..utils.jsons import response_json
+from ..utils.session import srequest, get_requests_session, RetryPolicy
+
+DEFAULT_HF_ENDPOINT = 'https://huggingface.co'
+
+
+class TarMemberHashError(IOError):
+    """
+    Raised when the content of a member does not match the hash in the index.
+    """
+    pass
+
+
+class TarMember(NamedTuple):
+    name: str
+    offset: int
+    size: int
+    sha256: Optional[str] = None
+
+
+def _verify(member: TarMember, data) -> None:
+    if member.sha256 is not None:
+        actual = hashlib.sha256(data).hexdigest()
+        if actual != member.sha256:
+            raise TarMemberHashError(f'Hash of member {member.name!r} not match, '
+                                     f'{member.sha256!r} expected but {actual!r} found.')
+
+
+class TarIndex:
+    """
+    Member index of a tar pack.
+
+    :param index: The loaded index JSON data.
+    """
+
+    def __init__(self, index: dict):
+        self.filesize: Optional[int] = index.get('filesize')
+        self.hash: Optional[str] = index.get('hash')
+        self.hash_lfs: Optional[str] = index.get('hash_lfs')
+        self._members: Dict[str, TarMember] = {
+            name: TarMember(name, info['offset'], info['size'], info.get('sha256'))
+            for name, info in index['files'].items()
+        }
+
+    @classmethod
+    def from_file(cls, index_file: str) -> 'TarIndex':
+        with open(index_file, 'r') as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_url(cls, url: str, session: Optional[requests.Session] = None,
+                 retry_policy: Optional[RetryPolicy] = None, **kwargs) -> 'TarIndex':
+        session = session or get_requests_session()
+        return cls(response_json(srequest(session, 'GET', url, retry_policy=retry_policy, **kwargs)))
+
+    @property
+    def files(self) -> List[str]:
+        return list(self._members.keys())
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._members
+
+    def __getitem__(self, name: str) -> TarMember:
+        try:
+            return self._members[name]
+        except KeyError:
+            raise KeyError(f'Member {name!r} not found in tar index.') from None
+
+
+def _default_index_file(tar_file: str) -> str:
+    return os.path.splitext(tar_file)[0] + '.json'
+
+
+class LocalTarReader:
+    """
+    Reader of a local tar pack, the members are read by ``mmap`` without extracting.
+
+    Example::
+
+        >>> with LocalTarReader('packs/pack_xxx.tar') as reader:
+        ...     data = reader.read('hqimage/1.png')
+
+    :param tar_file: Path of the tar file.
+    :param index: The index, or path of the index JSON file. The JSON file with the same name is used by default.
+    """
+
+    def __init__(self, tar_file: str, index: Union[TarIndex, str, None] = None):
+        self.tar_file = tar_file
+        if not isinstance(index, TarIndex):
+            index = TarIndex.from_file(index or _default_index_file(tar_file))
+        self.index = index
+
+        self._file = open(tar_file, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file cannot be mapped
+            self._mmap = None
+
+    def view(self, name: str, verify: bool = False) -> memoryview:
+        """
+        Zero-copy view of the member. The views should be released before the reader is closed.
+        """
+        member = self.index[name]
+        if member.size == 0:
+            view = memoryview(b'')
+        else:
+            view = memoryview(self._mmap)[member.offset:member.offset + member.size]
+        if verify:
+            _verify(member, view)
+        return view
+
+    def read(self, name: str, verify: bool = True) -> bytes:
+        """
+        Read the member, the hash is verified when ``verify`` is ``True``.
+
+        :raises TarMemberHashError: When the hash not match.
+        """
+        return self.view(name, verify=verify).tobytes()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def hf_resolve_url(repo_id: str, filename: str, repo_type: str = 'dataset', revision: str = 'main',
+                   endpoint: Optional[str] = None) -> str:
+    """
+    Resolve url of the file in huggingface repository, ``HF_ENDPOINT`` in environment is used as the
+    endpoint when given, so the mirrors can be used.
+    """
+    endpoint = (endpoint or os.environ.get('HF_ENDPOINT') or DEFAULT_HF_ENDPOINT).rstrip('/')
+    prefix = {'dataset': 'datasets/', 'space': 'spaces/', 'model': ''}[repo_type]
+    return f'{endpoint}/{prefix}{repo_id}/resolve/{quote(revision, safe="")}/{quote(filename)}'
+
+
+class RemoteTarReader:
+    """
+    Reader of a remote tar pack, each member is fetched by an HTTP range request.
+
+    Example::
+
+        >>> reader = RemoteTarReader.from_hf('deepghs/skeb_index', 'packs/pack_xxx.tar')
+        >>> data = reader.read('hqimage/1.png')
+
+    :param url: Url of the tar file, the server should support range requests.
+    :param index: The index of the tar file.
+    :param session: The session to use.
+    :param headers: Extra headers of the requests, such as ``Authorization``.
+    :param retry_policy: The retry policy.
+    """
+
+    def __init__(self, url: str, index: TarIndex, session: Optional[requests.Session] = None,
+                 headers: Optional[Dict[str, str]] = None, retry_policy: Optional[RetryPolicy] = None):
+        self.url = url
+        self.index = index
+        self.session = session or get_requests_session()
+        self.headers = dict(headers or {})
+        self.retry_policy = retry_policy
+
+    @classmethod
+    def from_hf(cls, repo_id: str, archive_file: str, repo_type: str = 'dataset', revision: str = 'main',
+                token: Optional[str] = None, endpoint: Optional[str] = None,
+                session: Optional[requests.Session] = None,
+                retry_policy: Optional[RetryPolicy] = None) -> 'RemoteTarReader':
+        """
+        Open a tar pack in huggingface repository, its index JSON file should be placed with the same name.
+
+        :param token: Huggingface token, ``HF_TOKEN`` in environment is used by default.
+        """
+        session = session or get_requests_session()
+        token = token or os.environ.get('HF_TOKEN')
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        index = TarIndex.from_url(
+            hf_resolve_url(repo_id, _default_index_file(archive_file), repo_type, revision, endpoint),
+            session=session, retry_policy=retry_policy, headers=headers,
+        )
+        return cls(hf_resolve_url(repo_id, archive_file, repo_type, revision, endpoint), index,
+                   session=session, headers=headers, retry_policy=retry_policy)
+
+    def read(self, name: str, verify: bool = True) -> bytes:
+        """
+        Read the member by a range request, the hash is verified when ``verify`` is ``True``.
+
+        :raises TarMemberHashError: When the hash not match.
+        :raises requests.exceptions.HTTPError: When the range request is not supported by the server.
+        """
+        member = self.index[name]
+        if member.size == 0:
+            return b''
+
+        resp = srequest(
+            self.session, 'GET', self.url, retry_policy=self.retry_policy,
+            headers={**self.headers, 'Range': f'bytes={member.offset}-{member.offset + member.size - 1}'},
+        )
+        if resp.status_code != 206:
+            raise requests.exceptions.HTTPError(f'Range request not supported for {self.url!r}, '
+                                                f'status code {resp.status_code!r} found.', response=resp)
+        data = resp.content
+        if len(data) != member.size:
+            raise requests.exceptions.HTTPError(f'Member {name!r} is not of expected size, '
+                                                f'{member.size} expected but {len(data)} found.', response=resp)
+        if verify:
+            _verify(member, data)
+        return data
+
+    def download(self, name: str, filename: str, verify: bool = True) -> str:
+        """
+        Download the member to local file.
+        """
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = self.read(name, verify=verify)
+        with open(filename, 'wb') as f:
+            f.write(data)
+        return filename
@@ -0,0 +1,160 @@
+"""
+Random-access view of the index repository, i.e. ``table.parquet`` with the tar packs in ``packs/``.
+"""
+import os
+from typing import Optional, Dict, Iterator, Tuple, Union, List
+
+from .tar import LocalTarReader, TarMember
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except (ImportError, ModuleNotFoundError):  # pragma: no cover
+    np, pa, pc, pq = None, None, None, None
+
+
+class PackDataset:
+    """
+    Random-access view of a local copy of the index repository.
+
+    ``table.parquet`` is memory-mapped with pyarrow, and the ``archive_file`` / ``file_in_archive`` of
+    each row are resolved to the byte range in the tar pack with the pack index JSON, so the bytes of
+    a file can be accessed as a zero-copy ``memoryview`` of the memory-mapped pack.
+
+    Example::
+
+        >>> with PackDataset('skeb_index') as dataset:
+        ...     indices = dataset.filter(group='hqimage', min_width=1024)
+        ...     for row, data in dataset.iter_files(indices[:10]):
+        ...         print(row['filename'], len(data))
+
+    :param directory: Directory of the index repository.
+    :param table_file: Filename of the table in the directory.
+    """
+
+    def __init__(self, directory: str, table_file: str = 'table.parquet'):
+        if pa is None:  # pragma: no cover
+            raise ImportError('pyarrow is not installed, please install it with `pip install pyskeb[dataset]`.')
+        self.directory = directory
+        self.table: 'pa.Table' = pq.read_table(os.path.join(directory, table_file), memory_map=True)
+        self._readers: Dict[str, LocalTarReader] = {}
+        self._id_to_index: Optional[Dict[int, int]] = None
+        self._archive_files: Optional[List[str]] = None
+        self._files_in_archive: Optional[List[str]] = None
+
+    def __len__(self):
+        return self.table.num_rows
+
+    @property
+    def columns(self) -> List[str]:
+        return self.table.column_names
+
+    def row(self, index: int) -> dict:
+        """
+        Get the row by its position in the table.
+        """
+        if not 0 <= index < len(self):
+            raise IndexError(f'Row index {index!r} out of range.')
+        return self.table.slice(index, 1).to_pylist()[0]
+
+    def index_of(self, id_: int) -> int:
+        """
+        Get the position of the row with ``id`` in the table.
+        """
+        if self._id_to_index is None:
+            self._id_to_index = {v: i for i, v in enumerate(self.table.column('id').to_numpy().tolist())}
+        try:
+            return self._id_to_index[id_]
+        except KeyError:
+            raise KeyError(f'Id {id_!r} not found in table.') from None
+
+    def _reader(self, archive_file: str) -> LocalTarReader:
+        if archive_file not in self._readers:
+            self._readers[archive_file] = LocalTarReader(os.path.join(self.directory, archive_file))
+        return self._readers[archive_file]
+
+    def _location(self, index: int) -> Tuple[str, str]:
+        # the python lists of the columns are built once, much faster than slicing the table per access
+        if self._archive_files is None:
+            self._archive_files = self.table.column('archive_file').to_pylist()
+            self._files_in_archive = self.table.column('file_in_archive').to_pylist()
+        return self._archive_files[index], self._files_in_archive[index]
+
+    def member(self, index: int) -> TarMember:
+        """
+        Get the location of the file in its tar pack.
+        """
+        archive_file, file_in_archive = self._location(index)
+        return self._reader(archive_file).index[file_in_archive]
+
+    def view(self, index: int, verify: bool = False) -> memoryview:
+        """
+        Zero-copy view of the file bytes. The views should be released before the dataset is closed.
+        """
+        archive_file, file_in_archive = self._location(index)
+        return self._reader(archive_file).view(file_in_archive, verify=verify)
+
+    def read(self, index: int, verify: bool = True) -> bytes:
+        archive_file, file_in_archive = self._location(index)
+        return self._reader(archive_file).read(file_in_archive, verify=verify)
+
+    def filter(self, group: Union[str, List[str], None] = None, mimetype: Optional[str] = None,
+               min_width: Optional[int] = None, min_height: Optional[int] = None,
+               pack_id: Optional[str] = None) -> 'np.ndarray':
+        """
+        Positions of the rows matching all the given conditions, computed over the columns vectorized.
+
+        :param group: Group name or names, such as ``hqimage``.
+        :param mimetype: Mimetype, or prefix of it when ends with ``/``, such as ``image/``.
+        :param min_width: Min width of the images.
+        :param min_height: Min height of the images.
+        :param pack_id: Id of the pack.
+        """
+        mask = pa.array(np.ones(len(self), dtype=bool))
+        if group is not None:
+            groups = [group] if isinstance(group, str) else list(group)
+            mask = pc.and_(mask, pc.is_in(self.table.column('group'), value_set=pa.array(groups)))
+        if mimetype is not None:
+            if mimetype.endswith('/'):
+                mask = pc.and_(mask, pc.starts_with(self.table.column('mimetype'), mimetype))
+            else:
+                mask = pc.and_(mask, pc.equal(self.table.column('mimetype'), mimetype))
+        if min_width is not None:
+            mask = pc.and_(mask, pc.greater_equal(self.table.column('width'), min_width))
+        if min_height is not None:
+            mask = pc.and_(mask, pc.greater_equal(self.table.column('height'), min_height))
+        if pack_id is not None:
+            mask = pc.and_(mask, pc.equal(self.table.column('pack_id'), pack_id))
+        mask = pc.fill_null(mask, False)
+        return np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+
+    def sample(self, n: int, indices: Optional['np.ndarray'] = None, seed: Optional[int] = None) -> 'np.ndarray':
+        """
+        Sample ``n`` positions without replacement, from ``indices`` (such as the result of :meth:`filter`)
+        or the whole table.
+        """
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices)
+        return np.random.default_rng(seed).choice(indices, size=min(n, len(indices)), replace=False)
+
+    def iter_files(self, indices: Optional['np.ndarray'] = None,
+                   verify: bool = False) -> Iterator[Tuple[dict, memoryview]]:
+        """
+        Iterate the rows and the zero-copy views of their files.
+        """
+        indices = range(len(self)) if indices is None else indices
+        for index in indices:
+            index = int(index)
+            yield self.row(index), self.view(index, verify=verify)
+
+    def close(self):
+        for reader in self._readers.values():
+            reader.close()
+        self._readers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
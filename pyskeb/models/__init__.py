@@ -0,0 +1 @@
+from .skeb import parse_work_path, Work, User, Post
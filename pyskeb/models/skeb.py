@@ -0,0 +1,125 @@
+import re
+from typing import Tuple, Optional
+
+_WORK_PATH_PATTERN = re.compile(r'^/?@(?P<username>[\s\S]+?)/works/(?P<work_id>\d+?)/?$')
+
+
+def parse_work_path(path: str) -> Tuple[str, int]:
+    """
+    Parse the username and work id from the work path.
+
+    Example:
+    ```python
+    >>> parse_work_path('/@username/works/12')
+    ('username', 12)
+    ```
+
+    :param path: Path of the work, such as ``/@username/works/12``.
+    :type path: str
+    :returns: Username and work id.
+    :rtype: Tuple[str, int]
+    :raises ValueError: When the path is not a work path.
+    """
+    matching = _WORK_PATH_PATTERN.fullmatch(path)
+    if not matching:
+        raise ValueError(f'Invalid work path - {path!r}.')
+    return matching.group('username'), int(matching.group('work_id'))
+
+
+class _Struct:
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return type(self) == type(other) and \
+            all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} ' \
+               f'{", ".join(f"{name}: {getattr(self, name)!r}" for name in self.__slots__[:3])}>'
+
+
+class Work(_Struct):
+    """
+    Work item in the listings, such as the items of ``/api/works`` and ``/api/users/<name>/works``.
+    The username and work id are parsed from ``path`` when decoding.
+    """
+    __slots__ = (
+        'username', 'work_id', 'path', 'genre', 'nsfw', 'private',
+        'creator_id', 'client_id', 'thumbnail_url', 'body',
+    )
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'Work':
+        username, work_id = parse_work_path(data['path'])
+        return cls(
+            username=username,
+            work_id=work_id,
+            path=data['path'],
+            genre=data.get('genre'),
+            nsfw=bool(data.get('nsfw')),
+            private=bool(data.get('private')),
+            creator_id=data.get('creator_id'),
+            client_id=data.get('client_id'),
+            thumbnail_url=(data.get('thumbnail_image_urls') or {}).get('src'),
+            body=data.get('body'),
+        )
+
+
+class User(_Struct):
+    """
+    User item, such as the items of ``/api/users`` and the result of ``/api/users/<name>``.
+    """
+    __slots__ = (
+        'screen_name', 'id', 'name', 'creator', 'acceptable', 'nsfw_acceptable',
+        'avatar_url', 'received_works_count',
+    )
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'User':
+        return cls(
+            screen_name=data['screen_name'],
+            id=data.get('id'),
+            name=data.get('name'),
+            creator=bool(data.get('creator')),
+            acceptable=bool(data.get('acceptable')),
+            nsfw_acceptable=bool(data.get('nsfw_acceptable')),
+            avatar_url=data.get('avatar_url'),
+            received_works_count=data.get('received_works_count'),
+        )
+
+
+def _screen_name(data: Optional[dict]) -> Optional[str]:
+    return data.get('screen_name') if data else None
+
+
+class Post(_Struct):
+    """
+    Detail of a work, the result of ``/api/users/<name>/works/<id>``.
+    """
+    __slots__ = (
+        'username', 'work_id', 'path', 'genre', 'nsfw', 'body', 'source_body',
+        'creator_screen_name', 'client_screen_name', 'preview_urls',
+    )
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'Post':
+        username, work_id = parse_work_path(data['path'])
+        return cls(
+            username=username,
+            work_id=work_id,
+            path=data['path'],
+            genre=data.get('genre'),
+            nsfw=bool(data.get('nsfw')),
+            body=data.get('body') or '',
+            source_body=data.get('source_body') or '',
+            creator_screen_name=_screen_name(data.get('creator')),
+            client_screen_name=_screen_name(data.get('client')),
+            preview_urls=tuple(item['url'] for item in data.get('previews') or [] if item.get('url')),
+        )
@@ -1,2 +1,5 @@
 from .download import download_file
-from .session import get_random_ua, get_random_mobile_ua, TimeoutHTTPAdapter, get_requests_session
+from .metrics import RequestMetrics, enable_request_metrics, disable_request_metrics, get_request_metrics
+from .jsons import json_loads, response_json, get_json_backend, set_json_backend
+from .session import get_random_ua, get_random_mobile_ua, TimeoutHTTPAdapter, get_requests_session, ProxyPool, \
+    RetryPolicy
@@ -1,11 +1,12 @@
 import os
 from contextlib import contextmanager
+from typing import Optional
 
 import pyrfc6266
 import requests
 from tqdm.auto import tqdm
 
-from .session import srequest, get_requests_session
+from .session import srequest, get_requests_session, RetryPolicy
 
 
 class _FakeClass:
@@ -24,9 +25,9 @@ def _with_tqdm(expected_size, desc, silent: bool = False):
 
 def download_file(url, filename=None, output_directory=None,
                   expected_size: int = None, desc=None, session=None, silent: bool = False,
-                  **kwargs):
+                  retry_policy: Optional[RetryPolicy] = None, chunk_size: int = 1024, **kwargs):
     session = session or get_requests_session()
-    response = srequest(session, 'GET', url, stream=True, allow_redirects=True, **kwargs)
+    response = srequest(session, 'GET', url, stream=True, allow_redirects=True, retry_policy=retry_policy, **kwargs)
     expected_size = expected_size or response.headers.get('Content-Length', None)
     if filename is None:
         diso = response.headers.get('Content-Disposition')
@@ -44,7 +45,7 @@ def download_file(url, filename=None, output_directory=None,
 
     with open(filename, 'wb') as f:
         with _with_tqdm(expected_size, desc, silent) as pbar:
-            for chunk in response.iter_content(chunk_size=1024):
+            for chunk in response.iter_content(chunk_size=chunk_size):
                 f.write(chunk)
                 pbar.update(len(chunk))
 
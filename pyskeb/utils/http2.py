@@ -0,0 +1,243 @@
+"""
+HTTP/2 transport for requests sessions, based on `httpx <https://www.python-httpx.org/>`_.
+
+Install it with ``pip install pyskeb[http2]``.
+"""
+import os
+import ssl
+from http.client import HTTPMessage
+from threading import Lock
+from typing import Optional, Dict, Tuple
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .metrics import RequestMetrics, get_request_metrics
+from .session import DEFAULT_TIMEOUT
+
+try:
+    import httpx
+except (ImportError, ModuleNotFoundError):  # pragma: no cover
+    httpx = None
+
+
+class _OriginalResponse:
+    def __init__(self, msg: HTTPMessage):
+        self.msg = msg
+
+
+class _HttpxRawResponse:
+    """
+    File-like raw response for :class:`requests.Response`, wrapping a streaming :class:`httpx.Response`.
+    """
+
+    def __init__(self, response: 'httpx.Response'):
+        self._response = response
+        msg = HTTPMessage()
+        for key, value in response.headers.multi_items():
+            msg[key] = value
+        self._original_response = _OriginalResponse(msg)
+        self._buffer = b''
+        self._iter = None
+
+    def stream(self, chunk_size: int = 1024, decode_content: bool = True):
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        except httpx.HTTPError as err:
+            raise requests.exceptions.ChunkedEncodingError(err)
+        finally:
+            self.close()
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        if self._iter is None:
+            self._iter = self._response.iter_bytes()
+        while amt is None or len(self._buffer) < amt:
+            try:
+                self._buffer += next(self._iter)
+            except StopIteration:
+                break
+            except httpx.HTTPError as err:
+                raise requests.exceptions.ChunkedEncodingError(err)
+
+        if amt is None:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self):
+        self._response.close()
+
+    def release_conn(self):
+        self.close()
+
+
+def _to_httpx_timeout(timeout) -> 'httpx.Timeout':
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    else:
+        return httpx.Timeout(timeout)
+
+
+def _to_ssl_verify(verify, cert=None):
+    # requests gives the path of ca bundle and client certificate, which are deprecated in httpx
+    if isinstance(verify, str):
+        if os.path.isdir(verify):
+            context = ssl.create_default_context(capath=verify)
+        else:
+            context = ssl.create_default_context(cafile=verify)
+    elif cert is None:
+        return verify
+    else:
+        context = ssl.create_default_context()
+        if not verify:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+
+    if cert is not None:
+        if isinstance(cert, str):
+            context.load_cert_chain(cert)
+        else:
+            context.load_cert_chain(*cert)
+    return context
+
+
+def _to_requests_error(err: Exception, request: requests.PreparedRequest) -> requests.RequestException:
+    if isinstance(err, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(err, request=request)
+    elif isinstance(err, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(err, request=request)
+    elif isinstance(err, httpx.ProxyError):
+        return requests.exceptions.ProxyError(err, request=request)
+    elif isinstance(err, httpx.TransportError):
+        return requests.exceptions.ConnectionError(err, request=request)
+    else:
+        return requests.exceptions.RequestException(err, request=request)
+
+
+class HttpxHTTPAdapter(BaseAdapter):
+    """
+    Transport adapter which sends the requests of a :class:`requests.Session` through httpx with HTTP/2,
+    so the concurrent small requests to the same host are multiplexed on a few connections.
+
+    It has the same default timeout semantics as :class:`pyskeb.utils.TimeoutHTTPAdapter`. Redirects,
+    cookies and headers are still handled by the requests session. The responses are always streamed
+    from httpx, ``stream=False`` is handled by the session itself.
+
+    Usage:
+    ```python
+    session = requests.Session()
+    adapter = HttpxHTTPAdapter(timeout=10, pool_maxsize=8)
+    session.mount('https://', adapter)
+    ```
+
+    :param timeout: The default timeout value in seconds. (default: 60)
+    :type timeout: float
+    :param max_retries: The number of retries on connection failures. (default: 0)
+    :type max_retries: int
+    :param pool_maxsize: The maximum number of connections of each client. (default: 32)
+    :type pool_maxsize: int
+    :param http2: Whether to enable HTTP/2. (default: True)
+    :type http2: bool
+    :param metrics: Metrics to record the requests, the enabled one of :func:`pyskeb.utils.enable_request_metrics`
+        is used when not given. (default: None)
+    :type metrics: Optional[RequestMetrics]
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, max_retries: int = 0, pool_maxsize: int = 32,
+                 http2: bool = True, metrics: Optional[RequestMetrics] = None):
+        if httpx is None:  # pragma: no cover
+            raise ImportError('httpx is not installed, please install it with `pip install pyskeb[http2]`.')
+        super().__init__()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_maxsize = pool_maxsize
+        self.http2 = http2
+        self.metrics = metrics
+        self._clients: Dict[Tuple[Optional[str], object, object], 'httpx.Client'] = {}
+        self._lock = Lock()
+
+    def _get_client(self, proxy: Optional[str], verify, cert=None) -> 'httpx.Client':
+        if cert is not None and not isinstance(cert, str):
+            cert = tuple(cert)
+        key = (proxy, verify, cert)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = httpx.Client(
+                    follow_redirects=False,
+                    trust_env=False,
+                    transport=httpx.HTTPTransport(
+                        http2=self.http2,
+                        verify=_to_ssl_verify(verify, cert),
+                        proxy=proxy,
+                        retries=self.max_retries,
+                        limits=httpx.Limits(
+                            max_connections=self.pool_maxsize,
+                            max_keepalive_connections=self.pool_maxsize,
+                        ),
+                    ),
+                )
+            return self._clients[key]
+
+    def send(self, request: requests.PreparedRequest, stream=False, timeout=None, verify=True, cert=None,
+             proxies=None) -> requests.Response:
+        """
+        Sends a request with httpx, using the default timeout value when not given.
+
+        :param request: The request to send.
+        :type request: PreparedRequest
+        :returns: The response from the request.
+        :rtype: Response
+        """
+        if timeout is None:
+            timeout = self.timeout
+        scheme = request.url.split(':', maxsplit=1)[0].lower()
+        proxy = (proxies or {}).get(scheme) or (proxies or {}).get('all')
+        client = self._get_client(proxy, verify, cert)
+        metrics = self.metrics or get_request_metrics()
+        if metrics is None:
+            return self._send(client, request, timeout)
+
+        # the stream of the raw response does not read through ``read``
+        with metrics.measure(request.method, request.url, body_methods=('read', 'stream')) as holder:
+            holder.append(self._send(client, request, timeout))
+        return holder[0]
+
+    def _send(self, client: 'httpx.Client', request: requests.PreparedRequest, timeout) -> requests.Response:
+        try:
+            httpx_request = client.build_request(
+                method=request.method,
+                url=request.url,
+                headers=list(request.headers.items()),
+                content=request.body,
+                timeout=_to_httpx_timeout(timeout),
+            )
+            httpx_response = client.send(httpx_request, stream=True)
+        except httpx.HTTPError as err:
+            raise _to_requests_error(err, request)
+
+        return self.build_response(request, httpx_response)
+
+    def build_response(self, request: requests.PreparedRequest, httpx_response: 'httpx.Response') \
+            -> requests.Response:
+        response = requests.Response()
+        response.status_code = httpx_response.status_code
+        response.headers = CaseInsensitiveDict(httpx_response.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _HttpxRawResponse(httpx_response)
+        response.reason = httpx_response.reason_phrase
+        response.url = request.url
+        extract_cookies_to_jar(response.cookies, request, response.raw)
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
@@ -0,0 +1,139 @@
+"""
+Pluggable JSON decoding for the API responses.
+
+`orjson <https://github.com/ijl/orjson>`_ or `msgspec <https://jcristharif.com/msgspec/>`_ is used when
+installed, otherwise the stdlib :mod:`json` is used. The backend can be forced with the environment variable
+``PYSKEB_JSON_BACKEND``, or with :func:`set_json_backend`.
+"""
+import json
+import os
+from typing import Optional, Callable, Union, Any, Dict, List
+
+import requests
+
+_LOADERS: Dict[str, Callable[[Union[bytes, str]], Any]] = {'json': json.loads}
+_ERRORS: List[type] = [ValueError]
+
+try:
+    import orjson
+except (ImportError, ModuleNotFoundError):  # pragma: no cover
+    orjson = None
+else:
+    _LOADERS['orjson'] = orjson.loads
+
+try:
+    import msgspec
+except (ImportError, ModuleNotFoundError):  # pragma: no cover
+    msgspec = None
+else:
+    _LOADERS['msgspec'] = msgspec.json.decode
+    _ERRORS.append(msgspec.DecodeError)
+
+_PRIORITY = ['orjson', 'msgspec', 'json']
+
+
+def get_json_backends() -> List[str]:
+    """
+    Get the names of available JSON backends, the fastest one first.
+
+    :return: Names of the backends.
+    :rtype: List[str]
+    """
+    return [name for name in _PRIORITY if name in _LOADERS]
+
+
+def _auto_backend() -> str:
+    name = os.environ.get('PYSKEB_JSON_BACKEND')
+    if name and name in _LOADERS:
+        return name
+    else:
+        return get_json_backends()[0]
+
+
+_backend: str = _auto_backend()
+
+
+def get_json_backend() -> str:
+    """
+    Get the name of current JSON backend.
+
+    :return: Name of the backend, ``orjson``, ``msgspec`` or ``json``.
+    :rtype: str
+    """
+    return _backend
+
+
+def set_json_backend(name: Optional[str] = None):
+    """
+    Set the JSON backend.
+
+    :param name: Name of the backend. ``None`` means auto selecting.
+    :type name: Optional[str]
+    :raises ValueError: When the backend is not installed.
+    """
+    global _backend
+    if name is None:
+        _backend = _auto_backend()
+    elif name in _LOADERS:
+        _backend = name
+    else:
+        raise ValueError(f'JSON backend {name!r} is not available, '
+                         f'{get_json_backends()!r} expected.')
+
+
+def json_loads(data: Union[bytes, str], factory: Optional[Callable[[dict], Any]] = None,
+               backend: Optional[str] = None):
+    """
+    Decode JSON data with the fast backend.
+
+    :param data: JSON data, bytes in UTF-8 is preferred.
+    :type data: Union[bytes, str]
+    :param factory: Typed decoding, such as ``Work.from_json``. It is applied on the decoded object,
+        or on each item when a list is decoded. (default: None)
+    :type factory: Optional[Callable[[dict], Any]]
+    :param backend: Backend to use, current backend will be used when not given. (default: None)
+    :type backend: Optional[str]
+    :return: Decoded object.
+    :raises ValueError: When the data is not valid JSON.
+    """
+    try:
+        obj = _LOADERS[backend or _backend](data)
+    except tuple(_ERRORS) as err:
+        raise ValueError(f'Invalid JSON data - {err}') from err
+
+    return _apply_factory(obj, factory)
+
+
+def _apply_factory(obj, factory: Optional[Callable[[dict], Any]] = None):
+    if factory is None:
+        return obj
+    elif isinstance(obj, list):
+        return [factory(item) for item in obj]
+    else:
+        return factory(obj)
+
+
+def response_json(resp: requests.Response, factory: Optional[Callable[[dict], Any]] = None):
+    """
+    Faster replacement of :meth:`requests.Response.json`, the raw body is decoded without building the text.
+
+    :param resp: Response object.
+    :type resp: requests.Response
+    :param factory: Typed decoding, see :func:`json_loads`. (default: None)
+    :type factory: Optional[Callable[[dict], Any]]
+    :return: Decoded object.
+    :raises requests.exceptions.JSONDecodeError: When the body is not valid JSON, just like ``resp.json()``.
+    """
+    if resp.encoding and resp.encoding.lower().replace('_', '-') not in {'utf-8', 'utf8', 'ascii'}:
+        data = resp.text
+    else:
+        data = resp.content
+
+    try:
+        obj = json_loads(data)
+    except ValueError as err:
+        doc = data if isinstance(data, str) else data.decode('utf-8', errors='replace')
+        raise requests.exceptions.JSONDecodeError(str(err), doc, 0) from err
+
+    # errors of the factory (e.g. unexpected fields) are not about the body, so they are not wrapped
+    return _apply_factory(obj, factory)
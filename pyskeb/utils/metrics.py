@@ -0,0 +1,352 @@
+"""
+Request metrics and tracing hooks of the HTTP session layer.
+
+The metrics are recorded per host and endpoint by :class:`pyskeb.utils.TimeoutHTTPAdapter`,
+:class:`pyskeb.utils.http2.HttpxHTTPAdapter` and :func:`pyskeb.utils.session.srequest`, once enabled
+with :func:`enable_request_metrics`. They can be exported as Prometheus text or JSON summary.
+"""
+import bisect
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Optional, Tuple, Dict, List, Iterable
+from urllib.parse import urlsplit
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+
+def _endpoint(path: str, max_segments: int = 3) -> str:
+    # keep the label cardinality low, ids and usernames are replaced
+    segments = []
+    for segment in path.split('/'):
+        if not segment:
+            continue
+        if len(segments) >= max_segments:
+            segments.append('...')
+            break
+        if segment.startswith('@'):
+            segments.append('@{user}')
+        elif any(ch.isdigit() for ch in segment):
+            segments.append('{id}')
+        else:
+            segments.append(segment)
+    return '/' + '/'.join(segments)
+
+
+def _split_url(url: str) -> Tuple[str, str]:
+    splitted = urlsplit(url)
+    return splitted.netloc.lower(), _endpoint(splitted.path)
+
+
+class _EndpointStats:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.bucket_counts = [0] * len(buckets)
+        self.latency_sum = 0.0
+        self.requests = 0
+        self.statuses: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.bytes = 0
+        self.retries: Dict[str, int] = {}
+        self.retry_wait: Dict[str, float] = {}
+
+
+class RequestMetrics:
+    """
+    Thread-safe request metrics, grouped by host and endpoint.
+
+    The endpoints are the normalized paths, the segments with digits are replaced by ``{id}``,
+    and usernames like ``@xxx`` are replaced by ``@{user}``.
+
+    :param buckets: Upper bounds of the latency histogram buckets in seconds.
+    :param tracing: Create OpenTelemetry spans for the requests, ``opentelemetry-api`` is required.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, tracing: bool = False):
+        self.buckets = tuple(sorted(buckets))
+        if self.buckets[-1] != math.inf:
+            self.buckets = (*self.buckets, math.inf)
+        self._stats: Dict[Tuple[str, str], _EndpointStats] = {}
+        self._lock = threading.Lock()
+
+        self._tracer = None
+        if tracing:
+            from opentelemetry import trace
+            self._tracer = trace.get_tracer('pyskeb')
+
+    def _get_stats(self, url: str) -> _EndpointStats:
+        key = _split_url(url)
+        if key not in self._stats:
+            self._stats[key] = _EndpointStats(self.buckets)
+        return self._stats[key]
+
+    def record_response(self, url: str, status_code: int, latency: float, bytes_: int = 0):
+        with self._lock:
+            stats = self._get_stats(url)
+            stats.requests += 1
+            stats.latency_sum += latency
+            stats.bucket_counts[bisect.bisect_left(self.buckets, latency)] += 1
+            stats.statuses[str(status_code)] = stats.statuses.get(str(status_code), 0) + 1
+            stats.bytes += bytes_
+
+    def record_error(self, url: str, error: Exception, latency: float):
+        with self._lock:
+            stats = self._get_stats(url)
+            stats.requests += 1
+            stats.latency_sum += latency
+            stats.bucket_counts[bisect.bisect_left(self.buckets, latency)] += 1
+            name = type(error).__name__
+            stats.errors[name] = stats.errors.get(name, 0) + 1
+
+    def record_retry(self, url: str, reason: str, wait: float = 0.0):
+        """
+        Record a retry, ``reason`` is ``rate_limit``, ``status`` or ``error``.
+        """
+        with self._lock:
+            stats = self._get_stats(url)
+            stats.retries[reason] = stats.retries.get(reason, 0) + 1
+            stats.retry_wait[reason] = stats.retry_wait.get(reason, 0.0) + wait
+
+    def record_wait(self, url: str, reason: str, wait: float):
+        """
+        Record the waiting time before a retry which has been recorded by :meth:`record_retry`.
+        """
+        with self._lock:
+            stats = self._get_stats(url)
+            stats.retry_wait[reason] = stats.retry_wait.get(reason, 0.0) + wait
+
+    def record_bytes(self, url: str, bytes_: int):
+        with self._lock:
+            self._get_stats(url).bytes += bytes_
+
+    def _count_iter(self, url: str, chunks: Iterable[bytes]):
+        for chunk in chunks:
+            self.record_bytes(url, len(chunk))
+            yield chunk
+
+    def _counting(self, url: str, func):
+        @wraps(func)
+        def _func(*args, **kwargs):
+            result = func(*args, **kwargs)
+            if isinstance(result, (bytes, bytearray)):
+                self.record_bytes(url, len(result))
+                return result
+            else:
+                return self._count_iter(url, result)
+
+        return _func
+
+    def track_body(self, url: str, raw, methods: Tuple[str, ...] = ('read', 'read_chunked')):
+        """
+        Count the body bytes actually read from the raw response, so the chunked and streamed
+        bodies are counted as well.
+
+        :param url: Url of the request.
+        :param raw: The raw response, such as :class:`urllib3.HTTPResponse`.
+        :param methods: The reading methods of the raw response to count, they should not call each other.
+        """
+        for name in methods:
+            func = getattr(raw, name, None)
+            if func is not None:
+                setattr(raw, name, self._counting(url, func))
+
+    @contextmanager
+    def span(self, method: str, url: str):
+        """
+        OpenTelemetry span of a request, does nothing when tracing is not enabled.
+        """
+        if self._tracer is None:
+            yield None
+        else:
+            with self._tracer.start_as_current_span(f'HTTP {method}', attributes={
+                'http.method': method,
+                'http.url': url,
+            }) as span:
+                yield span
+
+    @contextmanager
+    def measure(self, method: str, url: str, body_methods: Tuple[str, ...] = ('read', 'read_chunked')):
+        """
+        Measure a request, the yielded list should be filled with the response.
+        The body bytes are counted when read, see :meth:`track_body`.
+
+        Example::
+
+            >>> with metrics.measure('GET', url) as holder:
+            ...     holder.append(session.get(url))
+        """
+        holder: List = []
+        start_time = time.time()
+        with self.span(method, url) as span:
+            try:
+                yield holder
+            except Exception as err:
+                self.record_error(url, err, time.time() - start_time)
+                raise
+            else:
+                if holder:
+                    resp = holder[0]
+                    self.record_response(url, resp.status_code, time.time() - start_time)
+                    if resp.raw is not None:
+                        self.track_body(url, resp.raw, body_methods)
+                    if span is not None:
+                        span.set_attribute('http.status_code', resp.status_code)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _percentile(self, stats: _EndpointStats, q: float) -> Optional[float]:
+        total = sum(stats.bucket_counts)
+        if not total:
+            return None
+        rank, cumulative = q * total, 0
+        for bound, count in zip(self.buckets, stats.bucket_counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.buckets[-1]  # pragma: no cover
+
+    def summary(self) -> List[dict]:
+        """
+        Summary of the metrics, one item for each host and endpoint.
+        The percentiles are the upper bounds of the histogram buckets.
+        """
+        with self._lock:
+            return [
+                {
+                    'host': host,
+                    'endpoint': endpoint,
+                    'requests': stats.requests,
+                    'statuses': dict(stats.statuses),
+                    'errors': dict(stats.errors),
+                    'bytes': stats.bytes,
+                    'latency_mean': stats.latency_sum / stats.requests if stats.requests else None,
+                    'latency_p50': self._percentile(stats, 0.5),
+                    'latency_p90': self._percentile(stats, 0.9),
+                    'latency_p99': self._percentile(stats, 0.99),
+                    'retries': dict(stats.retries),
+                    'retry_wait': dict(stats.retry_wait),
+                }
+                for (host, endpoint), stats in sorted(self._stats.items())
+            ]
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps({'time': time.time(), 'endpoints': self.summary()}, **kwargs)
+
+    def to_prometheus(self, prefix: str = 'pyskeb_http') -> str:
+        """
+        Export the metrics in Prometheus text format.
+        """
+
+        def _labels(**kwargs):
+            return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in kwargs.items()) + '}'
+
+        lines = [
+            f'# TYPE {prefix}_requests_total counter',
+            f'# TYPE {prefix}_errors_total counter',
+            f'# TYPE {prefix}_response_bytes_total counter',
+            f'# TYPE {prefix}_request_duration_seconds histogram',
+            f'# TYPE {prefix}_retries_total counter',
+            f'# TYPE {prefix}_retry_wait_seconds_total counter',
+        ]
+        with self._lock:
+            for (host, endpoint), stats in sorted(self._stats.items()):
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'{prefix}_requests_total'
+                                 f'{_labels(host=host, endpoint=endpoint, status=status)} {count}')
+                for error, count in sorted(stats.errors.items()):
+                    lines.append(f'{prefix}_errors_total{_labels(host=host, endpoint=endpoint, error=error)} {count}')
+                lines.append(f'{prefix}_response_bytes_total{_labels(host=host, endpoint=endpoint)} {stats.bytes}')
+
+                cumulative = 0
+                for bound, count in zip(self.buckets, stats.bucket_counts):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else repr(float(bound))
+                    lines.append(f'{prefix}_request_duration_seconds_bucket'
+                                 f'{_labels(host=host, endpoint=endpoint, le=le)} {cumulative}')
+                lines.append(f'{prefix}_request_duration_seconds_sum'
+                             f'{_labels(host=host, endpoint=endpoint)} {stats.latency_sum!r}')
+                lines.append(f'{prefix}_request_duration_seconds_count'
+                             f'{_labels(host=host, endpoint=endpoint)} {cumulative}')
+
+                for reason, count in sorted(stats.retries.items()):
+                    lines.append(f'{prefix}_retries_total'
+                                 f'{_labels(host=host, endpoint=endpoint, reason=reason)} {count}')
+                    lines.append(f'{prefix}_retry_wait_seconds_total'
+                                 f'{_labels(host=host, endpoint=endpoint, reason=reason)} '
+                                 f'{stats.retry_wait[reason]!r}')
+
+        return '\n'.join(lines) + '\n'
+
+    def start_reporter(self, interval: float = 60.0, filename: Optional[str] = None) -> 'MetricsReporter':
+        """
+        Start a daemon thread, which dumps the JSON summary every ``interval`` seconds to ``filename``,
+        or to the log when ``filename`` is not given.
+        """
+        reporter = MetricsReporter(self, interval, filename)
+        reporter.start()
+        return reporter
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsReporter(threading.Thread):
+    """
+    Periodic JSON reporter of :class:`RequestMetrics`, created by :meth:`RequestMetrics.start_reporter`.
+    """
+
+    def __init__(self, metrics: RequestMetrics, interval: float = 60.0, filename: Optional[str] = None):
+        super().__init__(name='pyskeb-metrics-reporter', daemon=True)
+        self.metrics = metrics
+        self.interval = interval
+        self.filename = filename
+        self._stopped = threading.Event()
+
+    def report(self):
+        if self.filename:
+            with open(self.filename, 'w') as f:
+                f.write(self.metrics.to_json(indent=2))
+        else:
+            logging.info(f'Request metrics: {self.metrics.to_json()}')
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        self.report()
+
+
+_default_metrics: Optional[RequestMetrics] = None
+
+
+def enable_request_metrics(metrics: Optional[RequestMetrics] = None, **kwargs) -> RequestMetrics:
+    """
+    Enable the request metrics for all the sessions.
+
+    :param metrics: Metrics object to use, a new one is created with ``kwargs`` when not given.
+    :return: The enabled metrics object.
+    """
+    global _default_metrics
+    _default_metrics = metrics or RequestMetrics(**kwargs)
+    return _default_metrics
+
+
+def disable_request_metrics():
+    global _default_metrics
+    _default_metrics = None
+
+
+def get_request_metrics() -> Optional[RequestMetrics]:
+    """
+    Get the enabled metrics object, ``None`` when not enabled.
+    """
+    return _default_metrics
@@ -1,18 +1,86 @@
+import email.utils
 import logging
 import random
 import time
+from datetime import datetime, timezone
 from functools import lru_cache
-from typing import Optional, Dict, List, Union
+from threading import Lock, local
+from typing import Optional, Dict, List, Union, Iterable
 
 import requests
 from random_user_agent.params import SoftwareName, OperatingSystem
 from random_user_agent.user_agent import UserAgent
-from requests.adapters import HTTPAdapter, Retry
+from requests.adapters import BaseAdapter, HTTPAdapter, Retry
 from requests.exceptions import RequestException
 
+from .metrics import RequestMetrics, get_request_metrics
+
 DEFAULT_TIMEOUT = 60  # seconds
 
 
+class _AttemptTracker:
+    """
+    Attempts of one request sent by :class:`TimeoutHTTPAdapter`, the retries inside urllib3 are
+    reported by :class:`_MetricsRetry`.
+    """
+
+    def __init__(self, metrics: RequestMetrics, url: str):
+        self.metrics = metrics
+        self.url = url
+        self.start_time = time.time()
+        self.last_reason: Optional[str] = None
+        self.exhausted = False
+
+    def latency(self) -> float:
+        return time.time() - self.start_time
+
+    def record_attempt(self, response=None, error: Optional[Exception] = None):
+        if error is not None:
+            self.metrics.record_error(self.url, error, self.latency())
+            self.last_reason = 'error'
+        elif response is not None:
+            self.metrics.record_response(self.url, response.status, self.latency())
+            self.last_reason = 'rate_limit' if response.status == 429 else 'status'
+
+
+_attempts = local()
+
+
+def _current_tracker() -> Optional[_AttemptTracker]:
+    return getattr(_attempts, 'tracker', None)
+
+
+class _MetricsRetry(Retry):
+    """
+    Retry of urllib3, which records each failed attempt and the waiting time before the next one
+    into the metrics of the request being sent.
+    """
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        tracker = _current_tracker()
+        if tracker is not None:
+            tracker.record_attempt(response, error)
+        try:
+            retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        except Exception:
+            if tracker is not None:
+                tracker.exhausted = True
+            raise
+        if tracker is not None and tracker.last_reason is not None:
+            tracker.metrics.record_retry(tracker.url, tracker.last_reason)
+        return retry
+
+    def sleep(self, response=None):
+        tracker = _current_tracker()
+        start_time = time.time()
+        super().sleep(response)
+        if tracker is not None:
+            if tracker.last_reason is not None:
+                tracker.metrics.record_wait(tracker.url, tracker.last_reason, time.time() - start_time)
+            # the backoff is not a part of the latency of the next attempt
+            tracker.start_time = time.time()
+
+
 class TimeoutHTTPAdapter(HTTPAdapter):
     """
     Custom HTTP adapter that sets a default timeout for requests.
@@ -32,6 +100,10 @@ class TimeoutHTTPAdapter(HTTPAdapter):
 
     :param timeout: The default timeout value in seconds. (default: 10)
     :type timeout: int
+    :param metrics: Metrics to record the requests, the enabled one of :func:`pyskeb.utils.enable_request_metrics`
+        is used when not given. Each attempt is recorded when the retries of urllib3 are done by
+        a retry created by :func:`get_requests_session`. (default: None)
+    :type metrics: Optional[RequestMetrics]
     """
 
     def __init__(self, *args, **kwargs):
@@ -39,6 +111,7 @@ class TimeoutHTTPAdapter(HTTPAdapter):
         if "timeout" in kwargs:
             self.timeout = kwargs["timeout"]
             del kwargs["timeout"]
+        self.metrics: Optional[RequestMetrics] = kwargs.pop("metrics", None)
         super().__init__(*args, **kwargs)
 
     def send(self, request, **kwargs):
@@ -55,16 +128,67 @@ class TimeoutHTTPAdapter(HTTPAdapter):
         timeout = kwargs.get("timeout")
         if timeout is None:
             kwargs["timeout"] = self.timeout
-        return super().send(request, **kwargs)
+        metrics = self.metrics or get_request_metrics()
+        if metrics is None:
+            return super().send(request, **kwargs)
+
+        tracker = _AttemptTracker(metrics, request.url)
+        previous, _attempts.tracker = _current_tracker(), tracker
+        try:
+            with metrics.span(request.method, request.url) as span:
+                try:
+                    resp = super().send(request, **kwargs)
+                except Exception as err:
+                    # the last attempt is already recorded when the retries are exhausted
+                    if not tracker.exhausted:
+                        metrics.record_error(request.url, err, tracker.latency())
+                    raise
+                metrics.record_response(request.url, resp.status_code, tracker.latency())
+                if resp.raw is not None:
+                    metrics.track_body(request.url, resp.raw)
+                if span is not None:
+                    span.set_attribute('http.status_code', resp.status_code)
+        finally:
+            _attempts.tracker = previous
+        return resp
+
+
+def _make_adapter(backend: str, max_retries: int, timeout: int, pool_size: int,
+                  metrics: Optional[RequestMetrics] = None) -> BaseAdapter:
+    if backend == 'requests':
+        if max_retries > 0:
+            retries = _MetricsRetry(
+                total=max_retries, backoff_factor=1,
+                status_forcelist=[408, 413, 429, 500, 501, 502, 503, 504, 505, 506, 507, 509, 510, 511],
+                allowed_methods=["HEAD", "GET", "POST", "PUT", "DELETE", "OPTIONS", "TRACE"],
+            )
+        else:
+            retries = 0
+        return TimeoutHTTPAdapter(max_retries=retries, timeout=timeout,
+                                  pool_connections=pool_size, pool_maxsize=pool_size, metrics=metrics)
+    elif backend == 'httpx':
+        from .http2 import HttpxHTTPAdapter
+        return HttpxHTTPAdapter(max_retries=max_retries, timeout=timeout, pool_maxsize=pool_size, http2=True,
+                                metrics=metrics)
+    else:
+        raise ValueError(f'Unknown session backend - {backend!r}.')
 
 
 def get_requests_session(max_retries: int = 5, timeout: int = DEFAULT_TIMEOUT, verify: bool = True,
-                         headers: Optional[Dict[str, str]] = None, session: Optional[requests.Session] = None) \
-        -> requests.Session:
+                         headers: Optional[Dict[str, str]] = None, session: Optional[requests.Session] = None,
+                         proxy: Optional[str] = None, backend: str = 'requests', pool_size: int = 32,
+                         host_pool_sizes: Optional[Dict[str, int]] = None,
+                         metrics: Optional[RequestMetrics] = None) -> requests.Session:
     """
     Returns a requests Session object configured with retry and timeout settings.
 
-    :param max_retries: The maximum number of retries. (default: 5)
+    With ``backend='httpx'``, the requests are sent by :class:`pyskeb.utils.http2.HttpxHTTPAdapter` with HTTP/2
+    (``pip install pyskeb[http2]`` is required), the concurrent requests to one host are multiplexed on a few
+    connections. In this case, ``max_retries`` only covers the connection failures, the status retries should be
+    done by :func:`srequest`.
+
+    :param max_retries: The maximum number of retries. When set to 0, the responses (including 429 and 5xx ones)
+        are returned as they are without any retry. (default: 5)
     :type max_retries: int
     :param timeout: The default timeout value in seconds. (default: 10)
     :type timeout: int
@@ -72,64 +196,398 @@ def get_requests_session(max_retries: int = 5, timeout: int = DEFAULT_TIMEOUT, v
     :type headers: Optional[Dict[str, str]]
     :param session: An existing requests Session object to use. If not provided, a new Session object is created. (default: None)
     :type session: Optional[requests.Session]
+    :param proxy: Proxy used by all the requests of this session, such as ``http://127.0.0.1:8080``. (default: None)
+    :type proxy: Optional[str]
+    :param backend: Transport backend, ``requests`` or ``httpx``. (default: ``requests``)
+    :type backend: str
+    :param pool_size: The connection pool size of each host. (default: 32)
+    :type pool_size: int
+    :param host_pool_sizes: Pool sizes of the specific hosts, such as ``{'skeb.jp': 8}``.
+        The port should be included when it is not the default one. (default: None)
+    :type host_pool_sizes: Optional[Dict[str, int]]
+    :param metrics: Metrics to record the requests of this session, the enabled one of
+        :func:`pyskeb.utils.enable_request_metrics` is used when not given. (default: None)
+    :type metrics: Optional[RequestMetrics]
     :returns: The requests Session object.
     :rtype: requests.Session
     """
     session = session or requests.session()
-    retries = Retry(
-        total=max_retries, backoff_factor=1,
-        status_forcelist=[408, 413, 429, 500, 501, 502, 503, 504, 505, 506, 507, 509, 510, 511],
-        allowed_methods=["HEAD", "GET", "POST", "PUT", "DELETE", "OPTIONS", "TRACE"],
-    )
-    adapter = TimeoutHTTPAdapter(max_retries=retries, timeout=timeout, pool_connections=32, pool_maxsize=32)
+    adapter = _make_adapter(backend, max_retries, timeout, pool_size, metrics)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
+    for host, host_pool_size in (host_pool_sizes or {}).items():
+        host_adapter = _make_adapter(backend, max_retries, timeout, host_pool_size, metrics)
+        session.mount(f'http://{host}/', host_adapter)
+        session.mount(f'https://{host}/', host_adapter)
     session.headers.update({
         "User-Agent": get_random_ua(),
         **dict(headers or {}),
     })
     if not verify:
         session.verify = False
+    if proxy:
+        session.proxies.update({'http': proxy, 'https': proxy})
 
     return session
 
 
-def srequest(session: Union[requests.Session, List[requests.Session]], method, url, *, max_retries: int = 5,
-             sleep_time: float = 5.0, raise_for_status: bool = True, **kwargs) -> requests.Response:
+class ProxyState:
     """
-    Send a request using the provided session object with retry and timeout settings.
+    Health state of one proxy in :class:`ProxyPool`.
 
-    :param session: The requests Session object to use for the request.
+    :param proxy: The proxy URL.
+    :type proxy: str
+    :param session: The pooled session which sends requests through this proxy.
     :type session: requests.Session
+    """
+
+    def __init__(self, proxy: str, session: requests.Session):
+        self.proxy = proxy
+        self.session = session
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.rate_limit_rate = 0.0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+
+    @property
+    def score(self) -> float:
+        """
+        Score of this proxy, the lower the healthier. Proxies never used are preferred.
+        """
+        latency = self.latency if self.latency is not None else 0.0
+        return (latency + 0.1) * (1.0 + 4.0 * self.error_rate + 4.0 * self.rate_limit_rate)
+
+    def is_ejected(self, current_time: Optional[float] = None) -> bool:
+        return (current_time or time.time()) < self.ejected_until
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} proxy: {self.proxy!r}, score: {self.score:.3f}, ' \
+               f'requests: {self.requests}, ejected: {self.is_ejected()}>'
+
+
+class ProxyPool:
+    """
+    Pool of proxies with health scoring, each proxy owns one pooled session.
+
+    Requests are sent through the healthier proxies (by latency, error rate and rate of 429 responses),
+    using power-of-two-choices selection to spread the load. A proxy with ``max_failures`` consecutive
+    failures is ejected for a while, and re-probed by real requests when its ejection expires.
+    The ejection time is doubled every time it is ejected again without any success in between.
+
+    It can be used as the ``session`` of :func:`srequest` and :func:`pyskeb.utils.download_file`.
+
+    Example:
+    ```python
+    pool = ProxyPool(['http://10.0.0.1:80', 'http://10.0.0.2:80'])
+    resp = srequest(pool, 'GET', 'https://skeb.jp/api/works')
+    ```
+
+    :param proxies: URLs of the proxies.
+    :type proxies: List[str]
+    :param alpha: Smoothing factor of the moving averages. (default: 0.2)
+    :type alpha: float
+    :param max_failures: Consecutive failures (errors or 429 responses) before ejection. (default: 3)
+    :type max_failures: int
+    :param eject_time: Initial ejection time in seconds. (default: 60.0)
+    :type eject_time: float
+    :param max_eject_time: Maximum ejection time in seconds. (default: 1800.0)
+    :type max_eject_time: float
+    :param max_retries: The maximum number of retries of each session, retries are done on other proxies
+        by :func:`srequest` instead. (default: 0)
+    :type max_retries: int
+    :param kwargs: Other arguments for :func:`get_requests_session`.
+    """
+
+    def __init__(self, proxies: List[str], alpha: float = 0.2, max_failures: int = 3,
+                 eject_time: float = 60.0, max_eject_time: float = 1800.0, max_retries: int = 0, **kwargs):
+        if not proxies:
+            raise ValueError('No proxies given.')
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.eject_time = eject_time
+        self.max_eject_time = max_eject_time
+        self.states = [
+            ProxyState(proxy, get_requests_session(max_retries=max_retries, proxy=proxy, **kwargs))
+            for proxy in proxies
+        ]
+        self._lock = Lock()
+
+    def acquire(self) -> ProxyState:
+        """
+        Choose a proxy for the next request.
+        When all the proxies are ejected, the one which will be back soonest is chosen.
+        """
+        with self._lock:
+            current_time = time.time()
+            healthy = [state for state in self.states if not state.is_ejected(current_time)]
+            if not healthy:
+                state = min(self.states, key=lambda x: x.ejected_until)
+            elif len(healthy) == 1:
+                state = healthy[0]
+            else:
+                state = min(random.sample(healthy, 2), key=lambda x: x.score)
+            state.requests += 1
+            return state
+
+    def _ewma(self, old: Optional[float], new: float) -> float:
+        return new if old is None else (1 - self.alpha) * old + self.alpha * new
+
+    def report(self, state: ProxyState, latency: Optional[float] = None,
+               status_code: Optional[int] = None, error: bool = False):
+        """
+        Report the result of a request sent through ``state``.
+
+        :param state: The proxy state returned by :meth:`acquire`.
+        :param latency: Latency of the request in seconds.
+        :param status_code: Status code of the response.
+        :param error: Whether the request failed without response.
+        """
+        with self._lock:
+            rate_limited = status_code == 429
+            state.error_rate = self._ewma(state.error_rate, 1.0 if error else 0.0)
+            if not error:
+                state.rate_limit_rate = self._ewma(state.rate_limit_rate, 1.0 if rate_limited else 0.0)
+                if latency is not None:
+                    state.latency = self._ewma(state.latency, latency)
+
+            if error or rate_limited:
+                state.failures += 1
+                if state.failures >= self.max_failures:
+                    duration = min(self.max_eject_time, self.eject_time * (2 ** state.ejections))
+                    state.ejected_until = time.time() + duration
+                    state.ejections += 1
+                    state.failures = 0
+                    logging.warning(f'Proxy {state.proxy!r} ejected for {duration:.1f}s.')
+            else:
+                state.failures = 0
+                state.ejections = 0
+
+    def __len__(self):
+        return len(self.states)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} proxies: {len(self.states)}, ' \
+               f'ejected: {sum(1 for state in self.states if state.is_ejected())}>'
+
+
+class RetryPolicy:
+    """
+    Retry policy of the HTTP requests, with exponential backoff, decorrelated jitter, ``Retry-After``
+    header support, status-aware retries and a total deadline.
+
+    The delay before the n-th retry is ``min(max_delay, uniform(base_delay, 3 * previous_delay))``
+    (the "decorrelated jitter" backoff), or the time required by the ``Retry-After`` header when it is longer.
+    The retries stop when ``max_retries`` tries are made, or the next try cannot start before the deadline.
+
+    Example:
+    ```python
+    policy = RetryPolicy(max_retries=8, deadline=300.0)
+    resp = srequest(session, 'GET', 'https://skeb.jp/api/works', retry_policy=policy)
+    ```
+
+    :param max_retries: The maximum number of tries. (default: 5)
+    :type max_retries: int
+    :param base_delay: The minimum delay in seconds between tries. (default: 1.0)
+    :type base_delay: float
+    :param max_delay: The maximum backoff delay in seconds. (default: 60.0)
+    :type max_delay: float
+    :param deadline: The total time limit in seconds of all the tries, ``None`` means no limit. (default: None)
+    :type deadline: Optional[float]
+    :param retry_statuses: Status codes of the responses to retry. (default: 408, 425, 429, 500, 502, 503, 504)
+    :type retry_statuses: Iterable[int]
+    :param respect_retry_after: Whether to respect the ``Retry-After`` header. (default: True)
+    :type respect_retry_after: bool
+    """
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 deadline: Optional[float] = None,
+                 retry_statuses: Iterable[int] = (408, 425, 429, 500, 502, 503, 504),
+                 respect_retry_after: bool = True):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retry_statuses = set(retry_statuses)
+        self.respect_retry_after = respect_retry_after
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        return status_code in self.retry_statuses
+
+    def next_delay(self, previous_delay: Optional[float] = None) -> float:
+        if previous_delay is None:
+            return self.base_delay
+        upper = max(self.base_delay, previous_delay * 3)
+        return min(self.max_delay, random.uniform(self.base_delay, upper))
+
+    @classmethod
+    def parse_retry_after(cls, value: Optional[str]) -> Optional[float]:
+        """
+        Parse the value of ``Retry-After`` header, in seconds or HTTP date.
+
+        :param value: Value of the header.
+        :type value: Optional[str]
+        :returns: Seconds to wait, ``None`` when not given or invalid.
+        :rtype: Optional[float]
+        """
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            retry_time = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if retry_time.tzinfo is None:
+            retry_time = retry_time.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_time - datetime.now(timezone.utc)).total_seconds())
+
+    def start(self) -> 'RetryState':
+        """
+        Start the retries of one request.
+        """
+        return RetryState(self)
+
+
+class RetryState:
+    """
+    Retry state of one request, created by :meth:`RetryPolicy.start`.
+    """
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.tries = 0
+        self.start_time = time.time()
+        self.last_delay: Optional[float] = None
+        self.last_wait: float = 0.0
+
+    def retry(self, response: Optional[requests.Response] = None, error: Optional[Exception] = None,
+              sleep: bool = True) -> bool:
+        """
+        Check if the request should be tried again after a ``response`` or an ``error``,
+        and wait for the backoff delay when it should.
+
+        :param response: The response got, its status code and ``Retry-After`` header are checked.
+        :param error: The error raised.
+        :param sleep: Whether to sleep. When ``False``, the next try is made immediately
+            (e.g. on another proxy). (default: True)
+        :returns: ``True`` if another try should be made.
+        :rtype: bool
+        """
+        self.tries += 1
+        if response is not None and error is None and not self.policy.is_retryable_status(response.status_code):
+            return False
+        if self.tries >= self.policy.max_retries:
+            return False
+
+        delay = self.policy.next_delay(self.last_delay) if sleep else 0.0
+        self.last_delay = delay
+        if sleep and response is not None and self.policy.respect_retry_after:
+            retry_after = self.policy.parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+        if self.policy.deadline is not None and \
+                time.time() + delay > self.start_time + self.policy.deadline:
+            return False
+
+        self.last_wait = delay
+        if delay > 0:
+            logging.warning(f'Try #{self.tries} failed ({_retry_reason(response, error)}), '
+                            f'retry in {delay:.2f}s ...')
+            time.sleep(delay)
+        return True
+
+
+def _retry_reason(response: Optional[requests.Response] = None, error: Optional[Exception] = None) -> str:
+    if error is not None:
+        return repr(error)
+    elif response is not None:
+        return f'{response.status_code} for {response.url!r}'
+    else:
+        return 'unknown'
+
+
+def srequest(session: Union[requests.Session, List[requests.Session], ProxyPool], method, url, *,
+             max_retries: int = 5, sleep_time: float = 5.0, raise_for_status: bool = True,
+             retry_policy: Optional[RetryPolicy] = None, metrics: Optional[RequestMetrics] = None,
+             **kwargs) -> requests.Response:
+    """
+    Send a request using the provided session object with retry and timeout settings.
+
+    The request errors and the responses with retryable status codes are retried according to the
+    ``retry_policy``. When all the tries fail on errors, the last error is raised.
+
+    When a :class:`ProxyPool` is given, each try is sent through the healthiest proxies, the results are
+    reported back to the pool, and the failed or rate-limited (429) tries are retried on another proxy
+    without sleeping.
+
+    :param session: The requests Session object to use for the request, a list of sessions or a proxy pool.
+    :type session: Union[requests.Session, List[requests.Session], ProxyPool]
     :param method: The HTTP method for the request.
     :type method: str
     :param url: The URL for the request.
     :type url: str
-    :param max_retries: The maximum number of retries. (default: 5)
+    :param max_retries: The maximum number of retries, used when ``retry_policy`` is not given. (default: 5)
     :type max_retries: int
-    :param sleep_time: The sleep time between retries in seconds. (default: 5.0)
+    :param sleep_time: The base sleep time between retries in seconds, used when ``retry_policy``
+        is not given. (default: 5.0)
     :type sleep_time: float
     :param raise_for_status: Whether to raise an exception for non-successful response status codes. (default: True)
     :type raise_for_status: bool
+    :param retry_policy: The retry policy. (default: None)
+    :type retry_policy: Optional[RetryPolicy]
+    :param metrics: Metrics to record the retries and waiting time, the enabled one of
+        :func:`pyskeb.utils.enable_request_metrics` is used when not given. (default: None)
+    :type metrics: Optional[RequestMetrics]
     :param kwargs: Additional keyword arguments for the request.
     :type kwargs: dict
     :returns: The response from the request.
     :rtype: requests.Response
     """
-    resp = None
-    for _ in range(max_retries):
-        if isinstance(session, (list, tuple)):
+    retry_policy = retry_policy or RetryPolicy(max_retries=max_retries, base_delay=sleep_time)
+    retry_state = retry_policy.start()
+    metrics = metrics or get_request_metrics()
+    while True:
+        _proxy = None
+        if isinstance(session, ProxyPool):
+            _proxy = session.acquire()
+            _session = _proxy.session
+        elif isinstance(session, (list, tuple)):
             _session = random.choice(session)
         else:
             _session = session
+
+        _start_time = time.time()
         try:
             resp = _session.request(method, url, **kwargs)
         except RequestException as err:
-            logging.error(f'Request error - {err!r}')
-            time.sleep(sleep_time)
+            if _proxy is not None:
+                session.report(_proxy, error=True)
+                logging.error(f'Request error on proxy {_proxy.proxy!r} - {err!r}')
+            else:
+                logging.error(f'Request error - {err!r}')
+            if retry_state.retry(error=err, sleep=_proxy is None):
+                if metrics is not None:
+                    metrics.record_retry(url, 'error', retry_state.last_wait)
+                continue
+            raise
         else:
+            if _proxy is not None:
+                session.report(_proxy, latency=time.time() - _start_time, status_code=resp.status_code)
+            # with a proxy pool, rate-limited tries are sent to another proxy at once
+            _sleep = _proxy is None or resp.status_code != 429
+            if retry_state.retry(response=resp, sleep=_sleep):
+                if metrics is not None:
+                    metrics.record_retry(url, 'rate_limit' if resp.status_code == 429 else 'status',
+                                         retry_state.last_wait)
+                resp.close()
+                continue
             break
-    assert resp is not None, f'Request failed for {max_retries} time(s).'
+
     if raise_for_status:
         resp.raise_for_status()
 
@@ -0,0 +1,50 @@
+"""
+Payloads shaped like the recorded API responses, generated with fixed seeds.
+"""
+import random
+
+
+def skeb_works_payload(count: int = 90, seed: int = 0):
+    rnd = random.Random(seed)
+    return [
+        {
+            'path': f'/@artist_{rnd.randint(1, 10000)}/works/{rnd.randint(1, 500)}',
+            'private_thumbnail_image_urls': None,
+            'private': False,
+            'genre': 'art',
+            'tipped': False,
+            'creator_id': rnd.randint(1, 1000000),
+            'client_id': rnd.randint(1, 1000000),
+            'vtt_url': None,
+            'thumbnail_image_urls': {
+                'src': f'https://si.imgix.net/{rnd.getrandbits(64):x}/thumb.jpg',
+                'srcset': ', '.join(f'https://si.imgix.net/{rnd.getrandbits(64):x}/{w}.jpg {w}w'
+                                    for w in (320, 640, 960)),
+            },
+            'duration': None,
+            'nsfw': rnd.random() < 0.3,
+            'hardsub': False,
+            'body': '依頼文です。' * rnd.randint(5, 50),
+            'word_count': rnd.randint(0, 3000),
+            'transcoder': 'image',
+            'creator_acceptable_same_genre': True,
+        }
+        for _ in range(count)
+    ]
+
+
+def danbooru_artists_payload(count: int = 1000, seed: int = 0):
+    rnd = random.Random(seed)
+    return [
+        {
+            'id': i,
+            'created_at': '2023-01-01T00:00:00.000-05:00',
+            'name': f'artist_{i}',
+            'updated_at': '2024-01-01T00:00:00.000-05:00',
+            'is_deleted': False,
+            'group_name': '',
+            'is_banned': False,
+            'other_names': [f'name_{rnd.getrandbits(32):x}' for _ in range(rnd.randint(0, 8))],
+        }
+        for i in range(count)
+    ]
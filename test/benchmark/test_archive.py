@@ -0,0 +1,61 @@
+import os
+import shutil
+import zipfile
+
+import pytest
+
+pytest.importorskip('hfutils')
+pytest.importorskip('gdown')
+pytest.importorskip('stream_unzip')
+
+from ..prepare.process import url_to_zip  # noqa: E402
+from ..prepare.repack import pack_directory  # noqa: E402
+from ..prepare.router import SiteHandler, ResolvedURL  # noqa: E402
+
+_FILES = 200
+_FILE_SIZE = 256 * 1024
+
+
+def _make_files(directory):
+    os.makedirs(directory, exist_ok=True)
+    for i in range(_FILES):
+        with open(os.path.join(directory, f'image {i}.png'), 'wb') as f:
+            f.write(os.urandom(_FILE_SIZE))
+
+
+@pytest.fixture(scope='module')
+def source_dir(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('source'))
+    _make_files(directory)
+    return directory
+
+
+@pytest.mark.benchmark
+class TestBenchmarkArchive:
+    def test_url_to_zip(self, benchmark, source_dir):
+        benchmark.group = 'archive'
+
+        def _download(url, output_directory):
+            for file in os.listdir(source_dir):
+                try:
+                    os.link(os.path.join(source_dir, file), os.path.join(output_directory, file))
+                except OSError:
+                    shutil.copyfile(os.path.join(source_dir, file), os.path.join(output_directory, file))
+
+        handler = SiteHandler('local', {'local'}, lambda s: True, lambda url: 'local_1', _download)
+        resolved = ResolvedURL('https://local/1', handler, 'local_1')
+
+        def _run():
+            with url_to_zip(resolved, prefix='user_1_') as zip_file:
+                with zipfile.ZipFile(zip_file, 'r') as zf:
+                    return len(zf.namelist())
+
+        assert benchmark.pedantic(_run, rounds=3, iterations=1) == _FILES
+        benchmark.extra_info['mb_per_second'] = _FILES * _FILE_SIZE / 1024 ** 2 / benchmark.stats.stats.mean
+
+    def test_pack_directory(self, benchmark, source_dir, tmp_path):
+        benchmark.group = 'archive'
+        zip_file = os.path.join(str(tmp_path), 'package.zip')
+        assert benchmark.pedantic(pack_directory, args=(source_dir, zip_file), kwargs=dict(remove=False),
+                                  rounds=3, iterations=1)
+        benchmark.extra_info['mb_per_second'] = _FILES * _FILE_SIZE / 1024 ** 2 / benchmark.stats.stats.mean
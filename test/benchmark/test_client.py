@@ -0,0 +1,40 @@
+import json
+from itertools import islice
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+import responses
+
+from pyskeb.client.client import SkebClient
+from .payloads import skeb_works_payload
+
+_PAGES = 10
+_PAGE_SIZE = 90
+_BODIES = [
+    json.dumps(skeb_works_payload(_PAGE_SIZE, seed=i), ensure_ascii=False).encode()
+    for i in range(_PAGES)
+]
+
+
+def _works_callback(request):
+    offset = int(parse_qs(urlparse(request.url).query)['offset'][0])
+    page = offset // _PAGE_SIZE
+    return 200, {'Content-Type': 'application/json'}, _BODIES[page] if page < _PAGES else b'[]'
+
+
+@pytest.fixture()
+def skeb_api():
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(responses.GET, 'https://skeb.jp/api/works', callback=_works_callback)
+        yield rsps
+
+
+@pytest.mark.benchmark
+class TestBenchmarkClient:
+    @pytest.mark.parametrize('typed', [False, True])
+    def test_iter_art_pages(self, benchmark, skeb_api, typed):
+        benchmark.group = 'skeb_client_pagination'
+        client = SkebClient()
+        items = benchmark(lambda: list(islice(client.iter_art_pages(typed=typed), _PAGES * _PAGE_SIZE)))
+        assert len(items) == _PAGES * _PAGE_SIZE
+        benchmark.extra_info['items'] = len(items)
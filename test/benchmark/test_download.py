@@ -0,0 +1,50 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pyskeb.utils import download_file, get_requests_session
+
+_SIZE = 32 * 1024 ** 2
+_BODY = os.urandom(1024 ** 2) * (_SIZE // 1024 ** 2)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(_BODY)))
+        self.end_headers()
+        self.wfile.write(_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def file_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}/file.bin'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.benchmark
+class TestBenchmarkDownload:
+    @pytest.mark.parametrize('chunk_size', [1024, 1 << 14, 1 << 16, 1 << 20])
+    def test_download_file(self, benchmark, file_server, tmp_path, chunk_size):
+        benchmark.group = 'download_file'
+        session = get_requests_session()
+        filename = os.path.join(str(tmp_path), 'file.bin')
+        benchmark.pedantic(
+            download_file, args=(file_server, filename),
+            kwargs=dict(session=session, silent=True, chunk_size=chunk_size),
+            rounds=3, iterations=1,
+        )
+        assert os.path.getsize(filename) == _SIZE
+        benchmark.extra_info['mb_per_second'] = _SIZE / 1024 ** 2 / benchmark.stats.stats.mean
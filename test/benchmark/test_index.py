@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+pytest.importorskip('magic')
+pytest.importorskip('hfutils')
+
+from PIL import Image  # noqa: E402
+
+from ..prepare.index import get_file_meta  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def archive_dir(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('archive'))
+    os.makedirs(os.path.join(directory, 'hqimage'))
+    os.makedirs(os.path.join(directory, 'others'))
+    files = []
+    for i in range(50):
+        file_in_archive = f'hqimage/{i}.png'
+        Image.new('RGB', (1024, 768), (i, i, i)).save(os.path.join(directory, file_in_archive))
+        files.append(file_in_archive)
+        file_in_archive = f'others/{i}'
+        with open(os.path.join(directory, file_in_archive), 'w') as f:
+            f.write('plain text without extension\n' * 10)
+        files.append(file_in_archive)
+    return directory, files
+
+
+@pytest.mark.benchmark
+class TestBenchmarkIndex:
+    def test_get_file_meta(self, benchmark, archive_dir):
+        benchmark.group = 'index_sync'
+        directory, files = archive_dir
+        metas = benchmark(lambda: [get_file_meta(os.path.join(directory, file), file) for file in files])
+        assert metas[0]['width'] == 1024
+        assert metas[1]['mimetype'] == 'text/plain'
+        benchmark.extra_info['files'] = len(files)
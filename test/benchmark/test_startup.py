@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('ditk')
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def _run_python(*args):
+    env = {key: value for key, value in os.environ.items() if key != 'REMOTE_REPOSITORY'}
+    subprocess.run([sys.executable, *args], cwd=_ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@pytest.mark.benchmark
+class TestBenchmarkStartup:
+    def test_cli_help(self, benchmark):
+        benchmark.group = 'startup'
+        benchmark.pedantic(_run_python, args=('-m', 'test.prepare', '--help'), rounds=5, iterations=1)
+
+    def test_import_newest(self, benchmark):
+        pytest.importorskip('gdown')
+        pytest.importorskip('xurls')
+        benchmark.group = 'startup'
+        benchmark.pedantic(_run_python, args=('-c', 'import test.prepare.lololo'), rounds=5, iterations=1)
@@ -0,0 +1,27 @@
+import pytest
+import responses
+
+from pyskeb.client.client import SkebClient
+from pyskeb.models import Work, Post
+
+
+@pytest.mark.unittest
+class TestClientClient:
+    @responses.activate
+    def test_typed(self):
+        responses.add(responses.GET, 'https://skeb.jp/api/works', json=[
+            {'path': '/@a/works/1'}, {'path': '/@b/works/2'},
+        ])
+        responses.add(responses.GET, 'https://skeb.jp/api/users/a/works/1', json={
+            'path': '/@a/works/1', 'body': 'text', 'source_body': 'source',
+        })
+
+        client = SkebClient()
+        assert client.get_page() == [{'path': '/@a/works/1'}, {'path': '/@b/works/2'}]
+        works = client.get_page(typed=True)
+        assert all(isinstance(work, Work) for work in works)
+        assert [(work.username, work.work_id) for work in works] == [('a', 1), ('b', 2)]
+
+        post = client.get_post('a', 1, typed=True)
+        assert isinstance(post, Post)
+        assert (post.body, post.source_body) == ('text', 'source')
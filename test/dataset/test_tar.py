@@ -0,0 +1,125 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from pyskeb.dataset import TarIndex, LocalTarReader, RemoteTarReader, TarMemberHashError, hf_resolve_url
+
+_MEMBERS = {
+    'hqimage/1.png': os.urandom(300000),
+    'hqimage/2.jpg': os.urandom(1025),
+    'others/empty.txt': b'',
+    'others/text.txt': 'plain text\n'.encode() * 10,
+}
+
+
+@pytest.fixture(scope='module')
+def pack(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('packs')
+    tar_file = str(directory / 'pack.tar')
+    with tarfile.open(tar_file, 'w') as tar:
+        for name, data in _MEMBERS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    files = {}
+    with tarfile.open(tar_file, 'r') as tar:
+        for info in tar:
+            files[info.name] = {
+                'offset': info.offset_data,
+                'size': info.size,
+                'sha256': hashlib.sha256(_MEMBERS[info.name]).hexdigest(),
+            }
+    with open(str(directory / 'pack.json'), 'w') as f:
+        json.dump({'filesize': os.path.getsize(tar_file), 'files': files}, f)
+    return tar_file
+
+
+def _make_range_server(directory, support_range: bool = True):
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with open(os.path.join(directory, self.path.lstrip('/')), 'rb') as f:
+                body = f.read()
+            range_ = self.headers.get('Range')
+            if support_range and range_:
+                start, end = map(int, range_.split('=')[1].split('-'))
+                body = body[start:end + 1]
+                self.send_response(206)
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture()
+def range_server(pack):
+    servers = [_make_range_server(os.path.dirname(pack), support_range) for support_range in (True, False)]
+    try:
+        yield [f'http://127.0.0.1:{server.server_address[1]}' for server in servers]
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+@pytest.mark.unittest
+class TestDatasetTar:
+    def test_local(self, pack):
+        with LocalTarReader(pack) as reader:
+            assert len(reader.index) == len(_MEMBERS)
+            assert sorted(reader.index.files) == sorted(_MEMBERS)
+            for name, data in _MEMBERS.items():
+                assert reader.read(name) == data
+            view = reader.view('hqimage/2.jpg', verify=True)
+            assert isinstance(view, memoryview)
+            assert view == _MEMBERS['hqimage/2.jpg']
+            view.release()
+            with pytest.raises(KeyError):
+                reader.read('not_found.png')
+
+    def test_local_hash_error(self, pack):
+        with open(os.path.splitext(pack)[0] + '.json') as f:
+            index = json.load(f)
+        index['files']['hqimage/1.png']['sha256'] = '0' * 64
+        with LocalTarReader(pack, TarIndex(index)) as reader:
+            with pytest.raises(TarMemberHashError):
+                reader.read('hqimage/1.png')
+            assert reader.read('hqimage/1.png', verify=False) == _MEMBERS['hqimage/1.png']
+
+    def test_remote(self, pack, range_server, tmp_path):
+        url, no_range_url = range_server
+        index = TarIndex.from_url(f'{url}/pack.json')
+        reader = RemoteTarReader(f'{url}/pack.tar', index)
+        for name, data in _MEMBERS.items():
+            assert reader.read(name) == data
+        filename = reader.download('hqimage/1.png', str(tmp_path / 'images' / '1.png'))
+        with open(filename, 'rb') as f:
+            assert f.read() == _MEMBERS['hqimage/1.png']
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            RemoteTarReader(f'{no_range_url}/pack.tar', index).read('hqimage/1.png')
+
+    def test_hf_resolve_url(self, monkeypatch):
+        monkeypatch.delenv('HF_ENDPOINT', raising=False)
+        assert hf_resolve_url('deepghs/skeb', 'packs/pack 1.tar') == \
+               'https://huggingface.co/datasets/deepghs/skeb/resolve/main/packs/pack%201.tar'
+        monkeypatch.setenv('HF_ENDPOINT', 'https://hf-mirror.com/')
+        assert hf_resolve_url('deepghs/skeb', 'x.tar', repo_type='model', revision='refs/pr/1') == \
+               'https://hf-mirror.com/deepghs/skeb/resolve/refs%2Fpr%2F1/x.tar'
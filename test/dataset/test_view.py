@@ -0,0 +1,106 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+pytest.importorskip('pyarrow')
+pytest.importorskip('pandas')
+
+import pandas as pd  # noqa: E402
+
+from pyskeb.dataset import PackDataset  # noqa: E402
+
+
+def _make_pack(directory, pack_id, files):
+    tar_file = os.path.join(directory, 'packs', f'{pack_id}.tar')
+    os.makedirs(os.path.dirname(tar_file), exist_ok=True)
+    with tarfile.open(tar_file, 'w') as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    index = {}
+    with tarfile.open(tar_file, 'r') as tar:
+        for info in tar:
+            index[info.name] = {'offset': info.offset_data, 'size': info.size,
+                                'sha256': hashlib.sha256(files[info.name]).hexdigest()}
+    with open(os.path.join(directory, 'packs', f'{pack_id}.json'), 'w') as f:
+        json.dump({'files': index}, f)
+
+
+@pytest.fixture(scope='module')
+def dataset_dir(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('index'))
+    rows, contents = [], {}
+    for pack_id in ['pack_1', 'pack_2']:
+        files = {}
+        for i in range(10):
+            group = 'hqimage' if i % 2 == 0 else 'others'
+            file_in_archive = f'{group}/{pack_id}_{i}.png'
+            files[file_in_archive] = f'{pack_id} {i}'.encode() * (i + 1)
+            rows.append({
+                'id': len(rows) + 1,
+                'pack_id': pack_id,
+                'archive_file': f'packs/{pack_id}.tar',
+                'file_in_archive': file_in_archive,
+                'group': group,
+                'filename': f'{len(rows)}.png',
+                'mimetype': 'image/png' if group == 'hqimage' else 'application/octet-stream',
+                'file_size': len(files[file_in_archive]),
+                'width': 200 * i if group == 'hqimage' else None,
+                'height': 100 * i if group == 'hqimage' else None,
+            })
+            contents[len(rows)] = files[file_in_archive]
+        _make_pack(directory, pack_id, files)
+
+    df = pd.DataFrame(rows).sort_values(by=['id'], ascending=[False])
+    df.to_parquet(os.path.join(directory, 'table.parquet'), engine='pyarrow', index=False)
+    return directory, contents
+
+
+@pytest.mark.unittest
+class TestDatasetView:
+    def test_access(self, dataset_dir):
+        directory, contents = dataset_dir
+        with PackDataset(directory) as dataset:
+            assert len(dataset) == 20
+            assert 'file_in_archive' in dataset.columns
+            for id_, data in contents.items():
+                index = dataset.index_of(id_)
+                assert dataset.row(index)['id'] == id_
+                assert dataset.read(index) == data
+                view = dataset.view(index)
+                assert view == data
+                view.release()
+                assert dataset.member(index).size == len(data)
+
+            with pytest.raises(KeyError):
+                dataset.index_of(100)
+            with pytest.raises(IndexError):
+                dataset.row(20)
+
+    def test_filter(self, dataset_dir):
+        directory, contents = dataset_dir
+        with PackDataset(directory) as dataset:
+            assert len(dataset.filter()) == 20
+            assert len(dataset.filter(group='hqimage')) == 10
+            assert len(dataset.filter(group=['hqimage', 'others'])) == 20
+            assert len(dataset.filter(mimetype='image/')) == 10
+            assert len(dataset.filter(mimetype='image/png', pack_id='pack_1')) == 5
+
+            indices = dataset.filter(group='hqimage', min_width=800)
+            assert sorted(dataset.row(int(i))['width'] for i in indices) == [800, 800, 1200, 1200, 1600, 1600]
+            assert len(dataset.filter(min_height=800)) == 2
+
+            for row, data in dataset.iter_files(indices):
+                assert data == contents[row['id']]
+                data.release()
+
+            sampled = dataset.sample(3, indices, seed=0)
+            assert len(set(sampled.tolist())) == 3
+            assert set(sampled.tolist()) <= set(indices.tolist())
+            assert len(dataset.sample(100, seed=0)) == 20
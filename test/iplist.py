@@ -3,6 +3,8 @@ import os.path
 import pathlib
 from functools import lru_cache
 
+from pyskeb.utils import ProxyPool
+
 _IP_FILE = os.path.join(os.path.dirname(__file__), 'iplist.txt')
 
 
@@ -18,3 +20,8 @@ def get_proxies():
                 retval.append(f'http://{line}:80')
 
     return retval
+
+
+@lru_cache()
+def get_proxy_pool() -> ProxyPool:
+    return ProxyPool(get_proxies())
@@ -0,0 +1,57 @@
+import pytest
+
+from pyskeb.models import parse_work_path, Work, User, Post
+
+
+@pytest.mark.unittest
+class TestModelsSkeb:
+    @pytest.mark.parametrize(['path', 'expected'], [
+        ('/@username/works/12', ('username', 12)),
+        ('@user.name_1/works/3/', ('user.name_1', 3)),
+    ])
+    def test_parse_work_path(self, path, expected):
+        assert parse_work_path(path) == expected
+
+    def test_parse_work_path_invalid(self):
+        with pytest.raises(ValueError):
+            parse_work_path('/@username')
+
+    def test_work(self):
+        work = Work.from_json({
+            'path': '/@artist/works/42',
+            'genre': 'art',
+            'nsfw': None,
+            'creator_id': 1,
+            'client_id': 2,
+            'thumbnail_image_urls': {'src': 'https://si.imgix.net/a.jpg', 'srcset': ''},
+            'word_count': 100,
+        })
+        assert (work.username, work.work_id) == ('artist', 42)
+        assert work.thumbnail_url == 'https://si.imgix.net/a.jpg'
+        assert work.nsfw is False
+        assert work.body is None
+        assert not hasattr(work, '__dict__')
+        assert work.to_dict()['creator_id'] == 1
+        assert work == Work.from_json({'path': '/@artist/works/42', 'genre': 'art', 'creator_id': 1,
+                                       'client_id': 2, 'thumbnail_image_urls': {'src': 'https://si.imgix.net/a.jpg'}})
+
+    def test_user(self):
+        user = User.from_json({'id': 5, 'screen_name': 'artist', 'name': 'Artist', 'creator': True})
+        assert user.screen_name == 'artist'
+        assert user.creator is True
+        assert user.acceptable is False
+
+    def test_post(self):
+        post = Post.from_json({
+            'path': '/@artist/works/42',
+            'body': 'see https://example.com',
+            'source_body': None,
+            'creator': {'screen_name': 'artist'},
+            'client': None,
+            'previews': [{'url': 'https://si.imgix.net/1.png'}, {'url': None}],
+        })
+        assert (post.username, post.work_id) == ('artist', 42)
+        assert post.source_body == ''
+        assert post.creator_screen_name == 'artist'
+        assert post.client_screen_name is None
+        assert post.preview_urls == ('https://si.imgix.net/1.png',)
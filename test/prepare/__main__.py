@@ -1,9 +1,10 @@
 import click
 from ditk import logging
 
-from .artists_idx import push_artists_sqlite
-from .lololo import batch_process_newest
-from .repack import repack_all
+from .profiler import dump_profile_at_exit
+
+# the modules of the commands are imported in the commands, so each command (and --help)
+# only pays for the dependencies it needs
 
 GLOBAL_CONTEXT_SETTINGS = dict(
     help_option_names=['-h', '--help']
@@ -11,25 +12,79 @@ GLOBAL_CONTEXT_SETTINGS = dict(
 
 
 @click.group(context_settings={**GLOBAL_CONTEXT_SETTINGS})
-def cli():
-    pass  # pragma: no cover
+@click.option('--profile-json', type=str, default=None, envvar='PROFILE_JSON',
+              help='JSON file of the per-stage timing report, the summary table is always logged at exit.')
+def cli(profile_json):
+    dump_profile_at_exit(profile_json)
 
 
 @cli.command('newest', context_settings={**GLOBAL_CONTEXT_SETTINGS})
 @click.option('-n', '--number', type=int, default=200)
-def newest(number):
+@click.option('--queue-file', type=str, default=None,
+              help='SQLite file of the job queue, the unfinished jobs in it will be resumed.')
+@click.option('--max-time', type=float, default=None,
+              help='Time budget in seconds, no new work is started when it may not finish in time.')
+def newest(number, queue_file, max_time):
+    from .lololo import batch_process_newest
+    logging.try_init_root(logging.DEBUG)
+    batch_process_newest(number, queue_file=queue_file, max_time_limit=max_time)
+
+
+@cli.command('drain', context_settings={**GLOBAL_CONTEXT_SETTINGS},
+             help='Process the jobs left in queue, can be run in multiple processes.')
+@click.option('--queue-file', type=str, default=None,
+              help='SQLite file of the job queue.')
+@click.option('--retry-failed', is_flag=True, default=False,
+              help='Retry the dead lettered jobs.')
+@click.option('--wait', is_flag=True, default=False,
+              help='Wait for the delayed retries and the jobs leased by other workers.')
+@click.option('--max-time', type=float, default=None,
+              help='Time budget in seconds, no new job is started when it may not finish in time.')
+def drain(queue_file, retry_failed, wait, max_time):
+    from .deadline import DeadlineScheduler
+    from .jobs import JobQueue
+    from .lololo import drain_jobs
     logging.try_init_root(logging.DEBUG)
-    batch_process_newest(number)
+    queue = JobQueue(queue_file)
+    if retry_failed:
+        logging.info(f'{queue.retry_failed()} failed job(s) moved back to pending.')
+    drain_jobs(queue, wait_retries=wait, scheduler=DeadlineScheduler(max_time))
+
+
+@cli.command('users', context_settings={**GLOBAL_CONTEXT_SETTINGS},
+             help='Crawl the posts via users with sharded worker processes.')
+@click.option('-s', '--shards', 'num_shards', type=int, default=4,
+              help='Number of shards (worker processes).')
+@click.option('-o', '--output-dir', type=str, default='users_crawl',
+              help='Directory of checkpoints and results, the unfinished shards in it will be resumed.')
+@click.option('--user-sort', type=click.Choice(['popularity', 'date', 'request_masters', 'first_requesters']),
+              default='popularity')
+@click.option('--work-role', type=click.Choice(['client', 'creator']), default='client')
+@click.option('--monitor-interval', type=float, default=30.0,
+              help='Interval of progress logging in seconds.')
+@click.option('--max-restarts', type=int, default=3,
+              help='Max restarts of each crashed shard.')
+def users(num_shards, output_dir, user_sort, work_role, monitor_interval, max_restarts):
+    from .shards import run_sharded_crawl
+    logging.try_init_root(logging.INFO)
+    run_sharded_crawl(output_dir, num_shards, user_sort=user_sort, work_role=work_role,
+                      monitor_interval=monitor_interval, max_restarts=max_restarts)
 
 
 @cli.command('pack', context_settings={**GLOBAL_CONTEXT_SETTINGS})
-def pack():
+@click.option('--max-time', type=float, default=None,
+              help='Time budget in seconds, the fetching stops early to leave time for packing and committing.')
+@click.option('--dedup-radius', type=int, default=None,
+              help='Drop the near-duplicate images within this Hamming distance of perceptual hashes.')
+def pack(max_time, dedup_radius):
+    from .repack import repack_all
     logging.try_init_root(logging.INFO)
-    repack_all()
+    repack_all(max_time_limit=max_time, dedup_radius=dedup_radius)
 
 
 @cli.command('artists', context_settings={**GLOBAL_CONTEXT_SETTINGS})
 def artists():
+    from .artists_idx import push_artists_sqlite
     logging.try_init_root(logging.DEBUG)
     push_artists_sqlite()
 
@@ -14,6 +14,9 @@ from orator import DatabaseManager
 from tqdm.auto import tqdm
 from waifuc.utils import get_requests_session
 
+from pyskeb.utils.jsons import response_json
+from .profiler import stage
+
 logging.basicConfig(level=logging.DEBUG)
 
 
@@ -53,17 +56,20 @@ session = get_requests_session(headers={
 
 
 def _get_page_data(page: int):
-    resp = session.get(
-        'https://danbooru.donmai.us/artists.json',
-        params={
-            "format": "json",
-            "limit": "1000",
-            "page": str(page),
-            'search[order]': 'post_count',
-        }
-    )
-    resp.raise_for_status()
-    return resp.json()
+    with stage('listing') as record:
+        resp = session.get(
+            'https://danbooru.donmai.us/artists.json',
+            params={
+                "format": "json",
+                "limit": "1000",
+                "page": str(page),
+                'search[order]': 'post_count',
+            }
+        )
+        resp.raise_for_status()
+        data = response_json(resp)
+        record.add(items=len(data), bytes_=len(resp.content))
+        return data
 
 
 def _get_total_pages():
@@ -100,10 +106,11 @@ def _get_all_data(pages: int = None):
     def _fn(p):
         items = list(_get_page_data(p))
         tags = [item['name'] for item in items]
-        mapping = {
-            item['name']: item['post_count'] for item in
-            _get_danbooru_db().table('tags').select('*').where_in('name', tags).get()
-        }
+        with stage('post_count', items=len(tags)):
+            mapping = {
+                item['name']: item['post_count'] for item in
+                _get_danbooru_db().table('tags').select('*').where_in('name', tags).get()
+            }
         for item in items:
             _append_data({
                 **item,
@@ -128,6 +135,12 @@ def _save_all_data_to_sql(sql_file, pages=None):
     sql = sqlite3.connect(sql_file)
 
     all_data = _get_all_data(pages)
+    with stage('sqlite', items=len(all_data)):
+        _write_sql(sql, all_data)
+    sql.close()
+
+
+def _write_sql(sql: sqlite3.Connection, all_data):
     df = pd.DataFrame(all_data)
 
     df['created_at'] = pd.to_datetime(df['created_at'] * 1e9)
@@ -157,8 +170,6 @@ def _save_all_data_to_sql(sql_file, pages=None):
     for column in artists_aliases_indices:
         sql.execute(f"CREATE INDEX artists_aliases_index_{column} ON artists_aliases ({column});").fetchall()
 
-    sql.close()
-
 
 def push_artists_sqlite():
     hf_client = HfApi(token=os.environ['HF_TOKEN_X'])
@@ -168,9 +179,10 @@ def push_artists_sqlite():
         sql_file = os.path.join(td, 'artists.sqlite')
         _save_all_data_to_sql(sql_file)
 
-        hf_client.upload_file(
-            repo_id=repository,
-            repo_type='dataset',
-            path_or_fileobj=sql_file,
-            path_in_repo='artists.sqlite'
-        )
+        with stage('upload', items=1, bytes_=os.path.getsize(sql_file)):
+            hf_client.upload_file(
+                repo_id=repository,
+                repo_type='dataset',
+                path_or_fileobj=sql_file,
+                path_in_repo='artists.sqlite'
+            )
@@ -1,20 +1,44 @@
 import math
 import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
 
-from PIL import Image
-from hfutils.index import tar_get_index_info
-from huggingface_hub import HfApi, HfFileSystem, configure_http_backend
+if TYPE_CHECKING:
+    from huggingface_hub import HfApi, HfFileSystem
 
-from pyskeb.utils import get_requests_session
 
-Image.MAX_IMAGE_PIXELS = 17000 ** 2
-configure_http_backend(get_requests_session)
+# the huggingface clients are created on first use, so the commands which do not need them
+# (and --help) do not pay for importing huggingface_hub
+@lru_cache()
+def _configure_http_backend():
+    from huggingface_hub import configure_http_backend
+    from pyskeb.utils import get_requests_session
+    configure_http_backend(get_requests_session)
 
-hf_token = os.environ.get('HF_TOKEN')
-hf_client = HfApi(token=hf_token)
-hf_fs = HfFileSystem(token=hf_token)
 
-_REPOSITORY = os.environ['REMOTE_REPOSITORY']
+def get_hf_token() -> Optional[str]:
+    return os.environ.get('HF_TOKEN')
+
+
+@lru_cache()
+def get_hf_client() -> 'HfApi':
+    from huggingface_hub import HfApi
+    _configure_http_backend()
+    return HfApi(token=get_hf_token())
+
+
+@lru_cache()
+def get_hf_fs() -> 'HfFileSystem':
+    from huggingface_hub import HfFileSystem
+    _configure_http_backend()
+    return HfFileSystem(token=get_hf_token())
+
+
+def get_repository() -> str:
+    """
+    Repository of the crawled resources, ``REMOTE_REPOSITORY`` in environment.
+    """
+    return os.environ['REMOTE_REPOSITORY']
 
 
 class GenericException(Exception):
@@ -22,16 +46,17 @@ class GenericException(Exception):
 
 
 def _ensure_repository():
-    if not hf_client.repo_exists(repo_id=_REPOSITORY, repo_type='dataset'):
+    hf_client, hf_fs, repository = get_hf_client(), get_hf_fs(), get_repository()
+    if not hf_client.repo_exists(repo_id=repository, repo_type='dataset'):
         hf_client.create_repo(
-            repo_id=_REPOSITORY,
+            repo_id=repository,
             repo_type='dataset',
             exist_ok=True,
             private=True,
         )
-        lines = hf_fs.read_text(f'datasets/{_REPOSITORY}/.gitattributes').splitlines(keepends=False)
+        lines = hf_fs.read_text(f'datasets/{repository}/.gitattributes').splitlines(keepends=False)
         lines = [*filter(bool, lines), 'archived.json filter=lfs diff=lfs merge=lfs -text']
-        hf_fs.write_text(f'datasets/{_REPOSITORY}/.gitattributes', os.linesep.join(lines))
+        hf_fs.write_text(f'datasets/{repository}/.gitattributes', os.linesep.join(lines))
 
 
 _NUM_TAGS = [
@@ -58,4 +83,5 @@ def number_to_tag(v):
 
 
 def make_index_file(src_tar_file, chunk_for_hash: int = 1 << 20):
+    from hfutils.index import tar_get_index_info
     return tar_get_index_info(src_tar_file, chunk_for_hash, with_hash=True)
@@ -1,24 +1,27 @@
 import json
 import os.path
 import re
-import shutil
-import zipfile
+from typing import Optional
 
-import pandas as pd
 from ditk import logging
-from hbutils.scale import size_to_bytes_str
-from hbutils.string import plural_word
 from hbutils.system import TemporaryDirectory, urlsplit
-from hfutils.operate import download_file_to_file, upload_directory_as_directory
-from huggingface_hub import hf_hub_url
 from tqdm import tqdm
 
-from pyskeb.utils import get_random_mobile_ua, download_file, get_requests_session
-from ..base import hf_fs, hf_client, hf_token
-
-
-def bsuit_crawl(repository: str, maxcnt: int = 100):
-    session = get_requests_session()
+from pyskeb.utils import get_random_mobile_ua, download_file, get_requests_session, RetryPolicy
+from pyskeb.utils.jsons import response_json
+from pyskeb.utils.session import srequest
+from ..base import get_hf_client
+from ..deadline import DeadlineScheduler
+from ..packer import CrawlPacker
+
+
+def bsuit_crawl(repository: str, maxcnt: int = 100,
+                flush_items: Optional[int] = 500, flush_size: Optional[int] = 2 * 1024 ** 3,
+                max_time_limit: Optional[float] = None, reserve: float = 5 * 60):
+    scheduler = DeadlineScheduler(max_time_limit, reserve=reserve)
+    # all the retries are done by the retry policy, not the session
+    session = get_requests_session(max_retries=0)
+    retry_policy = RetryPolicy(max_retries=8, base_delay=2.0, max_delay=120.0)
     session.headers.update({
         'User-Agent': get_random_mobile_ua(),
         'Referer': 'https://www.bilibili.com/',
@@ -28,47 +31,35 @@ def bsuit_crawl(repository: str, maxcnt: int = 100):
         return re.sub(r'[\W_]+', '_', name_text).strip('_')
 
     logging.info('Getting SPI ...')
-    resp = session.get('https://api.bilibili.com/x/frontend/finger/spi')
-    resp.raise_for_status()
-    b3 = resp.json()['data']['b_3']
+    resp = srequest(session, 'GET', 'https://api.bilibili.com/x/frontend/finger/spi', retry_policy=retry_policy)
+    b3 = response_json(resp)['data']['b_3']
 
     logging.info('Access mall list ...')
-    resp = session.get('https://www.bilibili.com/h5/mall/list')
-    resp.raise_for_status()
+    resp = srequest(session, 'GET', 'https://www.bilibili.com/h5/mall/list', retry_policy=retry_policy)
 
-    if not hf_client.repo_exists(repo_id=repository, repo_type='dataset'):
-        hf_client.create_repo(repo_id=repository, repo_type='dataset', private=True)
-
-    if hf_fs.exists(f'datasets/{repository}/exist_sids.json'):
-        exist_sids = json.loads(hf_fs.read_text(f'datasets/{repository}/exist_sids.json'))
-    else:
-        exist_sids = []
-    exist_sids = set(exist_sids)
-    logging.info(f'{plural_word(len(exist_sids), "exist sid")} detected.')
+    if not get_hf_client().repo_exists(repo_id=repository, repo_type='dataset'):
+        get_hf_client().create_repo(repo_id=repository, repo_type='dataset', private=True)
 
     pg = tqdm(desc='Max Count', total=maxcnt)
     with TemporaryDirectory() as td:
-        if hf_fs.exists(f'datasets/{repository}/records.csv'):
-            records_csv = os.path.join(td, 'records.csv')
-            download_file_to_file(
-                local_file=records_csv,
-                repo_id=repository,
-                repo_type='dataset',
-                file_in_repo='records.csv',
-                hf_token=hf_token,
-            )
-            records = pd.read_csv(records_csv).to_dict('records')
-        else:
-            records = []
-
-        img_dir = os.path.join(td, 'images')
-        os.makedirs(img_dir, exist_ok=True)
+        packer = CrawlPacker(
+            repository=repository,
+            workdir=td,
+            pack_prefix='suit_pack',
+            count_column='Images',
+            sid_format='suit_{}',
+            max_items=flush_items,
+            max_size=flush_size,
+            scheduler=scheduler,
+        )
+        img_dir = packer.item_dir
 
         page, current_count = 1, 0
         while True:
             logging.info(f'Read item list page {page} ...')
-            resp = session.get(
-                'https://api.bilibili.com/x/garb/v2/mall/partition/item/list',
+            resp = srequest(
+                session, 'GET', 'https://api.bilibili.com/x/garb/v2/mall/partition/item/list',
+                retry_policy=retry_policy,
                 params={
                     'group_id': '0',
                     'location': 'mall_index_default_feed',
@@ -82,8 +73,7 @@ def bsuit_crawl(repository: str, maxcnt: int = 100):
                     })
                 }
             )
-            resp.raise_for_status()
-            lst = resp.json()['data']['list']
+            lst = response_json(resp)['data']['list']
 
             if not lst:
                 break
@@ -95,7 +85,7 @@ def bsuit_crawl(repository: str, maxcnt: int = 100):
                 short_name = item['name']
                 name = f'{group_name}_{short_name}' if group_name != short_name else short_name
                 logging.info(f'Suit item {suit_id!r} (name: {name!r}) detected.')
-                if suit_id in exist_sids:
+                if suit_id in packer:
                     logging.info(f'Suit item {suit_id!r} already crawled, skipped.')
                     continue
 
@@ -103,92 +93,50 @@ def bsuit_crawl(repository: str, maxcnt: int = 100):
                 if not jump_link:
                     continue
 
-                resp = session.get(
-                    'https://api.bilibili.com/x/garb/v2/mall/suit/detail',
-                    params={
-                        'buvid': b3,
-                        'from': '',
-                        'from_id': '',
-                        'item_id': item_id,
-                        'part': 'suit',
-                    }
-                )
-                resp.raise_for_status()
-
-                for sb_i, sb_item in enumerate(resp.json()['data']['suit_items'].get('space_bg') or []):
-                    sb_pp = sb_item['properties']
-                    vi = 1
-                    while True:
-                        if f'image{vi}_portrait' not in sb_pp:
-                            break
-
-                        image_url = sb_pp[f'image{vi}_portrait']
-                        image_name = f'suit_{item_id}__{_name_safe(name)}__{sb_i}-{vi}'
-                        _, ext = os.path.splitext(urlsplit(image_url).filename)
-                        dst_file = os.path.join(img_dir, f'{image_name}{ext}')
-                        logging.info(f'Downloading {image_url!r} to {dst_file!r} ...')
-                        download_file(image_url, filename=dst_file, session=session)
-
-                        vi += 1
+                # the last flush after this item should be finished in time as well
+                if not scheduler.can_start('item', final='flush', final_size=packer.pending_size()):
+                    break
+                with scheduler.unit('item'):
+                    resp = srequest(
+                        session, 'GET', 'https://api.bilibili.com/x/garb/v2/mall/suit/detail',
+                        retry_policy=retry_policy,
+                        params={
+                            'buvid': b3,
+                            'from': '',
+                            'from_id': '',
+                            'item_id': item_id,
+                            'part': 'suit',
+                        }
+                    )
+
+                    for sb_i, sb_item in enumerate(response_json(resp)['data']['suit_items'].get('space_bg') or []):
+                        sb_pp = sb_item['properties']
+                        vi = 1
+                        while True:
+                            if f'image{vi}_portrait' not in sb_pp:
+                                break
+
+                            image_url = sb_pp[f'image{vi}_portrait']
+                            image_name = f'suit_{item_id}__{_name_safe(name)}__{sb_i}-{vi}'
+                            _, ext = os.path.splitext(urlsplit(image_url).filename)
+                            dst_file = os.path.join(img_dir, f'{image_name}{ext}')
+                            logging.info(f'Downloading {image_url!r} to {dst_file!r} ...')
+                            download_file(image_url, filename=dst_file, session=session, retry_policy=retry_policy)
+
+                            vi += 1
 
                 current_count += 1
                 pg.update()
-                exist_sids.add(suit_id)
+                packer.add(suit_id)
                 if current_count >= maxcnt:
                     break
 
-            if current_count >= maxcnt:
+            if current_count >= maxcnt or scheduler.stopped:
                 break
 
             page += 1
 
-        if not os.listdir(img_dir):
-            logging.warning('No images found, quit.')
-            return
-
-        from ..repack import _timestamp
-        img_pack_file = os.path.join(td, f'suit_pack_{_timestamp()}.zip')
-        with zipfile.ZipFile(img_pack_file, 'w') as zf:
-            for file in os.listdir(img_dir):
-                zf.write(os.path.join(img_dir, file), file)
-
-        filename = os.path.basename(img_pack_file)
-        records.append({
-            'Filename': filename,
-            'Images': len(os.listdir(img_dir)),
-            'Size': size_to_bytes_str(os.path.getsize(img_pack_file), precision=3),
-            'Download': f'[Download]'
-                        f'({hf_hub_url(repo_id=repository, repo_type="dataset", filename=f"packs/{filename}")})',
-        })
-
-        export_dir = os.path.join(td, 'export')
-        os.makedirs(export_dir, exist_ok=True)
-
-        dst_pack_file = os.path.join(export_dir, f'packs', filename)
-        os.makedirs(os.path.dirname(dst_pack_file), exist_ok=True)
-        shutil.copy(img_pack_file, dst_pack_file)
-
-        df = pd.DataFrame(records)
-        df = df.sort_values(['Filename'], ascending=False)
-        df.to_csv(os.path.join(export_dir, 'records.csv'), index=False)
-        with open(os.path.join(export_dir, 'exist_sids.json'), 'w') as f:
-            json.dump(sorted(exist_sids), f)
-
-        md_file = os.path.join(export_dir, 'README.md')
-        with open(md_file, 'w') as f:
-            print('---', file=f)
-            print('license: other', file=f)
-            print('---', file=f)
-            print('', file=f)
-            print(df.to_markdown(index=False), file=f)
-
-        upload_directory_as_directory(
-            repo_id=repository,
-            repo_type='dataset',
-            local_directory=export_dir,
-            path_in_repo='.',
-            hf_token=hf_token,
-        )
+        packer.flush()
 
 
 if __name__ == '__main__':
@@ -196,4 +144,5 @@ if __name__ == '__main__':
     bsuit_crawl(
         repository=os.environ['REMOTE_REPOSITORY_BSUIT'],
         maxcnt=50000,
+        max_time_limit=5.5 * 60 * 60,
     )
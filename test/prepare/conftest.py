@@ -0,0 +1,43 @@
+import fnmatch
+
+import pytest
+
+
+class FakeHfFs:
+    """
+    In-memory replacement of the huggingface filesystem, for the repositories of one type (``datasets``).
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.commits = []
+
+    def exists(self, path: str) -> bool:
+        return path in self.files
+
+    def read_bytes(self, path: str) -> bytes:
+        return self.files[path]
+
+    def read_text(self, path: str) -> str:
+        return self.files[path].decode()
+
+    def glob(self, pattern: str):
+        return sorted(path for path in self.files if fnmatch.fnmatchcase(path, pattern))
+
+    def commit(self, repo_id: str, operations):
+        """
+        Apply the commit operations of huggingface_hub to the repository.
+        """
+        for operation in operations:
+            path = f'datasets/{repo_id}/{operation.path_in_repo}'
+            if hasattr(operation, 'path_or_fileobj'):
+                with open(operation.path_or_fileobj, 'rb') as f:
+                    self.files[path] = f.read()
+            else:
+                del self.files[path]
+        self.commits.append([operation.path_in_repo for operation in operations])
+
+
+@pytest.fixture()
+def fake_hf_fs():
+    return FakeHfFs()
@@ -0,0 +1,142 @@
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Iterable, Callable, Iterator, TypeVar, Set
+
+from ditk import logging
+from hbutils.string import plural_word
+
+_T = TypeVar('_T')
+
+
+class _UnitStats:
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.sized_time = 0.0
+        self.size = 0.0
+
+
+class DeadlineScheduler:
+    """
+    Time budget of a long-running job, such as a CI job with a hard time limit.
+
+    The cost of each kind of work unit (e.g. ``download``, ``flush``) is estimated from the observed ones,
+    by the throughput when the size of unit is given, otherwise by the mean time. Before starting a new unit,
+    :meth:`can_start` checks whether the unit, and the final work (e.g. the last flush or commit) after it,
+    can be finished in the remaining time, so the job can stop taking new work and save what has been done
+    instead of getting killed.
+
+    :param time_limit: Time limit in seconds from ``start_time``, ``None`` means no limit.
+    :param reserve: Reserved time in seconds, for the unobserved costs such as the first final flush.
+    :param safety: Safety factor of the estimated costs.
+    :param start_time: Start time of the job, the current time is used by default.
+    """
+
+    def __init__(self, time_limit: Optional[float] = None, reserve: float = 60.0, safety: float = 1.2,
+                 start_time: Optional[float] = None):
+        self.time_limit = time_limit
+        self.reserve = reserve
+        self.safety = safety
+        self.start_time = time.time() if start_time is None else start_time
+        self._stats: Dict[str, _UnitStats] = {}
+        self._stopped: Set[str] = set()
+
+    @property
+    def deadline(self) -> Optional[float]:
+        return self.start_time + self.time_limit if self.time_limit is not None else None
+
+    def remaining(self) -> float:
+        if self.time_limit is None:
+            return float('inf')
+        return self.deadline - time.time()
+
+    @contextmanager
+    def unit(self, name: str, size: Optional[float] = None):
+        """
+        Run a work unit and record its cost.
+
+        :param name: Kind of the unit.
+        :param size: Size of the unit, such as bytes or files, for throughput based estimation.
+        """
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            # the failed units (e.g. timeouts) are recorded too, they are often the most expensive ones
+            duration = time.time() - start_time
+            if name not in self._stats:
+                self._stats[name] = _UnitStats()
+            stats = self._stats[name]
+            stats.count += 1
+            stats.time += duration
+            if size:
+                stats.sized_time += duration
+                stats.size += size
+
+    def estimate(self, name: str, size: Optional[float] = None) -> Optional[float]:
+        """
+        Estimate the cost of a unit in seconds, ``None`` when no such unit has been observed.
+        """
+        stats = self._stats.get(name)
+        if stats is None or not stats.count:
+            return None
+        if size is not None and stats.size > 0:
+            return size * stats.sized_time / stats.size
+        return stats.time / stats.count
+
+    def can_start(self, name: str, size: Optional[float] = None,
+                  final: Optional[str] = None, final_size: Optional[float] = None) -> bool:
+        """
+        Check whether a new unit can be finished in time, with the final work after it.
+
+        :param name: Kind of the new unit.
+        :param size: Size of the new unit.
+        :param final: Kind of the final work, such as ``flush``.
+        :param final_size: Size of the final work.
+        :return: Whether the new unit should be started. Once ``False`` is returned, the following
+            checks of the same kind will be ``False`` too, while the other kinds (such as the final work)
+            are still checked by their own costs.
+        """
+        if self.time_limit is None:
+            return True
+        if name in self._stopped:
+            return False
+
+        cost = self.estimate(name, size) or 0.0
+        if final is not None:
+            cost += self.estimate(final, final_size) or 0.0
+        remaining = self.remaining()
+        if remaining < cost * self.safety + self.reserve:
+            logging.warning(f'Time budget is running out ({remaining:.1f}s remaining, '
+                            f'{cost:.1f}s + {self.reserve:.1f}s reserved needed for next {name!r}), '
+                            f'stop taking new work.')
+            self._stopped.add(name)
+            return False
+        return True
+
+    @property
+    def stopped(self) -> bool:
+        """
+        Whether any kind of units has been stopped.
+        """
+        return bool(self._stopped)
+
+    def is_stopped(self, name: str) -> bool:
+        return name in self._stopped
+
+    def iterate(self, items: Iterable[_T], name: str, size_fn: Optional[Callable[[_T], float]] = None,
+                final: Optional[str] = None, final_size_fn: Optional[Callable[[], float]] = None) -> Iterator[_T]:
+        """
+        Iterate the items as units until the time budget runs out, the cost of each item is recorded
+        until the next one is requested.
+        """
+        count = 0
+        for item in items:
+            size = size_fn(item) if size_fn is not None else None
+            final_size = final_size_fn() if final_size_fn is not None else None
+            if not self.can_start(name, size, final, final_size):
+                logging.info(f'{plural_word(count, name)} done before the deadline.')
+                break
+            with self.unit(name, size):
+                yield item
+            count += 1
@@ -0,0 +1,216 @@
+import io
+import mimetypes
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .thumbs import make_thumbnail_and_hash
+
+_HASH_BITS = 64
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def hex_to_hashes(hashes: Iterable[str]) -> np.ndarray:
+    """
+    Pack the 16 hex digits perceptual hashes (the ``phash`` column) into an ``uint64`` array.
+    """
+    hashes = list(hashes)
+    if not hashes:
+        return np.zeros((0,), dtype=np.uint64)
+    return np.frombuffer(bytes.fromhex(''.join(hashes)), dtype='>u8').astype(np.uint64)
+
+
+def hamming_distances(hashes: np.ndarray, query) -> np.ndarray:
+    """
+    Hamming distances between the packed hashes and the query hash, vectorized.
+    """
+    xor = np.bitwise_xor(hashes, np.uint64(query))
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(xor).astype(np.int64)
+    else:  # pragma: no cover
+        return _BYTE_POPCOUNT[xor.view(np.uint8).reshape(-1, 8)].sum(axis=1).astype(np.int64)
+
+
+def _neighbors(value: int, bits: int, radius: int) -> List[int]:
+    # all the values within the hamming radius of value
+    retval = [value]
+    for r in range(1, radius + 1):
+        for positions in combinations(range(bits), r):
+            flipped = value
+            for position in positions:
+                flipped ^= 1 << position
+            retval.append(flipped)
+    return retval
+
+
+class DuplicateIndex:
+    """
+    Near-duplicate index of the 64-bit perceptual hashes, with multi-index hashing.
+
+    The hashes are split into ``substrings`` substrings. By the pigeonhole principle, when two hashes
+    are within Hamming distance ``radius``, at least one pair of their substrings is within distance
+    ``radius // substrings``, so the candidates are looked up in the sorted substring tables, and then
+    verified by the full distance.
+
+    The hashes are kept in packed ``uint64`` arrays, and can be added incrementally (e.g. per pack),
+    the substring tables are rebuilt on the next query.
+
+    :param radius: Max Hamming distance of the near-duplicates.
+    :param substrings: Number of the substrings, should divide 64.
+    """
+
+    def __init__(self, radius: int = 6, substrings: int = 4):
+        if _HASH_BITS % substrings:
+            raise ValueError(f'Substrings should divide {_HASH_BITS}, but {substrings!r} found.')
+        self.radius = radius
+        self.substrings = substrings
+        self.ids = np.zeros((0,), dtype=np.int64)
+        self.hashes = np.zeros((0,), dtype=np.uint64)
+        self._tables: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, ids, hashes):
+        """
+        Add the hashes with their ids.
+        """
+        ids, hashes = np.asarray(ids, dtype=np.int64), np.asarray(hashes, dtype=np.uint64)
+        if ids.shape != hashes.shape:
+            raise ValueError(f'Ids and hashes not match, {ids.shape!r} and {hashes.shape!r} found.')
+        self.ids = np.concatenate([self.ids, ids])
+        self.hashes = np.concatenate([self.hashes, hashes])
+        self._tables = None
+
+    @property
+    def _sub_bits(self) -> int:
+        return _HASH_BITS // self.substrings
+
+    def _substring(self, hashes, i: int):
+        mask = np.uint64((1 << self._sub_bits) - 1)
+        return (hashes >> np.uint64(i * self._sub_bits)) & mask
+
+    def _get_tables(self) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if self._tables is None:
+            self._tables = []
+            for i in range(self.substrings):
+                keys = self._substring(self.hashes, i)
+                order = np.argsort(keys, kind='stable')
+                self._tables.append((keys[order], order))
+        return self._tables
+
+    def query(self, hash_, radius: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Find the near-duplicates of the hash.
+
+        :return: Ids and distances of the near-duplicates, sorted by distance.
+        """
+        radius = self.radius if radius is None else radius
+        if not len(self):
+            return []
+        hash_ = int(hash_)
+        sub_radius = radius // self.substrings
+        candidates = []
+        for i, (keys, order) in enumerate(self._get_tables()):
+            sub_value = (hash_ >> (i * self._sub_bits)) & ((1 << self._sub_bits) - 1)
+            probes = np.array(_neighbors(sub_value, self._sub_bits, sub_radius), dtype=np.uint64)
+            lefts = np.searchsorted(keys, probes, side='left')
+            rights = np.searchsorted(keys, probes, side='right')
+            for left, right in zip(lefts, rights):
+                if left < right:
+                    candidates.append(order[left:right])
+        if not candidates:
+            return []
+
+        positions = np.unique(np.concatenate(candidates))
+        distances = hamming_distances(self.hashes[positions], hash_)
+        matched = distances <= radius
+        positions, distances = positions[matched], distances[matched]
+        result = sorted(zip(self.ids[positions].tolist(), distances.tolist()), key=lambda x: (x[1], x[0]))
+        return result
+
+    def save(self, file):
+        """
+        Save the index into ``npz`` file (path or file object).
+        """
+        np.savez_compressed(file, ids=self.ids, hashes=self.hashes,
+                            config=np.array([self.radius, self.substrings], dtype=np.int64))
+
+    @classmethod
+    def load(cls, file) -> 'DuplicateIndex':
+        if isinstance(file, bytes):
+            file = io.BytesIO(file)
+        data = np.load(file)
+        radius, substrings = data['config'].tolist()
+        index = cls(radius=radius, substrings=substrings)
+        index.add(data['ids'], data['hashes'])
+        return index
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict], radius: int = 6, substrings: int = 4) -> 'DuplicateIndex':
+        """
+        Create the index from the rows of ``table.parquet``, the rows without ``phash`` are ignored.
+        """
+        index = cls(radius=radius, substrings=substrings)
+        pairs = [(row['id'], row['phash']) for row in rows if row.get('phash')]
+        if pairs:
+            ids, phashes = zip(*pairs)
+            index.add(ids, hex_to_hashes(phashes))
+        return index
+
+    def add_unique(self, ids, hashes) -> List[Tuple[int, Optional[int]]]:
+        """
+        Add the hashes one by one, each one is checked against the indexed and the previously added ones.
+
+        :return: Ids and the id of their closest near-duplicate, ``None`` when no near-duplicate found.
+        """
+        retval = []
+        ids, hashes = np.asarray(ids, dtype=np.int64), np.asarray(hashes, dtype=np.uint64)
+        # the new hashes are checked among themselves by vectorized distances, no need to rebuild the tables
+        base_size = len(self)
+        for i, (id_, hash_) in enumerate(zip(ids.tolist(), hashes.tolist())):
+            matches = self.query(hash_) if base_size else []
+            if i:
+                distances = hamming_distances(hashes[:i], hash_)
+                matches.extend((ids[j].item(), distances[j].item())
+                               for j in np.flatnonzero(distances <= self.radius))
+            duplicate_of = min(matches, key=lambda x: (x[1], x[0]))[0] if matches else None
+            retval.append((id_, duplicate_of))
+        self.add(ids, hashes)
+        return retval
+
+
+def remove_near_duplicates(directory: str, index: DuplicateIndex, max_workers: Optional[int] = None) -> List[str]:
+    """
+    Remove the images in directory which are near-duplicates of the indexed ones or of each other,
+    the hashes of the kept images are added to the index.
+
+    :return: Relative paths of the removed images.
+    """
+    files = []
+    for root, _, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            mimetype, _ = mimetypes.guess_type(filename)
+            if mimetype and mimetype.startswith('image/'):
+                files.append(os.path.join(root, filename))
+    if not files:
+        return []
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        phashes = list(executor.map(make_thumbnail_and_hash, files, [64] * len(files), chunksize=8))
+    hashed = [(file, phash) for file, (phash, _) in zip(files, phashes) if phash is not None]
+    if not hashed:
+        return []
+
+    # ids of the kept files are meaningless, only the hashes matter here
+    ids = np.arange(len(hashed), dtype=np.int64) + (int(index.ids.max()) + 1 if len(index) else 0)
+    results = index.add_unique(ids, hex_to_hashes(phash for _, phash in hashed))
+    removed = []
+    for (file, _), (_, duplicate_of) in zip(hashed, results):
+        if duplicate_of is not None:
+            os.remove(file)
+            removed.append(os.path.relpath(file, directory))
+    return removed
@@ -1,26 +1,32 @@
 import os.path
 import zipfile
 
-from hbutils.system import urlsplit
+import pyrfc6266
+from stream_unzip import stream_unzip
 from urlobject import URLObject
 
+from pyskeb.utils import get_requests_session
 from pyskeb.utils.download import download_file
+from pyskeb.utils.session import srequest
+from .router import split_url
+
+DROPBOX_HOSTS = {'dropbox.com', 'www.dropbox.com'}
 
 
 def is_dropbox(url):
-    splitted = urlsplit(url)
-    return splitted.host in {'dropbox.com', 'www.dropbox.com'} and splitted.query_dict.get('dl') == '0'
+    splitted = split_url(url)
+    return splitted.host in DROPBOX_HOSTS and splitted.query_dict.get('dl') == '0'
 
 
 def get_dropbox_resource(url):
-    splitted = urlsplit(url)
-    assert splitted.host in {'dropbox.com', 'www.dropbox.com'}
+    splitted = split_url(url)
+    assert splitted.host in DROPBOX_HOSTS
     return '_'.join(['dropbox', *(item for item in splitted.path_segments if item)])
 
 
 def download_dropbox_to_directory(url, output_directory):
-    splitted = urlsplit(url)
-    assert splitted.host in {'dropbox.com', 'www.dropbox.com'}
+    splitted = split_url(url)
+    assert splitted.host in DROPBOX_HOSTS
 
     download_url = URLObject(url).set_query_param('dl', '1')
     target_file = download_file(download_url, output_directory=output_directory)
@@ -28,3 +34,40 @@ def download_dropbox_to_directory(url, output_directory):
         with zipfile.ZipFile(target_file, 'r') as zf:
             zf.extractall(output_directory)
         os.remove(target_file)
+
+
+def _decode_member_name(name: bytes) -> str:
+    try:
+        return name.decode('utf-8')
+    except UnicodeDecodeError:
+        return name.decode('cp437')
+
+
+def stream_dropbox_to_archive(url, fn_write, chunk_size: int = 1 << 20):
+    """
+    Stream the Dropbox resource into an archive, without saving it to the disk.
+
+    When the resource is a zip file, its members are extracted from the downloading stream on the fly,
+    and each of them is passed to ``fn_write(relname, chunks)``, otherwise the file itself is passed.
+    """
+    splitted = split_url(url)
+    assert splitted.host in DROPBOX_HOSTS
+
+    download_url = URLObject(url).set_query_param('dl', '1')
+    resp = srequest(get_requests_session(), 'GET', download_url, stream=True, allow_redirects=True)
+    diso = resp.headers.get('Content-Disposition')
+    if not diso:
+        raise RuntimeError('Filename cannot be determined in the response headers.')
+    filename = pyrfc6266.parse_filename(diso)
+
+    chunks = resp.iter_content(chunk_size=chunk_size)
+    if os.path.splitext(filename)[1] == '.zip':
+        for name, _, member_chunks in stream_unzip(chunks, chunk_size=chunk_size):
+            name = _decode_member_name(name)
+            if name.endswith('/'):
+                for _ in member_chunks:
+                    pass
+            else:
+                fn_write(name, member_chunks)
+    else:
+        fn_write(filename, chunks)
@@ -1,3 +1,6 @@
+import hashlib
+import json
+import logging
 import mimetypes
 import os
 import os.path as osp
@@ -6,45 +9,83 @@ import re
 import textwrap
 import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 from http.cookiejar import MozillaCookieJar
+from threading import Lock, get_ident
 
 from gdown import download
 from gdown._indent import indent
+from gdown.exceptions import FileURLRetrievalError as _GdownFileURLRetrievalError
 from gdown.download import get_url_from_gdrive_confirmation, _get_session, _get_filename_from_response
 from gdown.download_folder import _download_and_parse_google_drive_link
 from gdown.parse_url import parse_url
-from hbutils.system import urlsplit
-from urlobject import URLObject
 
 from .base import GenericException
+from .router import split_url
 
 
 class FileURLRetrievalError(GenericException):
     pass
 
 
+GOOGLE_DRIVE_HOSTS = {'drive.google.com'}
+
+
 def is_google_drive(url):
-    return urlsplit(url).host == 'drive.google.com'
+    return split_url(url).host in GOOGLE_DRIVE_HOSTS
+
+
+class DrivePacer:
+    """
+    Thread-safe pacing controller shared by the concurrent Google Drive downloads.
+
+    The starting times of the downloads are spaced by a jittered interval. The interval is doubled
+    when Google Drive throttles us, and slowly decays back towards ``min_wait_time`` on success.
+    """
 
+    def __init__(self, wait_time: float = 5.0, min_wait_time: float = 1.0, max_wait_time: float = 120.0,
+                 ratio: float = 0.1, decay: float = 0.9):
+        self.wait_time = wait_time
+        self.min_wait_time = min_wait_time
+        self.max_wait_time = max_wait_time
+        self.ratio = ratio
+        self.decay = decay
+        self._last_time = time.time()
+        self._lock = Lock()
 
-_last_time = time.time()
-_wait_time = 5.0
-_ratio = 0.1
+    def _get_wait_time(self):
+        return (self.ratio * 2 * random.random() + (1 - self.ratio)) * self.wait_time
 
+    def wait(self):
+        with self._lock:
+            current_time = time.time()
+            scheduled_time = max(current_time, self._last_time + self._get_wait_time())
+            self._last_time = scheduled_time
+        if scheduled_time > current_time:
+            time.sleep(scheduled_time - current_time)
 
-def _get_wait_time():
-    return (_ratio * 2 * random.random() + (1 - _ratio)) * _wait_time
+    def success(self):
+        with self._lock:
+            self.wait_time = max(self.min_wait_time, self.wait_time * self.decay)
 
+    def throttled(self):
+        with self._lock:
+            self.wait_time = min(self.max_wait_time, self.wait_time * 2)
+            logging.warning(f'Google Drive throttled, wait time increased to {self.wait_time:.1f}s.')
 
-def _wait():
-    global _last_time
-    _duration = _last_time + _get_wait_time() - time.time()
-    if _duration > 0:
-        time.sleep(_duration)
-    _last_time = time.time()
+
+_pacer = DrivePacer()
+
+
+def _is_throttled(err: Exception) -> bool:
+    if isinstance(err, (_GdownFileURLRetrievalError, FileURLRetrievalError)):
+        message = str(err).lower()
+        return 'too many users' in message or 'many accesses' in message or 'quota' in message
+    else:
+        return False
 
 
-def _get_filename_from_id(resource_id, use_cookies: bool = False, proxy=None, fuzzy=False, verify=True):
+def _get_file_info_from_id(resource_id, use_cookies: bool = False, proxy=None, fuzzy=False, verify=True):
     url = "https://drive.google.com/uc?id={id}".format(id=resource_id)
     user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36"  # NOQA: E501
 
@@ -132,7 +173,7 @@ def _get_filename_from_id(resource_id, use_cookies: bool = False, proxy=None, fu
         # Need to redirect with confirmation
         try:
             url = get_url_from_gdrive_confirmation(res.text)
-        except FileURLRetrievalError as e:
+        except (FileURLRetrievalError, _GdownFileURLRetrievalError) as e:
             print(e)
             message = (
                 "Failed to retrieve file url:\n\n{}\n\n"
@@ -152,33 +193,36 @@ def _get_filename_from_id(resource_id, use_cookies: bool = False, proxy=None, fu
         filename_from_url = osp.basename(url)
     if filename_from_url is not None:
         filename_from_url = filename_from_url.encode('ISO-8859-1').decode()
-    return filename_from_url
+    size = res.headers.get('Content-Length')
+    size = int(size) if size is not None else None
+    res.close()
+    return filename_from_url, size
 
 
-def get_google_resource_id(drive_url, proxy=None):
-    drive_url = str(URLObject(drive_url).without_query())
-    file_id, is_downloadable_link = parse_url(drive_url)
-    if file_id is not None:
-        return f'googledrive_{file_id}'
-    else:
-        sess = _get_session(use_cookies=False, proxy=proxy, user_agent=None)
-        return_code, gdrive_file = _download_and_parse_google_drive_link(sess, drive_url, remaining_ok=True)
-        if gdrive_file is not None:
-            fid = re.sub(r'\?[\s\S]+?$', '', gdrive_file.id)
-            return f'googledrive_{fid}'
-        else:
-            return None
+_CACHE_DIR = os.environ.get(
+    'GOOGLE_DRIVE_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'pyskeb', 'google_drive'),
+)
+_CACHE_TTL = float(os.environ.get('GOOGLE_DRIVE_CACHE_TTL', 7 * 24 * 60 * 60))
 
 
-def get_google_drive_ids(drive_url, proxy=None):
-    file_id, is_downloadable_link = parse_url(drive_url)
+def _cache_file(drive_url):
+    return os.path.join(_CACHE_DIR, hashlib.sha1(drive_url.encode()).hexdigest() + '.json')
+
+
+def _resolve_google_drive(drive_url, proxy=None):
+    file_id, is_downloadable_link = parse_url(drive_url, warning=False)
     if file_id is not None:
-        return [(file_id, [_get_filename_from_id(file_id, use_cookies=False, proxy=proxy)])]
+        filename, size = _get_file_info_from_id(file_id, use_cookies=False, proxy=proxy)
+        return {
+            'resource_id': f'googledrive_{file_id}',
+            'files': [{'id': file_id, 'segments': [filename], 'size': size}],
+        }
     else:
         sess = _get_session(use_cookies=False, proxy=proxy, user_agent=None)
         return_code, gdrive_file = _download_and_parse_google_drive_link(sess, drive_url, remaining_ok=True)
         if not gdrive_file:
-            return []
+            return None
 
         def _recursive(gf, paths):
             if 'folder' in gf.type:
@@ -191,21 +235,100 @@ def get_google_drive_ids(drive_url, proxy=None):
                     name = gf.name + (mimetypes.guess_extension(gf.type) or '')
                 else:
                     name = gf.name
-                yield gf.id, [*paths, name]
+                yield {'id': gf.id, 'segments': [*paths, name], 'size': None}
+
+        fid = re.sub(r'\?[\s\S]+?$', '', gdrive_file.id)
+        return {
+            'resource_id': f'googledrive_{fid}',
+            'files': list(_recursive(gdrive_file, [])),
+        }
+
+
+def resolve_google_drive(drive_url, proxy=None):
+    """
+    Resolve the Google Drive URL to its resource id and files, the result is cached on disk
+    (``GOOGLE_DRIVE_CACHE_DIR``) for ``GOOGLE_DRIVE_CACHE_TTL`` seconds, so the resource id check,
+    existence check and download of the same URL share only one resolution.
+
+    :param drive_url: URL of Google Drive file or folder.
+    :param proxy: Proxy to use.
+    :return: Dict with ``resource_id`` and ``files`` (each with ``id``, ``segments`` and ``size``),
+        or ``None`` when the URL cannot be resolved.
+    """
+    cache_file = _cache_file(drive_url)
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r') as f:
+                data = json.load(f)
+            if data['url'] == drive_url and time.time() < data['resolved_at'] + _CACHE_TTL:
+                return data['resource']
+        except (json.JSONDecodeError, KeyError, TypeError):
+            # broken cache file, e.g. left by a killed process, resolve again
+            logging.warning(f'Broken Google Drive cache file {cache_file!r} of {drive_url!r}, ignored.')
+
+    resource = _resolve_google_drive(drive_url, proxy=proxy)
+    if resource is not None:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # the same url may be resolved by several threads at once
+        tmp_file = f'{cache_file}.{os.getpid()}_{get_ident()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                'url': drive_url,
+                'resolved_at': time.time(),
+                'resource': resource,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_file, cache_file)
+    return resource
+
+
+def get_google_resource_id(drive_url, proxy=None):
+    file_id, is_downloadable_link = parse_url(drive_url, warning=False)
+    if file_id is not None:
+        return f'googledrive_{file_id}'
 
-        return list(_recursive(gdrive_file, []))
+    resource = resolve_google_drive(drive_url, proxy=proxy)
+    return resource['resource_id'] if resource is not None else None
+
+
+def get_google_drive_ids(drive_url, proxy=None):
+    resource = resolve_google_drive(drive_url, proxy=proxy)
+    return [(item['id'], item['segments']) for item in resource['files']] if resource is not None else []
+
+
+def _download_file_with_pacing(id_, filename, proxy=None, max_retries: int = 3):
+    tries = 0
+    while True:
+        _pacer.wait()
+        try:
+            result = download(id=id_, output=filename, use_cookies=False, proxy=proxy, quiet=True)
+        except Exception as err:
+            tries += 1
+            if _is_throttled(err) and tries < max_retries:
+                _pacer.throttled()
+                continue
+            raise
+        else:
+            if not result:
+                raise FileURLRetrievalError(f'Failed to download file {id_!r} to {filename!r}.')
+            _pacer.success()
+            return result
 
 
-def download_google_to_directory(drive_url, output_directory, proxy=None):
+def download_google_to_directory(drive_url, output_directory, proxy=None, max_workers: int = 4):
     try:
-        for id_, segments in get_google_drive_ids(drive_url, proxy=proxy):
-            filename = os.path.join(output_directory, *segments)
-            if os.path.dirname(filename):
-                os.makedirs(os.path.dirname(filename), exist_ok=True)
-
-            _wait()
-            if not download(id=id_, output=filename, use_cookies=False, proxy=proxy):
-                warnings.warn(f'Error occurred, skip this directory: {drive_url!r}!')
-                break
+        with ThreadPoolExecutor(max_workers=max_workers) as tp:
+            futures = []
+            for id_, segments in get_google_drive_ids(drive_url, proxy=proxy):
+                filename = os.path.join(output_directory, *segments)
+                if os.path.dirname(filename):
+                    os.makedirs(os.path.dirname(filename), exist_ok=True)
+                futures.append(tp.submit(_download_file_with_pacing, id_, filename, proxy))
+
+            done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in not_done:
+                future.cancel()
+            for future in done:
+                if future.exception() is not None:
+                    raise future.exception()
     except Exception as err:
         warnings.warn(f'Skipped for {drive_url!r}, err: {err!r}')
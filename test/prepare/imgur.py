@@ -1,19 +1,40 @@
+import json
 import mimetypes
 import os.path
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
+from threading import Lock
+from typing import Optional
 from urllib.parse import urljoin
 
-import requests
-from hbutils.system import urlsplit
 from pyquery import PyQuery as pq
 
+from pyskeb.utils import get_requests_session
 from pyskeb.utils.download import download_file
+from pyskeb.utils.jsons import response_json
+from .router import split_url
+
+IMGUR_HOSTS = {'imgur.com'}
+
+_CLIENT_ID_FILE = os.environ.get(
+    'IMGUR_CLIENT_ID_FILE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'pyskeb', 'imgur_client_id.json'),
+)
+_CLIENT_ID_TTL = float(os.environ.get('IMGUR_CLIENT_ID_TTL', 24 * 60 * 60))
 
 
 @lru_cache()
-def _get_client_id():
-    resp = requests.get('https://imgur.com/')
+def _get_session():
+    return get_requests_session(headers={
+        'Referer': 'https://imgur.com/',
+    })
+
+
+def _scrape_client_id():
+    session = _get_session()
+    resp = session.get('https://imgur.com/')
     resp.raise_for_status()
 
     main_js = None
@@ -23,46 +44,89 @@ def _get_client_id():
 
     assert main_js
 
-    resp = requests.get(main_js)
+    resp = session.get(main_js)
     resp.raise_for_status()
 
     return re.findall(r'apiClientId:\s*\"([a-z\d]+)\"', resp.text)[0]
 
 
+_client_id: Optional[str] = None
+_client_id_lock = Lock()
+
+
+def _get_client_id(refresh: bool = False):
+    global _client_id
+    with _client_id_lock:
+        if not refresh:
+            if _client_id is not None:
+                return _client_id
+            if os.path.exists(_CLIENT_ID_FILE):
+                with open(_CLIENT_ID_FILE, 'r') as f:
+                    data = json.load(f)
+                if time.time() < data['updated_at'] + _CLIENT_ID_TTL:
+                    _client_id = data['client_id']
+                    return _client_id
+
+        _client_id = _scrape_client_id()
+        os.makedirs(os.path.dirname(_CLIENT_ID_FILE), exist_ok=True)
+        with open(_CLIENT_ID_FILE, 'w') as f:
+            json.dump({'client_id': _client_id, 'updated_at': time.time()}, f)
+        return _client_id
+
+
 def _get_medias(id_):
-    resp = requests.get(
-        f'https://api.imgur.com/post/v1/albums/{id_}',
-        params={
-            'client_id': _get_client_id(),
-            'include': 'media,adconfig,account',
-        },
-        headers={
-            'Referer': 'https://imgur.com/',
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36',
-        }
-    )
-    resp.raise_for_status()
-    return list(resp.json().get('media') or [])
+    refreshed = False
+    while True:
+        resp = _get_session().get(
+            f'https://api.imgur.com/post/v1/albums/{id_}',
+            params={
+                'client_id': _get_client_id(refresh=refreshed),
+                'include': 'media,adconfig,account',
+            },
+        )
+        if resp.status_code in {401, 403} and not refreshed:
+            # the client id may have been expired, scrape a new one
+            refreshed = True
+            continue
+
+        resp.raise_for_status()
+        return list(response_json(resp).get('media') or [])
 
 
 def is_imgur(url):
-    splitted = urlsplit(url)
-    return splitted.host == 'imgur.com' and splitted.path_segments[1] == 'a'
+    splitted = split_url(url)
+    return splitted.host in IMGUR_HOSTS and len(splitted.path_segments) > 2 and splitted.path_segments[1] == 'a'
 
 
 def get_imgur_resource(url):
-    splitted = urlsplit(url)
+    splitted = split_url(url)
     assert splitted.path_segments[1] == 'a'
     return f'imgur_{splitted.path_segments[2]}'
 
 
-def download_imgur_to_directory(url, output_directory):
-    splitted = urlsplit(url)
+def download_imgur_to_directory(url, output_directory, max_workers: int = 8):
+    splitted = split_url(url)
     assert splitted.path_segments[1] == 'a'
     id_ = splitted.path_segments[2]
-    for item in _get_medias(id_):
-        if 'url' in item and 'name' in item:
-            filename = item['name']
-            if not os.path.splitext(filename)[1]:
-                filename = filename + (mimetypes.guess_extension(item.get('mime_type')) or '')
-            download_file(item['url'], os.path.join(output_directory, filename))
+    with ThreadPoolExecutor(max_workers=max_workers) as tp:
+        futures = []
+        filenames = set()
+        for i, item in enumerate(_get_medias(id_)):
+            if 'url' in item and 'name' in item:
+                filename = item['name'] or item.get('id') or str(i)
+                if not os.path.splitext(filename)[1]:
+                    filename = filename + (mimetypes.guess_extension(item.get('mime_type')) or '')
+                # the names in one album may repeat, they must not be downloaded to the same file
+                body, ext = os.path.splitext(filename)
+                suffix, attempt = item.get('id') or str(i), 0
+                while filename.lower() in filenames:
+                    attempt += 1
+                    filename = f'{body}_{suffix}{ext}' if attempt == 1 else f'{body}_{suffix}_{attempt}{ext}'
+                filenames.add(filename.lower())
+                futures.append(tp.submit(
+                    download_file, item['url'], os.path.join(output_directory, filename),
+                    session=_get_session(), silent=True,
+                ))
+
+        for future in futures:
+            future.result()
@@ -3,7 +3,8 @@ import json
 import mimetypes
 import os
 import re
-import time
+from functools import lru_cache
+from typing import Optional
 
 import magic
 import numpy as np
@@ -13,17 +14,68 @@ from ditk import logging
 from hbutils.string import plural_word
 from hbutils.system import TemporaryDirectory
 from hfutils.archive import archive_pack
-from hfutils.index import tar_create_index_for_directory
+from hfutils.index import tar_create_index_for_directory, tar_create_index
 from hfutils.operate import get_hf_client, get_hf_fs, download_archive_as_directory, upload_directory_as_directory
 from hfutils.utils import parse_hf_fs_path, number_to_tag
 from tqdm import tqdm
 
+from .deadline import DeadlineScheduler
+from .dedup import DuplicateIndex, hex_to_hashes
+from .profiler import stage, dump_profile_at_exit
+from .report import IndexReport
+from .thumbs import create_thumbnails
+
 mimetypes.add_type('image/webp', '.webp')
 Image.MAX_IMAGE_PIXELS = None
 
 
-def sync(src_repo: str, dst_repo: str, max_time_limit: float = 5.5 * 60 * 60):
-    start_time = time.time()
+@lru_cache()
+def _get_magic():
+    return magic.Magic(mime=True)
+
+
+def get_file_meta(filepath: str, file_in_archive: str) -> dict:
+    """
+    Get the group, mimetype, extension and image size of the file in archive.
+    """
+    segments = list(filter(bool, re.split(r'[\\/]+', file_in_archive)))
+    group_name = segments[0]
+    mimetype, _ = mimetypes.guess_type(file_in_archive)
+    _, ext = os.path.splitext(file_in_archive)
+    if not mimetype:
+        mimetype = _get_magic().from_file(filepath)
+        ext = mimetypes.guess_extension(mimetype)
+
+    if mimetype and mimetype.startswith('image/'):
+        try:
+            with Image.open(filepath) as image:
+                width, height = image.width, image.height
+        except UnidentifiedImageError:
+            width, height = None, None
+    else:
+        width, height = None, None
+
+    return {
+        'group': group_name,
+        'mimetype': mimetype,
+        'ext': ext,
+        'width': width,
+        'height': height,
+    }
+
+
+def sync(src_repo: str, dst_repo: str, max_time_limit: float = 5.5 * 60 * 60, reserve: float = 5 * 60,
+         with_thumbnails: bool = False, thumbnail_size: int = 256, max_workers: Optional[int] = None):
+    """
+    Sync the zip packs in ``src_repo`` to tar packs in ``dst_repo``, with the file table ``table.parquet``.
+
+    When ``with_thumbnails`` is enabled, the images are decoded once to compute the perceptual hashes
+    (column ``phash``, 16 hex digits) and the thumbnails, which are saved in ``thumbs/<pack_id>.tar``
+    (columns ``thumbnail_archive_file`` and ``thumbnail_file_in_archive``). The new images are also
+    checked against all the indexed ones by the hashes, the id of the near-duplicate is saved in column
+    ``duplicate_of``.
+    """
+    scheduler = DeadlineScheduler(max_time_limit, reserve=reserve)
     hf_client = get_hf_client()
     hf_fs = get_hf_fs()
 
@@ -56,18 +108,20 @@ def sync(src_repo: str, dst_repo: str, max_time_limit: float = 5.5 * 60 * 60):
             repo_type='dataset',
             filename='table.parquet'
         )).replace(np.nan, None)
+        # the table is kept in descending order of id, the new rows of each pack are put in front
+        df = df.sort_values(by=['id'], ascending=[False])
         rows = df.to_dict('records')
         max_id = df['id'].max().item()
     else:
+        df = None
         rows = []
         max_id = 0
+    report = IndexReport.from_frame(df)
+    dedup = DuplicateIndex.from_rows(rows) if with_thumbnails else None
 
-    for pack_id in tqdm(src_ids, desc='Sync Packs'):
-        if start_time + max_time_limit < time.time():
-            break
-        if pack_id in dst_ids:
-            logging.warning(f'Package {pack_id!r} already synced, skipped.')
-            continue
+    src_ids = [pack_id for pack_id in src_ids if pack_id not in dst_ids]
+    logging.info(f'{plural_word(len(src_ids), "package")} to sync.')
+    for pack_id in tqdm(scheduler.iterate(src_ids, 'pack'), desc='Sync Packs', total=len(src_ids)):
 
         with TemporaryDirectory() as td:
             tar_file = os.path.join(td, 'packs', f'{pack_id}.tar')
@@ -75,45 +129,35 @@ def sync(src_repo: str, dst_repo: str, max_time_limit: float = 5.5 * 60 * 60):
 
             with TemporaryDirectory() as tmpdir:
                 logging.info(f'Downloading {pack_id!r} from src repo ...')
-                download_archive_as_directory(
-                    repo_id=src_repo,
-                    repo_type='dataset',
-                    file_in_repo=f'{pack_id}.zip',
-                    local_directory=tmpdir,
-                )
+                with stage('download', items=1):
+                    download_archive_as_directory(
+                        repo_id=src_repo,
+                        repo_type='dataset',
+                        file_in_repo=f'{pack_id}.zip',
+                        local_directory=tmpdir,
+                    )
 
                 logging.info('Packing archive ...')
-                archive_pack('tar', tmpdir, tar_file)
-                tar_create_index_for_directory(src_tar_directory=td)
+                with stage('pack', items=1) as record:
+                    archive_pack('tar', tmpdir, tar_file)
+                    tar_create_index_for_directory(src_tar_directory=td)
+                    record.add(bytes_=os.path.getsize(tar_file))
 
-                new_row_count = 0
+                pack_rows = []
+                image_files = []
                 idx_file = os.path.splitext(tar_file)[0] + '.json'
                 with open(idx_file, 'r') as mf:
                     meta = json.load(mf)
                 for file_in_archive in meta['files'].keys():
                     filepath = os.path.join(tmpdir, file_in_archive)
-                    segments = list(filter(bool, re.split(r'[\\/]+', file_in_archive)))
-                    group_name = segments[0]
-                    mimetype, _ = mimetypes.guess_type(file_in_archive)
-                    _, ext = os.path.splitext(file_in_archive)
-                    if not mimetype:
-                        mime = magic.Magic(mime=True)
-                        mimetype = mime.from_file(filepath)
-                        ext = mimetypes.guess_extension(mimetype)
-
-                    if mimetype and mimetype.startswith('image/'):
-                        try:
-                            image = Image.open(filepath)
-                        except UnidentifiedImageError:
-                            width, height = None, None
-                        else:
-                            width, height = image.width, image.height
-                    else:
-                        width, height = None, None
+                    with stage('file_meta', items=1, bytes_=os.path.getsize(filepath)):
+                        file_meta = get_file_meta(filepath, file_in_archive)
+                    group_name, mimetype, ext = file_meta['group'], file_meta['mimetype'], file_meta['ext']
+                    width, height = file_meta['width'], file_meta['height']
                     filename = f'{max_id}{(ext or "").lower()}'
 
                     max_id += 1
-                    rows.append({
+                    pack_rows.append({
                         'id': max_id,
                         'pack_id': pack_id,
                         'archive_file': os.path.relpath(tar_file, td),
@@ -125,13 +169,45 @@ def sync(src_repo: str, dst_repo: str, max_time_limit: float = 5.5 * 60 * 60):
                         'width': width,
                         'height': height,
                     })
-                    new_row_count += 1
-
-            df = pd.DataFrame(rows)
-            df = df.sort_values(by=['id'], ascending=[False])
-            df.to_parquet(os.path.join(td, 'table.parquet'), engine='pyarrow', index=False)
-
-            with open(os.path.join(td, 'README.md'), 'w') as f:
+                    if mimetype and mimetype.startswith('image/'):
+                        image_files.append((pack_rows[-1], filepath))
+
+                if with_thumbnails and image_files:
+                    logging.info(f'Creating thumbnails for {plural_word(len(image_files), "image")} ...')
+                    thumb_tar_file = os.path.join(td, 'thumbs', f'{pack_id}.tar')
+                    with stage('thumbnail', items=len(image_files)):
+                        thumbnails = create_thumbnails(
+                            [(str(row['id']), filepath) for row, filepath in image_files],
+                            thumb_tar_file, size=thumbnail_size, max_workers=max_workers,
+                        )
+                        tar_create_index(thumb_tar_file)
+                    for row, _ in image_files:
+                        if str(row['id']) in thumbnails:
+                            phash, thumbnail_file = thumbnails[str(row['id'])]
+                            row['phash'] = phash
+                            row['thumbnail_archive_file'] = os.path.relpath(thumb_tar_file, td)
+                            row['thumbnail_file_in_archive'] = thumbnail_file
+
+                    hashed_rows = [row for row, _ in image_files if row.get('phash')]
+                    with stage('dedup', items=len(hashed_rows)):
+                        duplicates = dedup.add_unique(
+                            [row['id'] for row in hashed_rows],
+                            hex_to_hashes(row['phash'] for row in hashed_rows),
+                        )
+                    for row, (_, duplicate_of) in zip(hashed_rows, duplicates):
+                        row['duplicate_of'] = duplicate_of
+                    duplicate_count = sum(1 for _, duplicate_of in duplicates if duplicate_of is not None)
+                    logging.info(f'{plural_word(duplicate_count, "near-duplicate image")} found.')
+
+            rows[:0] = reversed(pack_rows)
+            with stage('table', items=len(rows)):
+                df = pd.DataFrame(rows)
+                if 'duplicate_of' in df.columns:
+                    df['duplicate_of'] = df['duplicate_of'].astype('Int64')
+                df.to_parquet(os.path.join(td, 'table.parquet'), engine='pyarrow', index=False)
+
+            with stage('readme', items=len(pack_rows)), open(os.path.join(td, 'README.md'), 'w') as f:
+                report.update(pack_rows)
                 print('---', file=f)
                 print('license: other', file=f)
                 print('task_categories:', file=f)
@@ -146,47 +222,34 @@ def sync(src_repo: str, dst_repo: str, max_time_limit: float = 5.5 * 60 * 60):
                 print('- anime', file=f)
                 print('- not-for-all-audiences', file=f)
                 print('size_categories:', file=f)
-                print(f'- {number_to_tag(len(df))}', file=f)
+                print(f'- {number_to_tag(report.total)}', file=f)
                 print('---', file=f)
                 print('', file=f)
 
                 print(f'# Index Archives', file=f)
                 print(f'', file=f)
                 current_time = datetime.datetime.now().astimezone().strftime('%Y-%m-%d %H:%M:%S %Z')
-                print(f'{plural_word(len(df), "file")} in total. Last updated at `{current_time}`.', file=f)
+                print(f'{plural_word(report.total, "file")} in total. Last updated at `{current_time}`.', file=f)
                 print(f'', file=f)
 
-                df_hqimage = df[df['group'] == 'hqimage'][
-                    ['id', 'group', 'filename', 'mimetype', 'file_size', 'width', 'height', 'archive_file',
-                     'file_in_archive']
-                ]
-                print(f'{plural_word(len(df_hqimage), "image")} with `hqimage` group.', file=f)
-                print(f'', file=f)
-                print(df_hqimage[:50].to_markdown(index=False), file=f)
-                print(f'', file=f)
+                print(report.to_markdown(), file=f)
 
-                for group_name in sorted(set(df['group']) - {'hqimage'}):
-                    df_group = df[df['group'] == group_name][
-                        ['id', 'group', 'filename', 'mimetype', 'file_size', 'archive_file', 'file_in_archive']
-                    ]
-                    print(f'{plural_word(len(df_group), "file")} with `{group_name}` group.', file=f)
-                    print(f'', file=f)
-                    print(df_group[:50].to_markdown(index=False), file=f)
-                    print(f'', file=f)
-
-            upload_directory_as_directory(
-                repo_id=dst_repo,
-                repo_type='dataset',
-                local_directory=td,
-                path_in_repo='.',
-                message=f'Add package {pack_id!r}, with {plural_word(new_row_count, "file")}'
-            )
+            with stage('upload', items=1, bytes_=os.path.getsize(tar_file)):
+                upload_directory_as_directory(
+                    repo_id=dst_repo,
+                    repo_type='dataset',
+                    local_directory=td,
+                    path_in_repo='.',
+                    message=f'Add package {pack_id!r}, with {plural_word(len(pack_rows), "file")}'
+                )
 
 
 if __name__ == '__main__':
     logging.try_init_root(level=logging.INFO)
+    dump_profile_at_exit(os.environ.get('PROFILE_JSON'))
     sync(
         src_repo=os.environ['REMOTE_REPOSITORY_ORD'],
         dst_repo=os.environ['REMOTE_REPOSITORY_ORD_IDX'],
         max_time_limit=5.5 * 60 * 60,
+        with_thumbnails=bool(os.environ.get('INDEX_THUMBNAILS')),
     )
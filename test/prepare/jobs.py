@@ -0,0 +1,221 @@
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Optional, Iterable, Dict, NamedTuple
+
+from ditk import logging
+from hbutils.string import plural_word
+
+_DEFAULT_QUEUE_FILE = os.environ.get(
+    'NEWEST_QUEUE_FILE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'pyskeb', 'newest_jobs.sqlite'),
+)
+
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    username TEXT NOT NULL,
+    work_id INTEGER NOT NULL,
+    listed_at REAL NOT NULL,
+    PRIMARY KEY (username, work_id)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    work_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    resource_id TEXT,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_until REAL,
+    last_error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (username, work_id, url)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, available_at);
+"""
+
+
+class Job(NamedTuple):
+    id: int
+    username: str
+    work_id: int
+    url: str
+    attempts: int
+
+
+class JobQueue:
+    """
+    Durable local queue of the url jobs found in the posts, saved in a SQLite file.
+
+    A job is ``pending`` when added, and becomes ``in_progress`` with a lease when acquired by a worker.
+    The lease of a crashed worker expires after ``lease_time`` seconds, then the job can be acquired again.
+    A failed job is retried with a backoff, and moved to ``failed`` (the dead letter state) after
+    ``max_attempts`` attempts. The acquiring is done in an immediate transaction, so it is safe for
+    multiple worker processes on the same machine.
+
+    :param queue_file: Path of the SQLite file, ``NEWEST_QUEUE_FILE`` in environment is used by default.
+    :param lease_time: Lease time of the acquired jobs in seconds.
+    :param max_attempts: Max attempts of each job before dead lettering.
+    :param retry_delay: Delay before retrying a failed job, doubled on each attempt.
+    """
+
+    def __init__(self, queue_file: Optional[str] = None, lease_time: float = 30 * 60,
+                 max_attempts: int = 3, retry_delay: float = 60.0):
+        self.queue_file = queue_file or _DEFAULT_QUEUE_FILE
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+
+        if os.path.dirname(self.queue_file):
+            os.makedirs(os.path.dirname(self.queue_file), exist_ok=True)
+        self._conn = sqlite3.connect(self.queue_file, timeout=60, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        else:
+            self._conn.execute('COMMIT')
+
+    def close(self):
+        self._conn.close()
+
+    def has_post(self, username: str, work_id: int) -> bool:
+        return self._conn.execute(
+            'SELECT 1 FROM posts WHERE username = ? AND work_id = ?', (username, work_id)
+        ).fetchone() is not None
+
+    def add_post(self, username: str, work_id: int, urls: Iterable[str]) -> int:
+        """
+        Record the post as listed, and add the jobs of its urls.
+
+        :return: Number of the new jobs.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO posts (username, work_id, listed_at) VALUES (?, ?, ?)',
+                         (username, work_id, now))
+            count = 0
+            for url in urls:
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO jobs (username, work_id, url, state, available_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (username, work_id, url, PENDING, now, now),
+                )
+                count += cursor.rowcount
+        return count
+
+    def acquire(self) -> Optional[Job]:
+        """
+        Acquire a job which is pending, or whose lease has expired.
+
+        :return: The acquired job, ``None`` when nothing is available now.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # the leases of the crashed workers, dead letter them when run out of attempts
+            conn.execute(
+                'UPDATE jobs SET state = ?, last_error = ?, lease_owner = NULL, updated_at = ? '
+                'WHERE state = ? AND lease_until < ? AND attempts >= ?',
+                (FAILED, 'Lease expired.', now, IN_PROGRESS, now, self.max_attempts),
+            )
+            row = conn.execute(
+                'SELECT id, username, work_id, url, attempts FROM jobs '
+                'WHERE (state = ? AND available_at <= ?) OR (state = ? AND lease_until < ?) '
+                'ORDER BY id LIMIT 1',
+                (PENDING, now, IN_PROGRESS, now),
+            ).fetchone()
+            if row is None:
+                return None
+
+            conn.execute(
+                'UPDATE jobs SET state = ?, attempts = attempts + 1, lease_owner = ?, lease_until = ?, '
+                'updated_at = ? WHERE id = ?',
+                (IN_PROGRESS, self.owner, now + self.lease_time, now, row[0]),
+            )
+            id_, username, work_id, url, attempts = row
+            return Job(id_, username, work_id, url, attempts + 1)
+
+    def complete(self, job: Job, resource_id: Optional[str] = None):
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET state = ?, resource_id = ?, lease_owner = NULL, lease_until = NULL, '
+                'last_error = NULL, updated_at = ? WHERE id = ?',
+                (DONE, resource_id, time.time(), job.id),
+            )
+
+    def fail(self, job: Job, error: str):
+        """
+        Mark the job as failed, it will be retried later, or dead lettered when run out of attempts.
+        """
+        now = time.time()
+        if job.attempts >= self.max_attempts:
+            state, available_at = FAILED, now
+            logging.warning(f'Job {job.url!r} failed after {plural_word(job.attempts, "attempt")}, '
+                            f'dead lettered: {error}')
+        else:
+            state, available_at = PENDING, now + self.retry_delay * 2 ** (job.attempts - 1)
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET state = ?, available_at = ?, lease_owner = NULL, lease_until = NULL, '
+                'last_error = ?, updated_at = ? WHERE id = ?',
+                (state, available_at, error, now, job.id),
+            )
+
+    def release(self, job: Job):
+        """
+        Give the job back without consuming an attempt, such as when the worker is interrupted.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), available_at = ?, lease_owner = NULL, '
+                'lease_until = NULL, updated_at = ? WHERE id = ?',
+                (PENDING, now, now, job.id),
+            )
+
+    def retry_failed(self) -> int:
+        """
+        Move the dead lettered jobs back to pending.
+
+        :return: Number of the jobs.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                'UPDATE jobs SET state = ?, attempts = 0, available_at = ?, updated_at = ? WHERE state = ?',
+                (PENDING, now, now, FAILED),
+            ).rowcount
+
+    def next_available_at(self) -> Optional[float]:
+        """
+        Time when the next pending or leased job will be available, ``None`` when no such jobs.
+        """
+        row = self._conn.execute(
+            'SELECT MIN(CASE WHEN state = ? THEN available_at ELSE lease_until END) FROM jobs '
+            'WHERE state IN (?, ?)',
+            (PENDING, PENDING, IN_PROGRESS),
+        ).fetchone()
+        return row[0]
+
+    def counts(self) -> Dict[str, int]:
+        counts = {PENDING: 0, IN_PROGRESS: 0, DONE: 0, FAILED: 0}
+        for state, count in self._conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state'):
+            counts[state] = count
+        return counts
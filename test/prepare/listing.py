@@ -1,34 +1,38 @@
-import re
+from functools import lru_cache
 from itertools import islice
 from typing import Tuple
 
 from pyskeb.client.client import SkebClient
+from pyskeb.models import parse_work_path
+from .process import KNOWN_HOSTS, is_known_url
+from .shards import iter_user_pages_sharded
 from .url import extract_urls
 
-client = SkebClient()
+
+@lru_cache()
+def get_client() -> SkebClient:
+    return SkebClient()
 
 
 def split_username_and_id_from_path(path: str) -> Tuple[str, int]:
-    matching = re.fullmatch(r'^/?@(?P<username>[\s\S]+?)/works/(?P<work_id>\d+?)/?$', path)
-    username, work_id = matching.group('username'), int(matching.group('work_id'))
-    return username, work_id
+    return parse_work_path(path)
 
 
 def list_newest_posts(limit: int = 200):
-    for item in islice(client.iter_art_pages(), limit):
-        username, work_id = split_username_and_id_from_path(item['path'])
-        yield username, work_id
+    for work in islice(get_client().iter_art_pages(typed=True), limit):
+        yield work.username, work.work_id
 
 
-def list_posts_via_users(user_sort: str = 'popularity', work_role: str = 'client') -> Tuple[str, int]:
-    for user_info in client.iter_user_pages(sort=user_sort):
-        screen_name = user_info['screen_name']
-        for item in client.iter_work_pages(screen_name, role=work_role):
-            username, work_id = split_username_and_id_from_path(item['path'])
-            yield username, work_id
+def list_posts_via_users(user_sort: str = 'popularity', work_role: str = 'client',
+                         shard: int = 0, num_shards: int = 1) -> Tuple[str, int]:
+    client = get_client()
+    for _, users in iter_user_pages_sharded(client, user_sort, shard, num_shards):
+        for user in users:
+            for work in client.iter_work_pages(user.screen_name, role=work_role, typed=True):
+                yield work.username, work.work_id
 
 
 def get_urls_from_post(username, work_id):
-    post_data = client.get_post(username, work_id)
-    text = f"{post_data.get('source_body', '')}\n{post_data.get('body', '')}"
-    return extract_urls(text)
+    post = get_client().get_post(username, work_id, typed=True)
+    text = f"{post.source_body}\n{post.body}"
+    return extract_urls(text, hosts=KNOWN_HOSTS, fn_check=is_known_url)
@@ -1,36 +1,121 @@
 import logging
 import time
+from typing import Optional
 
 import requests.exceptions
 from hbutils.string import plural_word
 
 from .base import GenericException
+from .deadline import DeadlineScheduler
+from .jobs import JobQueue, PENDING
 from .listing import get_urls_from_post, list_newest_posts
 from .process import try_process_url
+from .profiler import stage
 
 _wait_time_when_crashed = 10.0
 
 
-def batch_process_via_iterator(f_iter, timespan: float = 4):
-    for username, work_id in f_iter:
-        _iter_last_time = time.time()
-        urls = get_urls_from_post(username, work_id)
-        logging.info(f'{plural_word(len(urls), "url")} found in @{username}/works/{work_id}')
-
-        for url in urls:
+def _iter_profiled(f_iter, name: str):
+    f_iter = iter(f_iter)
+    while True:
+        with stage(name) as record:
             try:
-                try_process_url(url, prefix=f'{username}_{work_id}_')
-            except (GenericException, RuntimeError, requests.exceptions.RequestException, IOError) as err:
-                logging.error(f'Error: {err!r}')
-                time.sleep(_wait_time_when_crashed)
+                item = next(f_iter)
+            except StopIteration:
+                return
+            record.add(items=1)
+        yield item
+
+
+def list_jobs_via_iterator(queue: JobQueue, f_iter, timespan: float = 4,
+                           scheduler: Optional[DeadlineScheduler] = None, drain: bool = False):
+    """
+    List the posts and add the jobs of their urls into the queue.
+
+    :param drain: Process the jobs of each post right after it is listed, so the downloads overlap
+        with the ``timespan`` between the listings.
+    """
+    scheduler = scheduler or DeadlineScheduler()
+    # leave time to drain the pending jobs after the listing
+    for username, work_id in scheduler.iterate(_iter_profiled(f_iter, 'listing'), 'post',
+                                               final='job', final_size_fn=lambda: queue.counts()[PENDING]):
+        if queue.has_post(username, work_id):
+            logging.info(f'@{username}/works/{work_id} already listed, skipped.')
+            continue
+
+        _iter_last_time = time.time()
+        with stage('post_fetch', items=1):
+            urls = get_urls_from_post(username, work_id)
+        with stage('queue'):
+            new_jobs = queue.add_post(username, work_id, urls)
+        logging.info(f'{plural_word(len(urls), "url")} found in @{username}/works/{work_id}, '
+                     f'{plural_word(new_jobs, "new job")} added.')
+        if drain:
+            drain_jobs(queue, scheduler=scheduler)
 
         _duration = _iter_last_time + timespan - time.time()
         if _duration > 0.0:
             time.sleep(_duration)
 
 
-def batch_process_newest(limit: int = 100, timespan: float = 4):
-    batch_process_via_iterator(
-        list_newest_posts(limit),
-        timespan=timespan,
-    )
+def drain_jobs(queue: JobQueue, wait_retries: bool = False, scheduler: Optional[DeadlineScheduler] = None):
+    """
+    Process the jobs in the queue until it is drained.
+
+    :param queue: The job queue.
+    :param wait_retries: Wait for the delayed retries and the leases of other workers, otherwise
+        return when no job is available now.
+    :param scheduler: Time budget, no new job is acquired when the next one may not finish in time.
+        The jobs left in queue will be resumed by the next run.
+    """
+    scheduler = scheduler or DeadlineScheduler()
+    while True:
+        if not scheduler.can_start('job', 1):
+            break
+        job = queue.acquire()
+        if job is None:
+            next_time = queue.next_available_at() if wait_retries else None
+            if next_time is None:
+                break
+            time.sleep(max(next_time - time.time(), 1.0))
+            continue
+
+        try:
+            with scheduler.unit('job', 1):
+                resource_id = try_process_url(job.url, prefix=f'{job.username}_{job.work_id}_')
+        except (GenericException, RuntimeError, requests.exceptions.RequestException, IOError) as err:
+            logging.error(f'Error: {err!r}')
+            queue.fail(job, repr(err))
+            time.sleep(_wait_time_when_crashed)
+        except BaseException:
+            queue.release(job)
+            raise
+        else:
+            queue.complete(job, resource_id)
+
+    logging.info(f'Jobs drained, current status: {queue.counts()!r}')
+
+
+def batch_process_via_iterator(f_iter, timespan: float = 4, queue: Optional[JobQueue] = None,
+                               scheduler: Optional[DeadlineScheduler] = None):
+    queue = queue or JobQueue()
+    scheduler = scheduler or DeadlineScheduler()
+    # resume the jobs left by the last run first
+    drain_jobs(queue, scheduler=scheduler)
+    list_jobs_via_iterator(queue, f_iter, timespan=timespan, scheduler=scheduler, drain=True)
+    drain_jobs(queue, scheduler=scheduler)
+
+
+def batch_process_newest(limit: int = 100, timespan: float = 4, queue_file: Optional[str] = None,
+                         max_time_limit: Optional[float] = None, reserve: float = 30.0):
+    queue = JobQueue(queue_file)
+    try:
+        batch_process_via_iterator(
+            list_newest_posts(limit),
+            timespan=timespan,
+            queue=queue,
+            scheduler=DeadlineScheduler(max_time_limit, reserve=reserve),
+        )
+    finally:
+        # checkpoint the WAL into the queue file, so the file alone can be saved for the next run
+        queue.close()
@@ -0,0 +1,162 @@
+import os.path
+import shutil
+import zipfile
+from typing import Optional
+
+import pandas as pd
+from ditk import logging
+from hbutils.scale import size_to_bytes_str
+from hbutils.string import plural_word
+from hfutils.operate import download_file_to_file
+from huggingface_hub import hf_hub_url, CommitOperationAdd
+
+from .base import get_hf_fs, get_hf_client, get_hf_token
+from .deadline import DeadlineScheduler
+from .sids import SidStore
+
+
+class CrawlPacker:
+    """
+    Periodically flushed pack writer for the bilibili crawlers.
+
+    Downloaded files are put into :attr:`item_dir`. Once enough crawled items or bytes have been
+    accumulated, they are zipped into a new pack and committed together with the crawled sids
+    (see :class:`test.prepare.sids.SidStore`), ``records.csv`` and ``README.md``, then the local
+    files are removed. Because the saved sids only contain the items which are already packed and
+    uploaded, a crashed crawl can be simply restarted and will resume from the last flushed state.
+
+    :param repository: Repository of the packs.
+    :param workdir: Local working directory.
+    :param pack_prefix: Prefix of the pack filenames, such as ``suit_pack``.
+    :param count_column: Column name of the file count in ``records.csv``, such as ``Images``.
+    :param sid_format: Format of the crawled sids, such as ``suit_{}``.
+    :param max_items: Flush after this number of crawled items. ``None`` means no limit.
+    :param max_size: Flush after this size (in bytes) of downloaded files. ``None`` means no limit.
+    :param scheduler: Time budget of the crawl, the cost of flushes is recorded in it as ``flush`` units.
+    """
+
+    def __init__(self, repository: str, workdir: str, pack_prefix: str, count_column: str = 'Images',
+                 sid_format: str = 'suit_{}', max_items: Optional[int] = 500,
+                 max_size: Optional[int] = 2 * 1024 ** 3, scheduler: Optional[DeadlineScheduler] = None):
+        self.repository = repository
+        self.workdir = workdir
+        self.pack_prefix = pack_prefix
+        self.count_column = count_column
+        self.max_items = max_items
+        self.max_size = max_size
+        self.scheduler = scheduler or DeadlineScheduler()
+
+        self.item_dir = os.path.join(self.workdir, 'items')
+        os.makedirs(self.item_dir, exist_ok=True)
+
+        self.sids = SidStore(self.repository, sid_format=sid_format)
+
+        if get_hf_fs().exists(f'datasets/{self.repository}/records.csv'):
+            records_csv = os.path.join(self.workdir, 'records.csv')
+            download_file_to_file(
+                local_file=records_csv,
+                repo_id=self.repository,
+                repo_type='dataset',
+                file_in_repo='records.csv',
+                hf_token=get_hf_token(),
+            )
+            self._records = pd.read_csv(records_csv).to_dict('records')
+            os.remove(records_csv)
+        else:
+            self._records = []
+
+    def __contains__(self, sid) -> bool:
+        return sid in self.sids
+
+    def _pending_files(self):
+        return sorted(os.listdir(self.item_dir))
+
+    def pending_size(self) -> int:
+        """
+        Size of the downloaded files which are not flushed yet.
+        """
+        return sum(os.path.getsize(os.path.join(self.item_dir, file)) for file in self._pending_files())
+
+    def add(self, sid):
+        """
+        Mark the item ``sid`` as crawled, its files should be already placed in :attr:`item_dir`.
+        A flush will be triggered when the item or size limit is reached.
+        """
+        self.sids.add(sid)
+        if (self.max_items is not None and self.sids.pending_count >= self.max_items) or \
+                (self.max_size is not None and self.pending_size() >= self.max_size):
+            self.flush()
+
+    def flush(self) -> bool:
+        """
+        Pack and upload the pending files.
+
+        :return: Whether a new pack is uploaded.
+        """
+        files = self._pending_files()
+        if not files:
+            logging.warning(f'No files found in {plural_word(self.sids.pending_count, "pending item")}, '
+                            f'nothing to flush.')
+            return False
+
+        with self.scheduler.unit('flush', self.pending_size()):
+            self._flush(files)
+        return True
+
+    def _flush(self, files):
+        from .repack import _timestamp
+        export_dir = os.path.join(self.workdir, 'export')
+        if os.path.exists(export_dir):
+            shutil.rmtree(export_dir)
+        os.makedirs(export_dir, exist_ok=True)
+
+        name = f'{self.pack_prefix}_{_timestamp()}'
+        filename = f'{name}.zip'
+        pack_file = os.path.join(export_dir, 'packs', filename)
+        os.makedirs(os.path.dirname(pack_file), exist_ok=True)
+        with zipfile.ZipFile(pack_file, 'w') as zf:
+            for file in files:
+                zf.write(os.path.join(self.item_dir, file), file)
+
+        records = [*self._records, {
+            'Filename': filename,
+            self.count_column: len(files),
+            'Size': size_to_bytes_str(os.path.getsize(pack_file), precision=3),
+            'Download': f'[Download]'
+                        f'({hf_hub_url(repo_id=self.repository, repo_type="dataset", filename=f"packs/{filename}")})',
+        }]
+
+        df = pd.DataFrame(records)
+        df = df.sort_values(['Filename'], ascending=False)
+        df.to_csv(os.path.join(export_dir, 'records.csv'), index=False)
+
+        md_file = os.path.join(export_dir, 'README.md')
+        with open(md_file, 'w') as f:
+            print('---', file=f)
+            print('license: other', file=f)
+            print('---', file=f)
+            print('', file=f)
+            print(df.to_markdown(index=False), file=f)
+
+        operations = [
+            CommitOperationAdd(path_or_fileobj=pack_file, path_in_repo=f'packs/{filename}'),
+            CommitOperationAdd(path_or_fileobj=os.path.join(export_dir, 'records.csv'), path_in_repo='records.csv'),
+            CommitOperationAdd(path_or_fileobj=md_file, path_in_repo='README.md'),
+            *self.sids.make_operations(os.path.join(export_dir, 'sids'), name),
+        ]
+
+        logging.info(f'Uploading pack {filename!r} with {plural_word(len(files), "file")} '
+                     f'and {plural_word(self.sids.pending_count, "new item")} ...')
+        get_hf_client().create_commit(
+            repo_id=self.repository,
+            repo_type='dataset',
+            operations=operations,
+            commit_message=f'Add pack {filename!r}',
+        )
+        # the files are kept until committed, so a failed commit can be flushed again
+        for file in files:
+            os.remove(os.path.join(self.item_dir, file))
+        shutil.rmtree(export_dir)
+
+        self._records = records
+        self.sids.mark_flushed(name)
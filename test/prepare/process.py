@@ -5,58 +5,85 @@ import re
 import zipfile
 from contextlib import contextmanager
 from functools import lru_cache
-from typing import List, Set
+from typing import List, Set, Union, Optional
 
 from hbutils.system import TemporaryDirectory
 
-from .base import hf_fs, _REPOSITORY, hf_client, _ensure_repository
-from .dropbox import is_dropbox, get_dropbox_resource, download_dropbox_to_directory
-from .google import is_google_drive, get_google_resource_id, download_google_to_directory
-from .imgur import is_imgur, get_imgur_resource, download_imgur_to_directory
+from .base import get_hf_fs, get_repository, get_hf_client, _ensure_repository
+from .dropbox import DROPBOX_HOSTS, is_dropbox, get_dropbox_resource, download_dropbox_to_directory, \
+    stream_dropbox_to_archive
+from .google import GOOGLE_DRIVE_HOSTS, is_google_drive, get_google_resource_id, download_google_to_directory
+from .imgur import IMGUR_HOSTS, is_imgur, get_imgur_resource, download_imgur_to_directory
+from .profiler import stage
+from .router import SiteRouter, ResolvedURL
 
-KNOWN_SITES = [
-    (is_google_drive, get_google_resource_id, download_google_to_directory),
-    (is_imgur, get_imgur_resource, download_imgur_to_directory),
-    (is_dropbox, get_dropbox_resource, download_dropbox_to_directory),
-]
+KNOWN_SITES = SiteRouter()
+KNOWN_SITES.register('google_drive', GOOGLE_DRIVE_HOSTS, is_google_drive, get_google_resource_id,
+                     download_google_to_directory)
+KNOWN_SITES.register('imgur', IMGUR_HOSTS, is_imgur, get_imgur_resource, download_imgur_to_directory)
+KNOWN_SITES.register('dropbox', DROPBOX_HOSTS, is_dropbox, get_dropbox_resource, download_dropbox_to_directory,
+                     stream_dropbox_to_archive)
+# hosts of the known sites, urls of other hosts are dropped when extracting
+KNOWN_HOSTS = KNOWN_SITES.hosts
+
+
+def is_known_url(url) -> bool:
+    return KNOWN_SITES.match(url) is not None
+
+
+def _archive_name(relname: str, prefix: str = '') -> str:
+    relname_body, relname_ext = os.path.splitext(relname)
+    return prefix + re.sub(r'[\W_]+', '_', relname_body).strip('_') + relname_ext
 
 
 @contextmanager
-def url_to_zip(url, prefix: str = ''):
-    for fn_check, fn_rid, fn_download in KNOWN_SITES:
-        if fn_check(url):
-            resource_id = fn_rid(url)
-            if resource_id is None:
-                logging.info(f'Unknown resource info for URL {url!r}, skipped!')
-                continue
-
-            with TemporaryDirectory() as td, TemporaryDirectory() as ztd:
-                fn_download(url, td)
-                zip_file = os.path.join(ztd, f'{resource_id}.zip')
-                os.system(f'tree {td!r}')
-
-                written = False
-                with zipfile.ZipFile(zip_file, 'w') as zf:
-                    for root, dirs, files in os.walk(td):
-                        for file in files:
-                            filename = os.path.join(td, root, file)
-                            relname = os.path.relpath(filename, td)
-                            relname_body, relname_ext = os.path.splitext(relname)
-                            underline_name = prefix + re.sub(r'[\W_]+', '_', relname_body).strip('_') + relname_ext
-                            zf.write(filename, underline_name)
-                            written = True
-
-                yield zip_file if written else None
-
-            break
-    else:
+def url_to_zip(url: Union[str, ResolvedURL], prefix: str = '', streaming: bool = True):
+    resolved = url if isinstance(url, ResolvedURL) else KNOWN_SITES.resolve(url)
+    if resolved is None:
+        logging.info(f'Unknown resource info for URL {url!r}, skipped!')
         yield None
+        return
+
+    url, handler, resource_id = resolved
+    with TemporaryDirectory() as ztd:
+        zip_file = os.path.join(ztd, f'{resource_id}.zip')
+        written = False
+        with zipfile.ZipFile(zip_file, 'w') as zf:
+            if streaming and handler.stream is not None:
+                def _fn_write(relname, chunks):
+                    nonlocal written
+                    logging.info(f'Streaming {relname!r} into archive ...')
+                    with zf.open(_archive_name(relname, prefix), 'w', force_zip64=True) as f:
+                        for chunk in chunks:
+                            f.write(chunk)
+                            record.add(bytes_=len(chunk))
+                    record.add(items=1)
+                    written = True
+
+                with stage('stream') as record:
+                    handler.stream(url, _fn_write)
+            else:
+                with TemporaryDirectory() as td:
+                    with stage('download'):
+                        handler.download(url, td)
+                    os.system(f'tree {td!r}')
+
+                    with stage('zip') as record:
+                        for root, dirs, files in os.walk(td):
+                            for file in files:
+                                filename = os.path.join(td, root, file)
+                                relname = os.path.relpath(filename, td)
+                                zf.write(filename, _archive_name(relname, prefix))
+                                record.add(items=1, bytes_=os.path.getsize(filename))
+                                written = True
+
+        yield zip_file if written else None
 
 
 @lru_cache()
 def _get_archived_resource_ids() -> List[str]:
-    if hf_fs.exists(f'datasets/{_REPOSITORY}/archived.json'):
-        return json.loads(hf_fs.read_text(f'datasets/{_REPOSITORY}/archived.json'))
+    if get_hf_fs().exists(f'datasets/{get_repository()}/archived.json'):
+        return json.loads(get_hf_fs().read_text(f'datasets/{get_repository()}/archived.json'))
     else:
         return []
 
@@ -68,35 +95,35 @@ def _get_archived_resource_ids_set() -> Set[str]:
 
 def _is_resource_exist(resource_id: str) -> bool:
     return (resource_id in _get_archived_resource_ids_set()) or \
-        hf_fs.exists(f'datasets/{_REPOSITORY}/unarchived/{resource_id}.zip')
+        get_hf_fs().exists(f'datasets/{get_repository()}/unarchived/{resource_id}.zip')
 
 
-def try_process_url(url, prefix: str = ''):
+def try_process_url(url, prefix: str = '') -> Optional[str]:
     _ensure_repository()
-    for fn_check, fn_rid, fn_download in KNOWN_SITES:
-        if fn_check(url):
-            resource_id = fn_rid(url)
-            if resource_id is None:
-                logging.info(f'Unknown resource info for URL {url!r}, skipped!')
-                continue
-            else:
-                logging.info(f'Resource confirmed as {resource_id!r} (URL: {url!r})')
-
-            if _is_resource_exist(resource_id):
-                logging.info(f'URL {url!r} (resource {resource_id!r}) already crawled, skipped!')
-                return
-
-            with url_to_zip(url, prefix) as zip_file:
-                if zip_file is not None:
-                    hf_client.upload_file(
-                        path_or_fileobj=zip_file,
-                        path_in_repo=f'unarchived/{resource_id}.zip',
-                        repo_id=_REPOSITORY,
-                        repo_type='dataset',
-                    )
-                else:
-                    logging.info('Empty package detected, skipped!')
-
-            return
-    else:
-        logging.info(f'URL {url!r} unconfirmed, skipped.')
+    with stage('resolve', items=1):
+        resolved = KNOWN_SITES.resolve(url)
+    if resolved is None:
+        logging.info(f'URL {url!r} unconfirmed or without resource info, skipped.')
+        return None
+    resource_id = resolved.resource_id
+    logging.info(f'Resource confirmed as {resource_id!r} (URL: {url!r})')
+
+    with stage('exist_check'):
+        exists = _is_resource_exist(resource_id)
+    if exists:
+        logging.info(f'URL {url!r} (resource {resource_id!r}) already crawled, skipped!')
+        return resource_id
+
+    with url_to_zip(resolved, prefix) as zip_file:
+        if zip_file is not None:
+            with stage('upload', items=1, bytes_=os.path.getsize(zip_file)):
+                get_hf_client().upload_file(
+                    path_or_fileobj=zip_file,
+                    path_in_repo=f'unarchived/{resource_id}.zip',
+                    repo_id=get_repository(),
+                    repo_type='dataset',
+                )
+        else:
+            logging.info('Empty package detected, skipped!')
+
+    return resource_id
@@ -0,0 +1,158 @@
+import atexit
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, List
+
+from ditk import logging
+from hbutils.scale import size_to_bytes_str
+
+
+class StageRecord:
+    """
+    Handle of a running stage, the processed items and bytes can be added to it.
+    """
+
+    def __init__(self):
+        self.items = 0
+        self.bytes = 0
+
+    def add(self, items: int = 0, bytes_: int = 0):
+        self.items += items
+        self.bytes += bytes_
+
+
+class _StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.items = 0
+        self.bytes = 0
+
+
+class StageProfiler:
+    """
+    Lightweight profiler of the stages in prepare jobs, such as listing, download, zip and upload.
+
+    The wall time and the CPU time of the current thread are recorded for each stage. Nested stages
+    are recorded separately, so the time of an inner stage is also counted in the outer one.
+    """
+
+    def __init__(self):
+        self.start_time = time.time()
+        self._stats: Dict[str, _StageStats] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0, bytes_: int = 0):
+        """
+        Profile a stage.
+
+        Example::
+
+            >>> with PROFILER.stage('download') as record:
+            ...     record.add(items=1, bytes_=download(url))
+        """
+        record = StageRecord()
+        record.add(items, bytes_)
+        start_wall, start_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            wall_time, cpu_time = time.perf_counter() - start_wall, time.thread_time() - start_cpu
+            with self._lock:
+                if name not in self._stats:
+                    self._stats[name] = _StageStats()
+                stats = self._stats[name]
+                stats.calls += 1
+                stats.wall_time += wall_time
+                stats.cpu_time += cpu_time
+                stats.items += record.items
+                stats.bytes += record.bytes
+
+    def reset(self):
+        with self._lock:
+            self.start_time = time.time()
+            self._stats.clear()
+
+    def summary(self) -> List[dict]:
+        """
+        Summary of the stages, sorted by wall time.
+        """
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda x: -x[1].wall_time)
+            return [
+                {
+                    'stage': name,
+                    'calls': stats.calls,
+                    'wall_time': stats.wall_time,
+                    'cpu_time': stats.cpu_time,
+                    'items': stats.items,
+                    'bytes': stats.bytes,
+                    'items_per_second': stats.items / stats.wall_time if stats.wall_time > 0 else None,
+                    'bytes_per_second': stats.bytes / stats.wall_time if stats.wall_time > 0 else None,
+                }
+                for name, stats in items
+            ]
+
+    def report(self) -> dict:
+        return {
+            'start_time': self.start_time,
+            'total_time': time.time() - self.start_time,
+            'stages': self.summary(),
+        }
+
+    def to_markdown(self) -> str:
+        import pandas as pd
+
+        rows = []
+        for item in self.summary():
+            rows.append({
+                'Stage': item['stage'],
+                'Calls': item['calls'],
+                'Wall (s)': round(item['wall_time'], 3),
+                'CPU (s)': round(item['cpu_time'], 3),
+                'Items': item['items'],
+                'Items/s': round(item['items_per_second'], 3) if item['items_per_second'] is not None else None,
+                'Bytes': size_to_bytes_str(item['bytes'], precision=3),
+                'Bytes/s': size_to_bytes_str(int(round(item['bytes_per_second'])), precision=3)
+                if item['bytes_per_second'] is not None else None,
+            })
+        return pd.DataFrame(rows, columns=['Stage', 'Calls', 'Wall (s)', 'CPU (s)', 'Items', 'Items/s',
+                                           'Bytes', 'Bytes/s']).to_markdown(index=False)
+
+    def dump(self, report_file: Optional[str] = None):
+        """
+        Log the summary table, and write the JSON report to ``report_file`` when given.
+        """
+        if self._stats:
+            logging.info(f'Stage profile ({time.time() - self.start_time:.1f}s in total):\n{self.to_markdown()}')
+        if report_file:
+            with open(report_file, 'w') as f:
+                json.dump(self.report(), f, indent=4, ensure_ascii=False)
+            logging.info(f'Stage profile report saved to {report_file!r}.')
+
+
+PROFILER = StageProfiler()
+
+
+def stage(name: str, items: int = 0, bytes_: int = 0):
+    """
+    Profile a stage with the global profiler.
+    """
+    return PROFILER.stage(name, items, bytes_)
+
+
+_dump_registered = False
+
+
+def dump_profile_at_exit(report_file: Optional[str] = None):
+    """
+    Dump the summary of the global profiler when the process exits.
+    """
+    global _dump_registered
+    if not _dump_registered:
+        atexit.register(PROFILER.dump, report_file)
+        _dump_registered = True
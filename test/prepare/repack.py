@@ -8,6 +8,7 @@ from typing import Optional
 
 import pandas as pd
 from hbutils.scale import size_to_bytes_str
+from hbutils.string import plural_word
 from hbutils.system import TemporaryDirectory
 from huggingface_hub import CommitOperationAdd, CommitOperationDelete
 from huggingface_hub import hf_hub_url
@@ -16,57 +17,89 @@ from huggingface_hub.utils import HfHubHTTPError
 from tqdm.auto import tqdm
 
 from pyskeb.utils.download import download_file
-from .base import _REPOSITORY, hf_client, hf_fs, _ensure_repository
+from .base import get_repository, get_hf_client, get_hf_fs, _ensure_repository
+from .deadline import DeadlineScheduler
+from .dedup import DuplicateIndex, remove_near_duplicates
+from .profiler import stage
+
+
+def pack_directory(directory: str, zip_file: str, remove: bool = True) -> bool:
+    """
+    Pack the files in directory into zip file.
+
+    :param directory: Directory to pack.
+    :param zip_file: Zip file to create.
+    :param remove: Remove the packed files.
+    :return: Whether any file is packed.
+    """
+    written = False
+    with zipfile.ZipFile(zip_file, 'w') as zf:
+        for root, dirs, files in os.walk(directory):
+            for file in files:
+                filename = os.path.join(directory, root, file)
+                relname = os.path.relpath(filename, directory)
+                zf.write(filename, relname)
+                if remove:
+                    os.remove(filename)
+                written = True
+
+    return written
 
 
 @contextmanager
-def repack_zips(max_size_limit: Optional[float] = None):
+def repack_zips(max_size_limit: Optional[float] = None, scheduler: Optional[DeadlineScheduler] = None,
+                dedup: Optional[DuplicateIndex] = None):
+    scheduler = scheduler or DeadlineScheduler()
     with TemporaryDirectory() as td:
         dd_dir = os.path.join(td, 'origin')
         os.makedirs(dd_dir, exist_ok=True)
 
         fns = []
         current_size = 0
-        for file in tqdm(hf_fs.glob(f'datasets/{_REPOSITORY}/unarchived/*.zip')):
+        for file in tqdm(get_hf_fs().glob(f'datasets/{get_repository()}/unarchived/*.zip')):
             filename = os.path.basename(file)
             if max_size_limit is not None and current_size >= max(max_size_limit * 0.95, max_size_limit - 100):
                 break
 
-            file_item: RepoFile = list(hf_client.get_paths_info(
-                repo_id=_REPOSITORY,
-                repo_type='dataset',
-                paths=[f'unarchived/{filename}'],
-                expand=True,
-            ))[0]
+            with stage('listing', items=1):
+                file_item: RepoFile = list(get_hf_client().get_paths_info(
+                    repo_id=get_repository(),
+                    repo_type='dataset',
+                    paths=[f'unarchived/{filename}'],
+                    expand=True,
+                ))[0]
             if max_size_limit is not None and current_size + file_item.size >= max_size_limit:
                 continue
+            # packing and committing the fetched files costs about the same as fetching them
+            if not scheduler.can_start('fetch', file_item.size,
+                                       final='fetch', final_size=current_size + file_item.size):
+                break
 
             current_size += file_item.size
             fns.append(filename)
-            with TemporaryDirectory() as ctd:
+            with scheduler.unit('fetch', file_item.size), TemporaryDirectory() as ctd:
                 zip_file = os.path.join(ctd, filename)
-                download_file(
-                    hf_hub_url(repo_id=_REPOSITORY, repo_type='dataset', filename=f'unarchived/{filename}'),
-                    zip_file,
-                    headers={'Authorization': f'Bearer {os.environ["HF_TOKEN"]}'},
-                )
-                with zipfile.ZipFile(zip_file, 'r') as zf:
-                    try:
-                        zf.extractall(dd_dir)
-                    except OSError as err:
-                        logging.warning(repr(err))
+                with stage('download', items=1, bytes_=file_item.size):
+                    download_file(
+                        hf_hub_url(repo_id=get_repository(), repo_type='dataset', filename=f'unarchived/{filename}'),
+                        zip_file,
+                        headers={'Authorization': f'Bearer {os.environ["HF_TOKEN"]}'},
+                    )
+                with stage('extract', items=1, bytes_=file_item.size):
+                    with zipfile.ZipFile(zip_file, 'r') as zf:
+                        try:
+                            zf.extractall(dd_dir)
+                        except OSError as err:
+                            logging.warning(repr(err))
+
+        if dedup is not None:
+            with stage('dedup', items=len(fns)):
+                removed = remove_near_duplicates(dd_dir, dedup)
+            logging.info(f'{plural_word(len(removed), "near-duplicate image")} removed before packing.')
 
         zip_file = os.path.join(td, 'package.zip')
-        written = False
-        with zipfile.ZipFile(zip_file, 'w') as zf:
-            for root, dirs, files in os.walk(dd_dir):
-                for file in files:
-                    filename = os.path.join(dd_dir, root, file)
-                    relname = os.path.relpath(filename, dd_dir)
-                    zf.write(filename, relname)
-                    os.remove(filename)
-                    written = True
-
+        with stage('zip', items=len(fns)):
+            written = pack_directory(dd_dir, zip_file)
         if written:
             yield zip_file, fns
         else:
@@ -74,30 +107,45 @@ def repack_zips(max_size_limit: Optional[float] = None):
 
 
 def _make_records():
-    if not hf_fs.exists(f'datasets/{_REPOSITORY}/index.json'):
+    if not get_hf_fs().exists(f'datasets/{get_repository()}/index.json'):
         retval = []
-        for pack in hf_fs.glob(f'datasets/{_REPOSITORY}/packs/*.zip'):
+        for pack in get_hf_fs().glob(f'datasets/{get_repository()}/packs/*.zip'):
             filename = os.path.basename(pack)
-            _info = hf_fs.info(f'datasets/{_REPOSITORY}/packs/{filename}')
+            _info = get_hf_fs().info(f'datasets/{get_repository()}/packs/{filename}')
             size = _info['size']
             retval.append({'filename': filename, 'size': size})
         return retval
     else:
-        return json.loads(hf_fs.read_text(f'datasets/{_REPOSITORY}/index.json'))
+        return json.loads(get_hf_fs().read_text(f'datasets/{get_repository()}/index.json'))
 
 
 def _timestamp():
     return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
 
 
-def repack_all():
+def repack_all(max_time_limit: Optional[float] = None, reserve: float = 10 * 60,
+               dedup_radius: Optional[int] = None):
+    """
+    Repack the unarchived zip files into a new pack.
+
+    When ``dedup_radius`` is given, the images within this Hamming distance of the perceptual hashes
+    to the archived ones (``dedup.npz`` in repository) or to each other are dropped before packing.
+    """
+    scheduler = DeadlineScheduler(max_time_limit, reserve=reserve)
     _ensure_repository()
-    if hf_fs.exists(f'datasets/{_REPOSITORY}/archived.json'):
-        archived_resource_ids = json.loads(hf_fs.read_text(f'datasets/{_REPOSITORY}/archived.json'))
+    if dedup_radius is None:
+        dedup = None
+    elif get_hf_fs().exists(f'datasets/{get_repository()}/dedup.npz'):
+        dedup = DuplicateIndex.load(get_hf_fs().read_bytes(f'datasets/{get_repository()}/dedup.npz'))
+        dedup.radius = dedup_radius
+    else:
+        dedup = DuplicateIndex(radius=dedup_radius)
+    if get_hf_fs().exists(f'datasets/{get_repository()}/archived.json'):
+        archived_resource_ids = json.loads(get_hf_fs().read_text(f'datasets/{get_repository()}/archived.json'))
     else:
         archived_resource_ids = []
 
-    with repack_zips(max_size_limit=5.5 * 1024 ** 3) as (zip_file, fns):
+    with repack_zips(max_size_limit=5.5 * 1024 ** 3, scheduler=scheduler, dedup=dedup) as (zip_file, fns):
         if zip_file is None:
             logging.info('No files to repack, skipped.')
             return
@@ -122,7 +170,7 @@ def repack_all():
         df_records = []
         for item in all_records:
             url_for_download = hf_hub_url(
-                repo_id=_REPOSITORY, repo_type="dataset",
+                repo_id=get_repository(), repo_type="dataset",
                 filename=f"packs/{item['filename']}"
             )
             df_records.append({
@@ -163,17 +211,26 @@ def repack_all():
                 path_in_repo='archived.json',
             ))
 
+            if dedup is not None:
+                dedup_file = os.path.join(td, 'dedup.npz')
+                dedup.save(dedup_file)
+                operations.append(CommitOperationAdd(
+                    path_or_fileobj=dedup_file,
+                    path_in_repo='dedup.npz',
+                ))
+
             if operations:
-                while True:
-                    try:
-                        hf_client.create_commit(
-                            repo_id=_REPOSITORY,
-                            repo_type='dataset',
-                            operations=operations,
-                            commit_message=f'Create new package {package_name!r}.'
-                        )
-                    except HfHubHTTPError as err:
-                        logging.exception(err)
-                        logging.warning('Retry to commit ...')
-                    else:
-                        break
+                with stage('upload', items=1, bytes_=os.path.getsize(zip_file)):
+                    while True:
+                        try:
+                            get_hf_client().create_commit(
+                                repo_id=get_repository(),
+                                repo_type='dataset',
+                                operations=operations,
+                                commit_message=f'Create new package {package_name!r}.'
+                            )
+                        except HfHubHTTPError as err:
+                            logging.exception(err)
+                            logging.warning('Retry to commit ...')
+                        else:
+                            break
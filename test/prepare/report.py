@@ -0,0 +1,96 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from hbutils.string import plural_word
+
+_HQIMAGE_COLUMNS = ['id', 'group', 'filename', 'mimetype', 'file_size', 'width', 'height',
+                    'archive_file', 'file_in_archive']
+_FILE_COLUMNS = ['id', 'group', 'filename', 'mimetype', 'file_size', 'archive_file', 'file_in_archive']
+
+
+def group_aggregates(df: pd.DataFrame, max_rows: int = 50) -> Tuple[Dict[str, int], Dict[str, pd.DataFrame]]:
+    """
+    The count and the rows with the largest ids of each group, in one pass over the columns.
+
+    The rows are ordered by group code and descending id with one ``lexsort``, then the groups are
+    sliced by their offsets, instead of filtering the whole frame once per group.
+
+    :return: Mapping of the group names to their counts, and to their top rows in descending order of id.
+    """
+    if not len(df):
+        return {}, {}
+    codes, groups = pd.factorize(df['group'], sort=True)
+    ids = df['id'].to_numpy()
+    order = np.lexsort((-ids, codes))
+    counts = np.bincount(codes[codes >= 0], minlength=len(groups))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    # the rows without group are sorted to the front by their code -1
+    starts += len(codes) - counts.sum()
+    group_counts, group_tops = {}, {}
+    for group, start, count in zip(groups.tolist(), starts.tolist(), counts.tolist()):
+        group_counts[group] = count
+        group_tops[group] = df.iloc[order[start:start + min(count, max_rows)]]
+    return group_counts, group_tops
+
+
+class IndexReport:
+    """
+    Running aggregates of ``table.parquet`` for the README, i.e. the total count, the count of each group
+    and the top rows (largest ids) of each group.
+
+    The aggregates are updated with only the new rows of each pack, so the cost of the report does not
+    grow with the table.
+
+    :param max_rows: Max rows of each group listed in the report.
+    """
+
+    def __init__(self, max_rows: int = 50):
+        self.max_rows = max_rows
+        self.total = 0
+        self.counts: Dict[str, int] = {}
+        self.tops: Dict[str, pd.DataFrame] = {}
+
+    def update(self, rows: Union[pd.DataFrame, List[dict]]):
+        """
+        Add the new rows into the aggregates.
+        """
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+        if not len(df):
+            return
+
+        self.total += len(df)
+        group_counts, group_tops = group_aggregates(df, self.max_rows)
+        for group, count in group_counts.items():
+            self.counts[group] = self.counts.get(group, 0) + count
+        for group, top in group_tops.items():
+            if group in self.tops:
+                top = pd.concat([top, self.tops[group]], ignore_index=True)
+                top = top.iloc[np.argsort(-top['id'].to_numpy(), kind='stable')[:self.max_rows]]
+            self.tops[group] = top.reset_index(drop=True)
+
+    @classmethod
+    def from_frame(cls, df: Optional[pd.DataFrame], max_rows: int = 50) -> 'IndexReport':
+        report = cls(max_rows=max_rows)
+        if df is not None:
+            report.update(df)
+        return report
+
+    def to_markdown(self) -> str:
+        """
+        Markdown of the groups, ``hqimage`` first with the image sizes, then the other groups by name.
+        """
+        lines = []
+        df_hqimage = self.tops.get('hqimage', pd.DataFrame(columns=_HQIMAGE_COLUMNS))
+        lines.append(f'{plural_word(self.counts.get("hqimage", 0), "image")} with `hqimage` group.')
+        lines.append('')
+        lines.append(df_hqimage.reindex(columns=_HQIMAGE_COLUMNS).to_markdown(index=False))
+        lines.append('')
+
+        for group_name in sorted(set(self.tops) - {'hqimage'}):
+            lines.append(f'{plural_word(self.counts[group_name], "file")} with `{group_name}` group.')
+            lines.append('')
+            lines.append(self.tops[group_name].reindex(columns=_FILE_COLUMNS).to_markdown(index=False))
+            lines.append('')
+
+        return '\n'.join(lines)
@@ -0,0 +1,78 @@
+from typing import Callable, Optional, Iterable, List, Dict, NamedTuple, Set, Union
+
+from hbutils.system import urlsplit
+from hbutils.system.network.url import SplitURL
+
+
+def split_url(url: Union[str, SplitURL]) -> SplitURL:
+    """
+    Split the url, the already splitted one is returned as it is.
+    """
+    return url if isinstance(url, SplitURL) else urlsplit(url)
+
+
+class SiteHandler(NamedTuple):
+    name: str
+    hosts: Set[str]
+    check: Callable[[SplitURL], bool]
+    resource_id: Callable[[str], Optional[str]]
+    download: Callable[[str, str], None]
+    stream: Optional[Callable] = None
+
+
+class ResolvedURL(NamedTuple):
+    url: str
+    handler: SiteHandler
+    resource_id: str
+
+
+class SiteRouter:
+    """
+    Dispatch the urls to the registered site handlers by hostname.
+
+    Each url is parsed only once, and only the handlers registered on its host are checked,
+    so registering more sites does not slow down the other urls. The :class:`ResolvedURL`
+    carries the resource id, and can be reused by the existence check and the download.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[SiteHandler]] = {}
+
+    def register(self, name: str, hosts: Iterable[str], check: Callable[[SplitURL], bool],
+                 resource_id: Callable[[str], Optional[str]], download: Callable[[str, str], None],
+                 stream: Optional[Callable] = None) -> SiteHandler:
+        handler = SiteHandler(name, set(hosts), check, resource_id, download, stream)
+        for host in handler.hosts:
+            self._handlers.setdefault(host.lower(), []).append(handler)
+        return handler
+
+    @property
+    def hosts(self) -> Set[str]:
+        return set(self._handlers.keys())
+
+    def _candidates(self, url: str) -> List[SiteHandler]:
+        try:
+            splitted = urlsplit(url)
+        except ValueError:
+            return []
+        handlers = self._handlers.get((splitted.host or '').lower()) or []
+        return [handler for handler in handlers if handler.check(splitted)]
+
+    def match(self, url: str) -> Optional[SiteHandler]:
+        """
+        Find the handler of the url, without resolving the resource id.
+        """
+        candidates = self._candidates(url)
+        return candidates[0] if candidates else None
+
+    def resolve(self, url: str) -> Optional[ResolvedURL]:
+        """
+        Find the handler of the url and resolve its resource id.
+
+        :return: Resolved url, ``None`` when no handler accepts it.
+        """
+        for handler in self._candidates(url):
+            resource_id = handler.resource_id(url)
+            if resource_id is not None:
+                return ResolvedURL(url, handler, resource_id)
+        return None
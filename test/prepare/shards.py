@@ -0,0 +1,206 @@
+import glob
+import json
+import multiprocessing
+import os
+import time
+from typing import TYPE_CHECKING, Optional, Iterator, Tuple, List
+
+from ditk import logging
+from hbutils.string import plural_word
+
+from pyskeb.client.client import SkebClient
+from pyskeb.models import User
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def iter_user_pages_sharded(client: SkebClient, user_sort: str = 'popularity', shard: int = 0,
+                            num_shards: int = 1, start_page: Optional[int] = None,
+                            page_size: int = 90) -> Iterator[Tuple[int, List[User]]]:
+    """
+    Iterate the user pages of the shard, the pages ``shard``, ``shard + num_shards``, ... are assigned to it.
+
+    :return: Iterator of page index and the users in it.
+    """
+    page = shard if start_page is None else start_page
+    while True:
+        users = client.get_user_page(page * page_size, page_size, user_sort, typed=True)
+        if not users:
+            break
+        yield page, users
+        page += num_shards
+
+
+def _checkpoint_file(output_dir: str, shard: int) -> str:
+    return os.path.join(output_dir, f'shard_{shard}.json')
+
+
+def _result_file(output_dir: str, shard: int) -> str:
+    return os.path.join(output_dir, f'shard_{shard}.jsonl')
+
+
+def _crawl_config(num_shards: int, user_sort: str, work_role: str, page_size: int) -> dict:
+    # the settings deciding the pages of each shard, which should not change when resuming
+    return {'num_shards': num_shards, 'user_sort': user_sort, 'work_role': work_role, 'page_size': page_size}
+
+
+def check_checkpoint(checkpoint: dict, config: dict):
+    """
+    Check the settings saved in the checkpoint are the same as the current ones.
+
+    :raises ValueError: When the settings not match.
+    """
+    mismatched = {key: (checkpoint[key], value) for key, value in config.items()
+                  if key in checkpoint and checkpoint[key] != value}
+    if mismatched:
+        details = ', '.join(f'{key} {saved!r} saved but {value!r} given' for key, (saved, value) in mismatched.items())
+        raise ValueError(f'Checkpoint of shard #{checkpoint["shard"]} not match the settings, {details}. '
+                         f'Resume it with the same settings, or use another output directory.')
+
+
+def load_checkpoint(output_dir: str, shard: int, config: Optional[dict] = None) -> dict:
+    """
+    Load the checkpoint of the shard, a new one is created when not exist.
+
+    :param config: The crawl settings, checked against the saved ones and then saved in the checkpoint.
+    :raises ValueError: When the settings not match.
+    """
+    checkpoint_file = _checkpoint_file(output_dir, shard)
+    if os.path.exists(checkpoint_file):
+        with open(checkpoint_file, 'r') as f:
+            checkpoint = json.load(f)
+    else:
+        checkpoint = {'shard': shard, 'next_page': shard, 'finished': False, 'users': 0, 'posts': 0}
+    if config is not None:
+        check_checkpoint(checkpoint, config)
+        checkpoint.update(config)
+    return checkpoint
+
+
+def _save_checkpoint(output_dir: str, shard: int, checkpoint: dict):
+    checkpoint_file = _checkpoint_file(output_dir, shard)
+    with open(checkpoint_file + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(checkpoint_file + '.tmp', checkpoint_file)
+
+
+def crawl_users_shard(output_dir: str, shard: int, num_shards: int, user_sort: str = 'popularity',
+                      work_role: str = 'client', page_size: int = 90, client: Optional[SkebClient] = None):
+    """
+    Crawl the posts of the users in one shard, resume from its checkpoint.
+
+    The posts of each user page are appended to ``shard_<i>.jsonl`` after the whole page is done,
+    then the checkpoint ``shard_<i>.json`` is updated. A crash may duplicate the posts of one page,
+    which are removed by :func:`merge_shards`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    client = client or SkebClient()
+    checkpoint = load_checkpoint(output_dir, shard, _crawl_config(num_shards, user_sort, work_role, page_size))
+    if checkpoint['finished']:
+        logging.info(f'Shard #{shard} already finished.')
+        return
+
+    for page, users in iter_user_pages_sharded(client, user_sort, shard, num_shards,
+                                               checkpoint['next_page'], page_size):
+        records = []
+        for user in users:
+            for work in client.iter_work_pages(user.screen_name, role=work_role, typed=True):
+                records.append({'username': work.username, 'work_id': work.work_id, 'user': user.screen_name})
+
+        with open(_result_file(output_dir, shard), 'a') as f:
+            for record in records:
+                print(json.dumps(record, ensure_ascii=False), file=f)
+        checkpoint['next_page'] = page + num_shards
+        checkpoint['users'] += len(users)
+        checkpoint['posts'] += len(records)
+        _save_checkpoint(output_dir, shard, checkpoint)
+        logging.info(f'Shard #{shard}, page {page}: {plural_word(len(records), "post")} '
+                     f'from {plural_word(len(users), "user")}.')
+
+    checkpoint['finished'] = True
+    _save_checkpoint(output_dir, shard, checkpoint)
+    logging.info(f'Shard #{shard} finished, {plural_word(checkpoint["posts"], "post")} in total.')
+
+
+def merge_shards(output_dir: str, output_file: Optional[str] = None) -> 'pd.DataFrame':
+    """
+    Merge the results of the shards into ``posts.csv``, the duplicated posts are dropped.
+    """
+    import pandas as pd
+
+    output_file = output_file or os.path.join(output_dir, 'posts.csv')
+    records = []
+    for file in sorted(glob.glob(os.path.join(output_dir, 'shard_*.jsonl'))):
+        with open(file, 'r') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+
+    df = pd.DataFrame(records, columns=['username', 'work_id', 'user'])
+    df = df.drop_duplicates(['username', 'work_id']).sort_values(['username', 'work_id'])
+    df.to_csv(output_file, index=False)
+    logging.info(f'{plural_word(len(df), "post")} merged into {output_file!r}.')
+    return df
+
+
+def _shard_main(output_dir: str, shard: int, num_shards: int, user_sort: str, work_role: str, page_size: int):
+    logging.try_init_root(logging.INFO)
+    crawl_users_shard(output_dir, shard, num_shards, user_sort, work_role, page_size)
+
+
+def run_sharded_crawl(output_dir: str, num_shards: int = 4, user_sort: str = 'popularity',
+                      work_role: str = 'client', page_size: int = 90, monitor_interval: float = 30.0,
+                      max_restarts: int = 3) -> 'pd.DataFrame':
+    """
+    Crawl the posts via users with ``num_shards`` worker processes, and merge the results.
+
+    The progress of the shards is logged every ``monitor_interval`` seconds. A crashed shard is restarted
+    from its checkpoint, at most ``max_restarts`` times. Running it again with the same ``output_dir``
+    and the same settings resumes the unfinished shards.
+
+    :raises ValueError: When the checkpoints in ``output_dir`` were saved with different settings.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # fail before starting the workers, including the extra shards left by a crawl with more shards
+    config = _crawl_config(num_shards, user_sort, work_role, page_size)
+    for file in glob.glob(os.path.join(output_dir, 'shard_*.json')):
+        with open(file, 'r') as f:
+            check_checkpoint(json.load(f), config)
+    ctx = multiprocessing.get_context('spawn')
+
+    def _start(shard):
+        process = ctx.Process(
+            target=_shard_main, name=f'shard_{shard}',
+            args=(output_dir, shard, num_shards, user_sort, work_role, page_size),
+        )
+        process.start()
+        return process
+
+    processes = {shard: _start(shard) for shard in range(num_shards)}
+    restarts = {shard: 0 for shard in range(num_shards)}
+    while processes:
+        time.sleep(monitor_interval)
+        for shard, process in list(processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            if process.exitcode == 0:
+                del processes[shard]
+            elif restarts[shard] < max_restarts:
+                restarts[shard] += 1
+                logging.warning(f'Shard #{shard} crashed with exit code {process.exitcode}, '
+                                f'restarting ({restarts[shard]}/{max_restarts}) ...')
+                processes[shard] = _start(shard)
+            else:
+                logging.error(f'Shard #{shard} crashed with exit code {process.exitcode}, gave up.')
+                del processes[shard]
+
+        checkpoints = [load_checkpoint(output_dir, shard) for shard in range(num_shards)]
+        logging.info(f'{sum(c["finished"] for c in checkpoints)}/{num_shards} shards finished, '
+                     f'{plural_word(sum(c["users"] for c in checkpoints), "user")} and '
+                     f'{plural_word(sum(c["posts"] for c in checkpoints), "post")} crawled, '
+                     f'{len(processes)} running.')
+
+    unfinished = [shard for shard in range(num_shards) if not load_checkpoint(output_dir, shard)['finished']]
+    if unfinished:
+        logging.warning(f'Shards {unfinished!r} are not finished, run again to resume them.')
+    return merge_shards(output_dir)
@@ -0,0 +1,167 @@
+import io
+import json
+import os.path
+import re
+from typing import List
+
+import numpy as np
+from ditk import logging
+from hbutils.string import plural_word
+from huggingface_hub import CommitOperationAdd, CommitOperationDelete
+
+from .base import get_hf_fs
+
+
+class SidCodec:
+    """
+    Encode sids like ``suit_114514`` or ``act_12_lottery_34`` into ``uint64`` numbers.
+
+    :param sid_format: Format of the sids, each ``{}`` is a number field, at most 2 fields are supported.
+    """
+
+    def __init__(self, sid_format: str = 'suit_{}'):
+        segments = sid_format.split('{}')
+        self.fields = len(segments) - 1
+        if not 1 <= self.fields <= 2:
+            raise ValueError(f'Sid format should contain 1 or 2 number fields, but {sid_format!r} found.')
+        self.sid_format = sid_format
+        self._pattern = re.compile(r'(\d+)'.join(map(re.escape, segments)))
+
+    def encode(self, sid: str) -> int:
+        matching = self._pattern.fullmatch(sid)
+        if not matching:
+            raise ValueError(f'Invalid sid {sid!r} for format {self.sid_format!r}.')
+        values = [int(v) for v in matching.groups()]
+        bits = 64 // self.fields
+        if any(v >= 1 << bits for v in values):
+            raise ValueError(f'Sid {sid!r} is out of range, each number should be less than 2 ** {bits}.')
+        if self.fields == 1:
+            return values[0]
+        else:
+            high, low = values
+            return (high << 32) | low
+
+    def decode(self, value: int) -> str:
+        value = int(value)
+        if self.fields == 1:
+            return self.sid_format.format(value)
+        else:
+            return self.sid_format.format(value >> 32, value & 0xffffffff)
+
+
+def _to_array(values) -> np.ndarray:
+    return np.unique(np.asarray(list(values), dtype=np.uint64))
+
+
+def _load_array(path) -> np.ndarray:
+    return np.load(io.BytesIO(get_hf_fs().read_bytes(path)))
+
+
+class SidStore:
+    """
+    Compact store of the crawled sids in repository.
+
+    The sids are saved as sorted ``uint64`` arrays, which consists of a compacted ``exist_sids.npy``
+    and several append-only delta files in ``exist_sids/``. Each flush only uploads a small delta file,
+    and the deltas will be merged into ``exist_sids.npy`` when there are more than ``max_deltas`` of them.
+    The legacy ``exist_sids.json`` will be migrated on the first flush.
+
+    :param repository: Repository of the sids.
+    :param sid_format: Format of the sids, see :class:`SidCodec`.
+    :param max_deltas: Max number of delta files before compaction.
+    """
+
+    def __init__(self, repository: str, sid_format: str = 'suit_{}', max_deltas: int = 16):
+        self.repository = repository
+        self.codec = SidCodec(sid_format)
+        self.max_deltas = max_deltas
+
+        self._has_base = False
+        self._has_legacy = False
+        self._delta_files = []
+        self._flushed = np.zeros((0,), dtype=np.uint64)
+        self._pending = set()
+        self._compacted = False
+        self._load()
+
+    def _load(self):
+        arrays = []
+        if get_hf_fs().exists(f'datasets/{self.repository}/exist_sids.npy'):
+            self._has_base = True
+            arrays.append(_load_array(f'datasets/{self.repository}/exist_sids.npy'))
+        if get_hf_fs().exists(f'datasets/{self.repository}/exist_sids.json'):
+            self._has_legacy = True
+            if not self._has_base:
+                sids = json.loads(get_hf_fs().read_text(f'datasets/{self.repository}/exist_sids.json'))
+                arrays.append(_to_array(map(self.codec.encode, sids)))
+
+        self._delta_files = sorted(
+            os.path.basename(file)
+            for file in get_hf_fs().glob(f'datasets/{self.repository}/exist_sids/*.npy')
+        )
+        for file in self._delta_files:
+            arrays.append(_load_array(f'datasets/{self.repository}/exist_sids/{file}'))
+
+        if arrays:
+            self._flushed = np.unique(np.concatenate(arrays).astype(np.uint64))
+        logging.info(f'{plural_word(len(self._flushed), "exist sid")} detected, '
+                     f'with {plural_word(len(self._delta_files), "delta file")}.')
+
+    def __contains__(self, sid) -> bool:
+        return self._contains_value(self.codec.encode(sid))
+
+    def _contains_value(self, value: int) -> bool:
+        if value in self._pending:
+            return True
+        index = np.searchsorted(self._flushed, np.uint64(value))
+        return index < len(self._flushed) and self._flushed[index] == value
+
+    def __len__(self):
+        return len(self._flushed) + len(self._pending)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def add(self, sid):
+        value = self.codec.encode(sid)
+        if not self._contains_value(value):
+            self._pending.add(value)
+
+    def make_operations(self, workdir: str, name: str) -> List:
+        """
+        Save the pending sids to ``workdir``, and get the commit operations for them.
+        :meth:`mark_flushed` should be called after the operations are committed.
+
+        :param workdir: Directory to save the array files.
+        :param name: Name of the delta file, without extension.
+        :return: List of commit operations.
+        """
+        os.makedirs(workdir, exist_ok=True)
+        if not self._has_base or len(self._delta_files) + 1 > self.max_deltas:
+            logging.info(f'Compacting {plural_word(len(self), "sid")} ...')
+            base_file = os.path.join(workdir, 'exist_sids.npy')
+            np.save(base_file, np.union1d(self._flushed, _to_array(self._pending)))
+            operations = [CommitOperationAdd(path_or_fileobj=base_file, path_in_repo='exist_sids.npy')]
+            for file in self._delta_files:
+                operations.append(CommitOperationDelete(path_in_repo=f'exist_sids/{file}'))
+            if self._has_legacy:
+                operations.append(CommitOperationDelete(path_in_repo='exist_sids.json'))
+            self._compacted = True
+        else:
+            delta_file = os.path.join(workdir, f'{name}.npy')
+            np.save(delta_file, _to_array(self._pending))
+            operations = [CommitOperationAdd(path_or_fileobj=delta_file, path_in_repo=f'exist_sids/{name}.npy')]
+            self._compacted = False
+
+        return operations
+
+    def mark_flushed(self, name: str):
+        if self._compacted:
+            self._has_base = True
+            self._has_legacy = False
+            self._delta_files = []
+        else:
+            self._delta_files = sorted([*self._delta_files, f'{name}.npy'])
+        self._flushed = np.union1d(self._flushed, _to_array(self._pending))
+        self._pending = set()
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+pytest.importorskip('ditk')
+
+from .deadline import DeadlineScheduler  # noqa: E402
+
+
+@pytest.mark.unittest
+class TestPrepareDeadline:
+    def test_no_limit(self):
+        scheduler = DeadlineScheduler()
+        assert scheduler.remaining() == float('inf')
+        assert scheduler.deadline is None
+        assert list(scheduler.iterate(range(5), 'item')) == [0, 1, 2, 3, 4]
+        assert scheduler.can_start('item')
+        assert not scheduler.stopped
+
+    def test_estimate(self):
+        scheduler = DeadlineScheduler()
+        assert scheduler.estimate('download') is None
+        with scheduler.unit('download', size=100):
+            time.sleep(0.02)
+        with scheduler.unit('download', size=300):
+            time.sleep(0.06)
+        assert scheduler.estimate('download') == pytest.approx(0.04, abs=0.02)
+        assert scheduler.estimate('download', size=1000) == pytest.approx(0.2, abs=0.1)
+
+    def test_unit_raised(self):
+        scheduler = DeadlineScheduler()
+        with pytest.raises(TimeoutError):
+            with scheduler.unit('job', size=100):
+                time.sleep(0.05)
+                raise TimeoutError('Job timed out.')
+        with scheduler.unit('job', size=100):
+            pass
+        # the failed unit is still counted in the cost
+        assert scheduler._stats['job'].count == 2
+        assert scheduler.estimate('job') == pytest.approx(0.025, abs=0.02)
+        assert scheduler.estimate('job', size=100) >= 0.025
+
+    def test_can_start(self):
+        scheduler = DeadlineScheduler(time_limit=10.0, reserve=1.0, safety=1.0, start_time=time.time() - 5.0)
+        assert 4.5 < scheduler.remaining() <= 5.0
+        assert scheduler.can_start('item')
+
+        scheduler._stats.clear()
+        with scheduler.unit('item'):
+            pass
+        scheduler._stats['item'].time = 2.0
+        with scheduler.unit('flush', size=100):
+            pass
+        scheduler._stats['flush'].sized_time = 1.0
+        assert scheduler.can_start('item', final='flush', final_size=100)
+        assert not scheduler.can_start('item', final='flush', final_size=300)
+        # stays stopped once the budget is run out
+        assert scheduler.stopped
+        assert scheduler.is_stopped('item')
+        assert not scheduler.can_start('item')
+        # the other kinds of units are still checked by their own costs
+        assert not scheduler.is_stopped('flush')
+        assert scheduler.can_start('flush', size=100)
+        assert not scheduler.can_start('flush', size=500)
+        assert scheduler.is_stopped('flush')
+
+    def test_iterate(self):
+        scheduler = DeadlineScheduler(time_limit=0.25, reserve=0.0, safety=1.0)
+        done = []
+        for i in scheduler.iterate(range(100), 'item'):
+            time.sleep(0.05)
+            done.append(i)
+        assert 3 <= len(done) <= 5
+        assert scheduler.stopped
+        assert scheduler.remaining() > 0
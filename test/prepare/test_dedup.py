@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+pytest.importorskip('PIL')
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from .dedup import hex_to_hashes, hamming_distances, DuplicateIndex, remove_near_duplicates  # noqa: E402
+from .thumbs import image_phash  # noqa: E402
+
+
+def _random_hashes(n: int, seed: int = 0) -> np.ndarray:
+    high, low = np.random.RandomState(seed).randint(0, 2 ** 32, size=(2, n), dtype=np.uint64)
+    return (high << np.uint64(32)) | low
+
+
+def _flip(hash_: int, bits: int, seed: int) -> int:
+    for position in np.random.RandomState(seed).choice(64, size=bits, replace=False).tolist():
+        hash_ ^= 1 << position
+    return hash_
+
+
+@pytest.mark.unittest
+class TestPrepareDedup:
+    def test_hex_to_hashes(self):
+        hashes = hex_to_hashes(['0000000000000001', 'ffffffffffffffff', '8000000000000000'])
+        assert hashes.dtype == np.uint64
+        assert hashes.tolist() == [1, 2 ** 64 - 1, 2 ** 63]
+        assert hex_to_hashes([]).shape == (0,)
+
+    def test_hamming_distances(self):
+        hashes = np.array([0, 1, 3, 2 ** 64 - 1], dtype=np.uint64)
+        assert hamming_distances(hashes, 0).tolist() == [0, 1, 2, 64]
+        assert hamming_distances(hashes, 2 ** 64 - 1).tolist() == [64, 63, 62, 0]
+
+    @pytest.mark.parametrize(['radius', 'substrings'], [(6, 4), (8, 4), (3, 2), (10, 8)])
+    def test_query_brute_force(self, radius, substrings):
+        hashes = _random_hashes(2000)
+        # near-duplicates of the first hashes
+        near = np.array([_flip(int(h), i % (radius + 3), i) for i, h in enumerate(hashes[:300].tolist())],
+                        dtype=np.uint64)
+        hashes = np.concatenate([hashes, near])
+        ids = np.arange(len(hashes)) + 100
+
+        index = DuplicateIndex(radius=radius, substrings=substrings)
+        index.add(ids, hashes)
+        for i in range(0, 320, 7):
+            query = int(hashes[i])
+            distances = hamming_distances(hashes, query)
+            expected = sorted(zip(ids[distances <= radius].tolist(), distances[distances <= radius].tolist()),
+                              key=lambda x: (x[1], x[0]))
+            assert index.query(query) == expected
+
+    def test_query_empty(self):
+        assert DuplicateIndex().query(12345) == []
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            DuplicateIndex(substrings=5)
+        with pytest.raises(ValueError):
+            DuplicateIndex().add([1, 2], [1])
+
+    def test_add_unique(self):
+        base = int(_random_hashes(1)[0])
+        index = DuplicateIndex(radius=4)
+        index.add([1], [base])
+        other = int(_random_hashes(1, seed=10)[0])
+        results = index.add_unique(
+            [2, 3, 4, 5],
+            np.array([_flip(base, 3, 0), other, _flip(other, 2, 1), _flip(base, 10, 2)], dtype=np.uint64),
+        )
+        assert results == [(2, 1), (3, None), (4, 3), (5, None)]
+        assert len(index) == 5
+        assert [id_ for id_, _ in index.query(base)] == [1, 2]
+
+    def test_save_and_load(self, tmp_path):
+        index = DuplicateIndex(radius=5, substrings=8)
+        index.add([1, 2, 3], _random_hashes(3))
+        file = str(tmp_path / 'dedup.npz')
+        index.save(file)
+
+        for source in [file, open(file, 'rb').read()]:
+            loaded = DuplicateIndex.load(source)
+            assert (loaded.radius, loaded.substrings) == (5, 8)
+            assert loaded.ids.tolist() == [1, 2, 3]
+            assert loaded.hashes.tolist() == index.hashes.tolist()
+
+    def test_from_rows(self):
+        index = DuplicateIndex.from_rows([
+            {'id': 1, 'phash': '00000000000000ff'},
+            {'id': 2, 'phash': None},
+            {'id': 3},
+            {'id': 4, 'phash': '00000000000000fe'},
+        ], radius=2)
+        assert index.ids.tolist() == [1, 4]
+        assert index.query(0xfc) == [(4, 1), (1, 2)]
+
+    def test_remove_near_duplicates(self, tmp_path):
+        rs = np.random.RandomState(0)
+        images = [Image.fromarray((rs.rand(8, 8, 3) * 255).astype(np.uint8)).resize((512, 512), Image.BICUBIC)
+                  for _ in range(3)]
+        directory = tmp_path / 'images'
+        os.makedirs(directory / 'sub')
+        images[0].save(directory / 'a.png')
+        images[0].resize((300, 300)).save(directory / 'sub' / 'b.jpg', quality=90)
+        images[1].save(directory / 'c.png')
+        images[2].save(directory / 'd.png')
+        with open(directory / 'e.txt', 'w') as f:
+            print('not an image', file=f)
+
+        index = DuplicateIndex()
+        index.add([1], hex_to_hashes([image_phash(images[2])]))
+
+        removed = remove_near_duplicates(str(directory), index, max_workers=2)
+        assert sorted(removed) == ['d.png', os.path.join('sub', 'b.jpg')]
+        assert sorted(os.listdir(directory)) == ['a.png', 'c.png', 'e.txt', 'sub']
+        assert len(index) == 5
@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+
+import pytest
+
+pytest.importorskip('gdown')
+
+from . import google  # noqa: E402
+from .google import DrivePacer  # noqa: E402
+
+
+class _FakeClock:
+    def __init__(self, current_time: float = 0.0):
+        self.current_time = current_time
+        self.sleeps = []
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return self.current_time
+
+    def sleep(self, seconds: float):
+        with self._lock:
+            self.sleeps.append(seconds)
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    clock = _FakeClock()
+    monkeypatch.setattr(google, 'time', clock)
+    return clock
+
+
+@pytest.fixture()
+def resolved(monkeypatch, tmp_path):
+    resolved = []
+
+    def _resolve_google_drive(drive_url, proxy=None):
+        resolved.append(drive_url)
+        if 'missing' in drive_url:
+            return None
+        return {'resource_id': f'googledrive_{drive_url}', 'files': []}
+
+    monkeypatch.setattr(google, '_resolve_google_drive', _resolve_google_drive)
+    monkeypatch.setattr(google, '_CACHE_DIR', str(tmp_path / 'google_drive'))
+    monkeypatch.setattr(google, '_CACHE_TTL', 100.0)
+    return resolved
+
+
+@pytest.mark.unittest
+class TestPrepareGoogle:
+    def test_pacer_throttle_and_decay(self, clock):
+        pacer = DrivePacer(wait_time=4.0, min_wait_time=1.0, max_wait_time=20.0, ratio=0.0, decay=0.5)
+        pacer.wait()
+        assert clock.sleeps == [4.0]
+
+        pacer.throttled()
+        assert pacer.wait_time == 8.0
+        pacer.throttled()
+        pacer.throttled()
+        assert pacer.wait_time == 20.0
+
+        # the next start is spaced by the doubled interval
+        clock.current_time = 4.0
+        pacer.wait()
+        assert clock.sleeps == [4.0, 20.0]
+
+        pacer.success()
+        assert pacer.wait_time == 10.0
+        for _ in range(10):
+            pacer.success()
+        assert pacer.wait_time == 1.0
+
+        # no wait when the last start is long enough ago
+        clock.current_time = 100.0
+        pacer.wait()
+        assert clock.sleeps == [4.0, 20.0]
+
+    def test_pacer_concurrent(self, clock):
+        pacer = DrivePacer(wait_time=2.0, ratio=0.0)
+        threads = [threading.Thread(target=pacer.wait) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # each download gets its own slot
+        assert sorted(clock.sleeps) == [2.0 * (i + 1) for i in range(8)]
+
+    def test_pacer_jitter(self, clock):
+        pacer = DrivePacer(wait_time=10.0, ratio=0.1)
+        for _ in range(20):
+            assert 9.0 <= pacer._get_wait_time() <= 11.0
+
+    def test_resolve_cache_hit(self, clock, resolved):
+        url = 'https://drive.google.com/drive/folders/f1'
+        resource = google.resolve_google_drive(url)
+        assert resource == {'resource_id': f'googledrive_{url}', 'files': []}
+        clock.current_time = 99.0
+        assert google.resolve_google_drive(url) == resource
+        assert google.get_google_resource_id(url) == f'googledrive_{url}'
+        assert resolved == [url]
+
+    def test_resolve_cache_expired(self, clock, resolved):
+        url = 'https://drive.google.com/drive/folders/f1'
+        google.resolve_google_drive(url)
+        clock.current_time = 100.0
+        google.resolve_google_drive(url)
+        assert resolved == [url, url]
+
+        # cached again from the new resolution
+        clock.current_time = 150.0
+        google.resolve_google_drive(url)
+        assert resolved == [url, url]
+
+    def test_resolve_cache_url_mismatch(self, clock, resolved):
+        url = 'https://drive.google.com/drive/folders/f1'
+        google.resolve_google_drive(url)
+        cache_file = google._cache_file(url)
+        with open(cache_file, 'r') as f:
+            data = json.load(f)
+        data['url'] = 'https://drive.google.com/drive/folders/f2'
+        with open(cache_file, 'w') as f:
+            json.dump(data, f)
+
+        assert google.resolve_google_drive(url)['resource_id'] == f'googledrive_{url}'
+        assert resolved == [url, url]
+
+    def test_resolve_none_not_cached(self, clock, resolved):
+        url = 'https://drive.google.com/drive/folders/missing'
+        assert google.resolve_google_drive(url) is None
+        assert google.resolve_google_drive(url) is None
+        assert google.get_google_drive_ids(url) == []
+        assert resolved == [url, url, url]
+        assert not os.path.exists(google._cache_file(url))
+
+    @pytest.mark.parametrize(['content'], [
+        ('{"url": "https://drive.google.com/drive/fol',),
+        ('{"url": "https://drive.google.com/drive/folders/f1"}',),
+        ('[]',),
+    ])
+    def test_resolve_cache_broken(self, clock, resolved, content):
+        url = 'https://drive.google.com/drive/folders/f1'
+        cache_file = google._cache_file(url)
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, 'w') as f:
+            f.write(content)
+
+        assert google.resolve_google_drive(url)['resource_id'] == f'googledrive_{url}'
+        assert google.resolve_google_drive(url)['resource_id'] == f'googledrive_{url}'
+        assert resolved == [url]
+        # replaced with the new resolution, no temporary files left
+        assert os.listdir(os.path.dirname(cache_file)) == [os.path.basename(cache_file)]
+        with open(cache_file, 'r') as f:
+            assert json.load(f)['url'] == url
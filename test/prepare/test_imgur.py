@@ -0,0 +1,117 @@
+import json
+import os
+import time
+
+import pytest
+import requests
+import responses
+from responses import matchers
+
+pytest.importorskip('ditk')
+
+from . import imgur  # noqa: E402
+
+_ALBUM_URL = 'https://api.imgur.com/post/v1/albums/abc'
+_MEDIAS = [{'url': 'https://i.imgur.com/x.png', 'name': 'x.png'}]
+
+
+@pytest.fixture()
+def client_id_file(monkeypatch, tmp_path):
+    client_id_file = str(tmp_path / 'imgur_client_id.json')
+    monkeypatch.setattr(imgur, '_CLIENT_ID_FILE', client_id_file)
+    monkeypatch.setattr(imgur, '_client_id', None)
+    return client_id_file
+
+
+def _save_client_id(client_id_file, client_id, updated_at):
+    with open(client_id_file, 'w') as f:
+        json.dump({'client_id': client_id, 'updated_at': updated_at}, f)
+
+
+def _add_imgur_pages(rsps, client_id):
+    rsps.add(responses.GET, 'https://imgur.com/', body='<html><script src="/js/main.abc.js"></script></html>',
+             content_type='text/html')
+    rsps.add(responses.GET, 'https://imgur.com/js/main.abc.js', body=f'a={{apiClientId:"{client_id}"}}')
+
+
+def _add_album(rsps, client_id, status=200):
+    rsps.add(responses.GET, _ALBUM_URL, json={'media': _MEDIAS} if status == 200 else {}, status=status,
+             match=[matchers.query_param_matcher({'client_id': client_id}, strict_match=False)])
+
+
+@pytest.mark.unittest
+class TestPrepareImgur:
+    def test_client_id_cached(self, client_id_file):
+        _save_client_id(client_id_file, 'cached', time.time())
+        with responses.RequestsMock() as rsps:
+            _add_album(rsps, 'cached')
+            assert imgur._get_medias('abc') == _MEDIAS
+            assert imgur._get_medias('abc') == _MEDIAS
+            # no scraping of the imgur pages
+            assert [call.request.url.split('?')[0] for call in rsps.calls] == [_ALBUM_URL, _ALBUM_URL]
+
+    def test_client_id_file_expired(self, client_id_file, monkeypatch):
+        monkeypatch.setattr(imgur, '_CLIENT_ID_TTL', 100.0)
+        _save_client_id(client_id_file, 'cached', time.time() - 200.0)
+        with responses.RequestsMock() as rsps:
+            _add_imgur_pages(rsps, 'scraped')
+            _add_album(rsps, 'scraped')
+            assert imgur._get_medias('abc') == _MEDIAS
+
+        with open(client_id_file, 'r') as f:
+            assert json.load(f)['client_id'] == 'scraped'
+
+    @pytest.mark.parametrize(['status'], [(401,), (403,)])
+    def test_client_id_refresh(self, client_id_file, status):
+        _save_client_id(client_id_file, 'expired', time.time())
+        with responses.RequestsMock() as rsps:
+            _add_album(rsps, 'expired', status=status)
+            _add_imgur_pages(rsps, 'scraped')
+            _add_album(rsps, 'scraped')
+            assert imgur._get_medias('abc') == _MEDIAS
+            assert len(rsps.calls) == 4
+
+        assert imgur._client_id == 'scraped'
+        with open(client_id_file, 'r') as f:
+            assert json.load(f)['client_id'] == 'scraped'
+
+    def test_client_id_refresh_once(self, client_id_file):
+        _save_client_id(client_id_file, 'expired', time.time())
+        with responses.RequestsMock() as rsps:
+            _add_album(rsps, 'expired', status=403)
+            _add_imgur_pages(rsps, 'scraped')
+            _add_album(rsps, 'scraped', status=403)
+            with pytest.raises(requests.HTTPError):
+                imgur._get_medias('abc')
+
+    def test_download_duplicated_names(self, client_id_file, tmp_path):
+        _save_client_id(client_id_file, 'cached', time.time())
+        medias = [
+            {'id': 'a1', 'name': 'image.jpg', 'url': 'https://i.imgur.com/a1.jpg'},
+            {'id': 'a2', 'name': 'image.jpg', 'url': 'https://i.imgur.com/a2.jpg'},
+            {'id': 'a2', 'name': 'IMAGE.jpg', 'url': 'https://i.imgur.com/a3.jpg'},
+            {'id': 'b1', 'name': '', 'mime_type': 'image/png', 'url': 'https://i.imgur.com/b1.png'},
+            {'id': 'b2', 'name': '', 'mime_type': 'image/png', 'url': 'https://i.imgur.com/b2.png'},
+            {'name': 'cover', 'mime_type': 'image/png', 'url': 'https://i.imgur.com/c1.png'},
+            {'name': 'cover.png', 'url': 'https://i.imgur.com/c2.png'},
+        ]
+        output_dir = tmp_path / 'output'
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _ALBUM_URL, json={'media': medias})
+            for item in medias:
+                rsps.add(responses.GET, item['url'], body=item['url'].encode())
+            imgur.download_imgur_to_directory('https://imgur.com/a/abc', str(output_dir))
+
+        files = {}
+        for filename in os.listdir(output_dir):
+            with open(output_dir / filename, 'rb') as f:
+                files[filename] = f.read().decode()
+        assert files == {
+            'image.jpg': 'https://i.imgur.com/a1.jpg',
+            'image_a2.jpg': 'https://i.imgur.com/a2.jpg',
+            'IMAGE_a2_2.jpg': 'https://i.imgur.com/a3.jpg',
+            'b1.png': 'https://i.imgur.com/b1.png',
+            'b2.png': 'https://i.imgur.com/b2.png',
+            'cover.png': 'https://i.imgur.com/c1.png',
+            'cover_6.png': 'https://i.imgur.com/c2.png',
+        }
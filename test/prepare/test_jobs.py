@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+
+pytest.importorskip('ditk')
+
+from .jobs import JobQueue, PENDING, IN_PROGRESS, DONE, FAILED  # noqa: E402
+
+
+def _drain_worker(queue_file, result_queue):
+    queue = JobQueue(queue_file)
+    acquired = []
+    while True:
+        job = queue.acquire()
+        if job is None:
+            break
+        acquired.append(job.url)
+        queue.complete(job, f'resource_{job.url}')
+    result_queue.put(acquired)
+
+
+@pytest.fixture()
+def queue_file(tmp_path):
+    return os.path.join(str(tmp_path), 'jobs.sqlite')
+
+
+@pytest.mark.unittest
+class TestPrepareJobs:
+    def test_lifecycle(self, queue_file):
+        queue = JobQueue(queue_file, retry_delay=0.0, max_attempts=2)
+        assert not queue.has_post('a', 1)
+        assert queue.add_post('a', 1, ['https://imgur.com/a/x', 'https://imgur.com/a/y']) == 2
+        assert queue.add_post('a', 1, ['https://imgur.com/a/x']) == 0
+        assert queue.has_post('a', 1)
+        assert queue.counts() == {PENDING: 2, IN_PROGRESS: 0, DONE: 0, FAILED: 0}
+
+        job = queue.acquire()
+        assert (job.username, job.work_id, job.url, job.attempts) == ('a', 1, 'https://imgur.com/a/x', 1)
+        queue.complete(job, 'imgur_x')
+
+        job = queue.acquire()
+        assert job.url == 'https://imgur.com/a/y'
+        queue.fail(job, 'error 1')
+        job = queue.acquire()
+        assert (job.url, job.attempts) == ('https://imgur.com/a/y', 2)
+        queue.fail(job, 'error 2')
+        assert queue.acquire() is None
+        assert queue.counts() == {PENDING: 0, IN_PROGRESS: 0, DONE: 1, FAILED: 1}
+
+        assert queue.retry_failed() == 1
+        assert queue.acquire().attempts == 1
+
+    def test_retry_delay(self, queue_file):
+        queue = JobQueue(queue_file, retry_delay=100.0)
+        queue.add_post('a', 1, ['https://imgur.com/a/x'])
+        queue.fail(queue.acquire(), 'error')
+        assert queue.acquire() is None
+        assert queue.next_available_at() > time.time() + 50
+
+    def test_lease_expired(self, queue_file):
+        queue = JobQueue(queue_file, lease_time=0.0, max_attempts=2)
+        queue.add_post('a', 1, ['https://imgur.com/a/x'])
+        # a crashed worker, which never completes the job
+        assert queue.acquire().attempts == 1
+
+        other = JobQueue(queue_file, lease_time=0.0, max_attempts=2)
+        assert other.acquire().attempts == 2
+        assert other.acquire() is None
+        assert other.counts()[FAILED] == 1
+
+    def test_release(self, queue_file):
+        queue = JobQueue(queue_file)
+        queue.add_post('a', 1, ['https://imgur.com/a/x'])
+        queue.release(queue.acquire())
+        assert queue.acquire().attempts == 1
+
+    def test_multiple_processes(self, queue_file):
+        queue = JobQueue(queue_file)
+        for i in range(50):
+            queue.add_post('a', i, [f'https://imgur.com/a/{i}_{j}' for j in range(4)])
+
+        result_queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_drain_worker, args=(queue_file, result_queue))
+                     for _ in range(4)]
+        for p in processes:
+            p.start()
+        results = [result_queue.get(timeout=60) for _ in processes]
+        for p in processes:
+            p.join()
+
+        urls = [url for result in results for url in result]
+        assert len(urls) == 200
+        assert len(set(urls)) == 200
+        assert queue.counts()[DONE] == 200
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+pytest.importorskip('ditk')
+
+from . import lololo  # noqa: E402
+from .deadline import DeadlineScheduler  # noqa: E402
+from .jobs import JobQueue, PENDING, IN_PROGRESS, DONE, FAILED  # noqa: E402
+
+
+@pytest.fixture()
+def events(monkeypatch):
+    events = []
+
+    def _get_urls_from_post(username, work_id):
+        events.append(('list', username, work_id))
+        return [f'https://example.com/{username}/{work_id}/{i}' for i in range(2)]
+
+    def _try_process_url(url, prefix):
+        events.append(('process', url))
+        return url.rsplit('/', maxsplit=1)[-1]
+
+    monkeypatch.setattr(lololo, 'get_urls_from_post', _get_urls_from_post)
+    monkeypatch.setattr(lololo, 'try_process_url', _try_process_url)
+    return events
+
+
+@pytest.fixture()
+def queue(tmp_path):
+    queue = JobQueue(os.path.join(str(tmp_path), 'jobs.sqlite'))
+    yield queue
+    queue.close()
+
+
+@pytest.mark.unittest
+class TestPrepareLololo:
+    def test_batch_process_interleaved(self, events, queue):
+        # left by the last run
+        queue.add_post('z', 0, ['https://example.com/z/0/0'])
+
+        lololo.batch_process_via_iterator([('a', 1), ('b', 2)], timespan=0.0, queue=queue)
+        assert events == [
+            ('process', 'https://example.com/z/0/0'),
+            ('list', 'a', 1),
+            ('process', 'https://example.com/a/1/0'),
+            ('process', 'https://example.com/a/1/1'),
+            ('list', 'b', 2),
+            ('process', 'https://example.com/b/2/0'),
+            ('process', 'https://example.com/b/2/1'),
+        ]
+        assert queue.counts() == {PENDING: 0, IN_PROGRESS: 0, DONE: 5, FAILED: 0}
+
+        # the listed posts are skipped in the next run
+        events.clear()
+        lololo.batch_process_via_iterator([('a', 1), ('c', 3)], timespan=0.0, queue=queue)
+        assert [event for event in events if event[0] == 'list'] == [('list', 'c', 3)]
+
+    def test_drain_after_listing_stopped(self, events, queue):
+        scheduler = DeadlineScheduler(time_limit=1000.0, reserve=0.0, safety=1.0)
+        queue.add_post('z', 0, ['https://example.com/z/0/0'])
+        # the listing is out of budget, but the cheap jobs can still be done
+        with scheduler.unit('post'):
+            pass
+        scheduler._stats['post'].time = 2000.0
+
+        lololo.batch_process_via_iterator([('a', 1)], timespan=0.0, queue=queue, scheduler=scheduler)
+        assert scheduler.is_stopped('post')
+        assert not scheduler.is_stopped('job')
+        assert events == [('process', 'https://example.com/z/0/0')]
+        assert queue.counts()[DONE] == 1
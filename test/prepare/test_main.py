@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('ditk')
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+_SCRIPT = """
+import json, sys
+from click.testing import CliRunner
+from test.prepare.__main__ import cli
+result = CliRunner().invoke(cli, ['--help'])
+print(json.dumps({
+    'exit_code': result.exit_code,
+    'output': result.output,
+    'modules': sorted(name for name in ('huggingface_hub', 'hfutils', 'pandas', 'PIL', 'orator', 'gdown', 'pyquery')
+                      if name in sys.modules),
+}))
+"""
+
+
+@pytest.mark.unittest
+class TestPrepareMain:
+    def test_help_is_lazy(self):
+        env = {key: value for key, value in os.environ.items() if key != 'REMOTE_REPOSITORY'}
+        output = subprocess.run([sys.executable, '-c', _SCRIPT], cwd=_ROOT, env=env, check=True,
+                                stdout=subprocess.PIPE).stdout
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        assert result['exit_code'] == 0
+        for command in ['newest', 'drain', 'users', 'pack', 'artists']:
+            assert command in result['output']
+        assert result['modules'] == []
@@ -0,0 +1,93 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+pytest.importorskip('ditk')
+
+from . import packer as packer_module, sids as sids_module  # noqa: E402
+from .packer import CrawlPacker  # noqa: E402
+from .sids import SidStore  # noqa: E402
+
+
+class _FakeHfClient:
+    def __init__(self, hf_fs):
+        self.hf_fs = hf_fs
+        self.fail_next = False
+
+    def create_commit(self, repo_id, repo_type, operations, commit_message):
+        if self.fail_next:
+            self.fail_next = False
+            raise RuntimeError('Commit failed.')
+        self.hf_fs.commit(repo_id, operations)
+
+
+@pytest.fixture()
+def hf_client(fake_hf_fs, monkeypatch):
+    client = _FakeHfClient(fake_hf_fs)
+    monkeypatch.setattr(packer_module, 'get_hf_fs', lambda: fake_hf_fs)
+    monkeypatch.setattr(sids_module, 'get_hf_fs', lambda: fake_hf_fs)
+    monkeypatch.setattr(packer_module, 'get_hf_client', lambda: client)
+    return client
+
+
+def _put(packer: CrawlPacker, sid: str, size: int = 10):
+    with open(os.path.join(packer.item_dir, f'{sid}.png'), 'wb') as f:
+        f.write(b'x' * size)
+    packer.add(sid)
+
+
+def _packs(hf_fs):
+    retval = []
+    for path in hf_fs.glob('datasets/repo/packs/*.zip'):
+        with zipfile.ZipFile(io.BytesIO(hf_fs.files[path])) as zf:
+            retval.append(sorted(zf.namelist()))
+    return retval
+
+
+@pytest.mark.unittest
+class TestPreparePacker:
+    def test_flush_by_items(self, hf_client, fake_hf_fs, tmp_path):
+        packer = CrawlPacker('repo', str(tmp_path), 'suit_pack', max_items=2, max_size=None)
+        _put(packer, 'suit_1')
+        assert fake_hf_fs.commits == []
+        _put(packer, 'suit_2')
+        assert _packs(fake_hf_fs) == [['suit_1.png', 'suit_2.png']]
+        assert os.listdir(packer.item_dir) == []
+        assert 'suit_2' in packer
+
+        _put(packer, 'suit_3')
+        assert len(fake_hf_fs.commits) == 1
+        assert packer.flush()
+        assert _packs(fake_hf_fs) == [['suit_1.png', 'suit_2.png'], ['suit_3.png']]
+        assert not packer.flush()
+        assert len(SidStore('repo')) == 3
+        assert len(fake_hf_fs.read_text('datasets/repo/records.csv').splitlines()) == 3
+
+    def test_flush_by_size(self, hf_client, fake_hf_fs, tmp_path):
+        packer = CrawlPacker('repo', str(tmp_path), 'suit_pack', max_items=None, max_size=100)
+        _put(packer, 'suit_1', size=60)
+        assert packer.pending_size() == 60
+        assert fake_hf_fs.commits == []
+        _put(packer, 'suit_2', size=60)
+        assert _packs(fake_hf_fs) == [['suit_1.png', 'suit_2.png']]
+        assert packer.pending_size() == 0
+
+    def test_commit_failed(self, hf_client, fake_hf_fs, tmp_path):
+        packer = CrawlPacker('repo', str(tmp_path), 'suit_pack', max_items=2, max_size=None)
+        _put(packer, 'suit_1')
+        hf_client.fail_next = True
+        with pytest.raises(RuntimeError):
+            _put(packer, 'suit_2')
+
+        # nothing is lost, the items are still pending with their files
+        assert fake_hf_fs.commits == []
+        assert sorted(os.listdir(packer.item_dir)) == ['suit_1.png', 'suit_2.png']
+        assert packer.sids.pending_count == 2
+
+        assert packer.flush()
+        assert _packs(fake_hf_fs) == [['suit_1.png', 'suit_2.png']]
+        assert os.listdir(packer.item_dir) == []
+        reloaded = SidStore('repo')
+        assert 'suit_1' in reloaded and 'suit_2' in reloaded
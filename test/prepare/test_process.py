@@ -0,0 +1,54 @@
+import io
+import zipfile
+
+import pytest
+import responses
+
+pytest.importorskip('stream_unzip')
+
+from .process import url_to_zip, _archive_name  # noqa: E402
+
+_DROPBOX_URL = 'https://www.dropbox.com/s/abcdef/pack.zip?dl=0'
+_MEMBERS = {
+    'pack/': b'',
+    'pack/立ち絵 (1).png': b'\x89PNG' + b'x' * 3000,
+    'pack/sub dir/rough-sketch.psd': b'8BPS' + b'y' * 5000,
+    'README.txt': b'thanks!',
+}
+
+
+def _zip_fixture() -> bytes:
+    with io.BytesIO() as bf:
+        with zipfile.ZipFile(bf, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for name, data in _MEMBERS.items():
+                zf.writestr(name, data)
+        return bf.getvalue()
+
+
+@pytest.fixture()
+def dropbox_zip():
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, 'https://www.dropbox.com/s/abcdef/pack.zip?dl=1', body=_zip_fixture(),
+                 headers={'Content-Disposition': 'attachment; filename="pack.zip"'},
+                 content_type='application/zip')
+        yield rsps
+
+
+def _archived(url, streaming: bool):
+    with url_to_zip(url, prefix='user_', streaming=streaming) as zip_file:
+        assert zip_file is not None
+        with zipfile.ZipFile(zip_file, 'r') as zf:
+            return {name: zf.read(name) for name in zf.namelist()}
+
+
+@pytest.mark.unittest
+class TestPrepareProcess:
+    def test_url_to_zip_streaming(self, dropbox_zip):
+        streamed = _archived(_DROPBOX_URL, streaming=True)
+        downloaded = _archived(_DROPBOX_URL, streaming=False)
+        assert sorted(streamed) == sorted(downloaded)
+        assert sorted(streamed) == sorted(
+            _archive_name(name, 'user_') for name in _MEMBERS if not name.endswith('/')
+        )
+        assert streamed == downloaded
+        assert streamed[_archive_name('pack/立ち絵 (1).png', 'user_')] == _MEMBERS['pack/立ち絵 (1).png']
@@ -0,0 +1,49 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip('ditk')
+
+from .profiler import StageProfiler  # noqa: E402
+
+
+@pytest.mark.unittest
+class TestPrepareProfiler:
+    def test_stage(self):
+        profiler = StageProfiler()
+        for _ in range(3):
+            with profiler.stage('download', items=1) as record:
+                time.sleep(0.01)
+                record.add(bytes_=1024)
+        with pytest.raises(ZeroDivisionError):
+            with profiler.stage('zip'):
+                _ = 1 / 0
+
+        download, zip_ = profiler.summary()
+        assert download['stage'] == 'download'
+        assert download['calls'] == 3
+        assert download['items'] == 3
+        assert download['bytes'] == 3072
+        assert download['wall_time'] >= 0.03
+        assert download['cpu_time'] < download['wall_time']
+        assert download['items_per_second'] == pytest.approx(3 / download['wall_time'])
+        assert zip_['stage'] == 'zip'
+        assert zip_['calls'] == 1
+
+        profiler.reset()
+        assert profiler.summary() == []
+
+    def test_dump(self, tmp_path):
+        profiler = StageProfiler()
+        with profiler.stage('upload', items=2, bytes_=2048):
+            pass
+
+        assert 'upload' in profiler.to_markdown()
+        report_file = str(tmp_path / 'profile.json')
+        profiler.dump(report_file)
+        with open(report_file) as f:
+            report = json.load(f)
+        assert report['total_time'] >= 0
+        assert [item['stage'] for item in report['stages']] == ['upload']
+        assert report['stages'][0]['bytes'] == 2048
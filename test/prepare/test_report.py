@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from .report import group_aggregates, IndexReport
+
+
+def _make_rows(start_id: int, n: int, seed: int = 0):
+    rs = np.random.RandomState(seed)
+    groups = ['hqimage', 'image', 'psd', 'video']
+    retval = []
+    for i in range(n):
+        group = groups[rs.choice(len(groups), p=[0.6, 0.2, 0.15, 0.05])]
+        retval.append({
+            'id': start_id + i,
+            'pack_id': f'pack_{seed}',
+            'group': group,
+            'filename': f'{start_id + i}.png',
+            'mimetype': 'image/png',
+            'file_size': int(rs.randint(1, 1000000)),
+            'width': int(rs.randint(1, 4000)) if group == 'hqimage' else None,
+            'height': int(rs.randint(1, 4000)) if group == 'hqimage' else None,
+            'archive_file': f'packs/pack_{seed}.tar',
+            'file_in_archive': f'{group}/{start_id + i}.png',
+        })
+    return retval
+
+
+@pytest.mark.unittest
+class TestPrepareReport:
+    def test_group_aggregates(self):
+        df = pd.DataFrame(_make_rows(1, 500)).sample(frac=1.0, random_state=0)
+        counts, tops = group_aggregates(df, max_rows=20)
+        assert counts == df['group'].value_counts().to_dict()
+        for group in df['group'].unique():
+            expected = df[df['group'] == group].sort_values(by='id', ascending=False)[:20]
+            assert tops[group]['id'].tolist() == expected['id'].tolist()
+
+    def test_group_aggregates_with_missing_group(self):
+        df = pd.DataFrame([{'id': 1, 'group': None}, {'id': 2, 'group': 'b'}, {'id': 3, 'group': 'a'},
+                           {'id': 4, 'group': 'b'}, {'id': 5, 'group': None}])
+        counts, tops = group_aggregates(df)
+        assert counts == {'a': 1, 'b': 2}
+        assert tops['b']['id'].tolist() == [4, 2]
+        assert group_aggregates(df[:0]) == ({}, {})
+
+    def test_incremental_update(self):
+        packs = [_make_rows(1, 300, seed=0), _make_rows(301, 40, seed=1), _make_rows(341, 200, seed=2)]
+        report = IndexReport.from_frame(pd.DataFrame(packs[0]), max_rows=50)
+        for rows in packs[1:]:
+            report.update(rows)
+        report.update([])
+
+        full = IndexReport.from_frame(pd.DataFrame([row for rows in packs for row in rows]), max_rows=50)
+        assert report.total == full.total == 540
+        assert report.counts == full.counts
+        assert report.to_markdown() == full.to_markdown()
+        for group, top in report.tops.items():
+            assert len(top) == min(50, report.counts[group])
+            assert top['id'].tolist() == sorted(top['id'].tolist(), reverse=True)
+
+    def test_to_markdown(self):
+        report = IndexReport.from_frame(None)
+        assert report.total == 0
+        assert report.to_markdown().startswith('0 images with `hqimage` group.')
+
+        report.update(_make_rows(1, 100))
+        md = report.to_markdown()
+        assert f'{report.counts["hqimage"]} images with `hqimage` group.' in md
+        assert f'{report.counts["psd"]} files with `psd` group.' in md
+        assert md.index('`hqimage`') < md.index('`image`') < md.index('`psd`') < md.index('`video`')
+        assert 'width' in md.splitlines()[2]
+        assert 'width' not in md[md.index('`image`'):]
@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip('hbutils')
+
+from .router import SiteRouter, ResolvedURL  # noqa: E402
+
+
+@pytest.fixture()
+def router():
+    router = SiteRouter()
+    router.register('a_files', {'a.com', 'www.a.com'}, lambda s: s.path_segments[1:2] == ['files'],
+                    lambda url: None if url.endswith('/empty') else 'a_' + url.rsplit('/', 1)[-1],
+                    lambda url, directory: None)
+    router.register('a_any', {'a.com'}, lambda s: True, lambda url: 'any', lambda url, directory: None)
+    return router
+
+
+@pytest.mark.unittest
+class TestPrepareRouter:
+    def test_hosts(self, router):
+        assert router.hosts == {'a.com', 'www.a.com'}
+
+    def test_match(self, router):
+        assert router.match('https://WWW.A.com/files/1').name == 'a_files'
+        assert router.match('https://a.com/others/1').name == 'a_any'
+        assert router.match('https://www.a.com/others/1') is None
+        assert router.match('https://b.com/files/1') is None
+
+    def test_resolve(self, router):
+        resolved = router.resolve('https://a.com/files/1')
+        assert isinstance(resolved, ResolvedURL)
+        assert (resolved.handler.name, resolved.resource_id) == ('a_files', 'a_1')
+        assert router.resolve('https://a.com/files/empty').resource_id == 'any'
+        assert router.resolve('https://www.a.com/files/empty') is None
@@ -0,0 +1,84 @@
+import json
+import os
+import re
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+import responses
+
+pytest.importorskip('ditk')
+
+from pyskeb.client.client import SkebClient  # noqa: E402
+from .shards import crawl_users_shard, merge_shards, load_checkpoint, run_sharded_crawl  # noqa: E402
+
+_USERS = [f'user_{i}' for i in range(7)]
+
+
+def _users_callback(request):
+    params = parse_qs(urlparse(request.url).query)
+    offset, limit = int(params['offset'][0]), int(params['limit'][0])
+    return 200, {}, json.dumps([{'screen_name': name} for name in _USERS[offset:offset + limit]])
+
+
+def _works_callback(request):
+    name = re.fullmatch(r'/api/users/(?P<name>[^/]+)/works', urlparse(request.url).path).group('name')
+    offset = int(parse_qs(urlparse(request.url).query)['offset'][0])
+    works = [{'path': f'/@artist/works/{int(name.split("_")[1]) * 10 + i}'} for i in range(2)]
+    return 200, {}, json.dumps(works if offset == 0 else [])
+
+
+@pytest.fixture()
+def skeb_api():
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(responses.GET, 'https://skeb.jp/api/users', callback=_users_callback)
+        rsps.add_callback(responses.GET, re.compile(r'https://skeb\.jp/api/users/[^/]+/works'),
+                          callback=_works_callback)
+        yield rsps
+
+
+@pytest.mark.unittest
+class TestPrepareShards:
+    def test_crawl_and_merge(self, skeb_api, tmp_path):
+        output_dir = str(tmp_path)
+        for shard in range(3):
+            crawl_users_shard(output_dir, shard, 3, page_size=2, client=SkebClient())
+
+        checkpoints = [load_checkpoint(output_dir, shard) for shard in range(3)]
+        assert all(c['finished'] for c in checkpoints)
+        assert sorted(c['users'] for c in checkpoints) == [2, 2, 3]
+        assert sum(c['posts'] for c in checkpoints) == 14
+
+        # duplicated results left by a crash are removed when merging
+        with open(os.path.join(output_dir, 'shard_0.jsonl'), 'a') as f:
+            print(json.dumps({'username': 'artist', 'work_id': 0, 'user': 'user_0'}), file=f)
+        df = merge_shards(output_dir)
+        assert len(df) == 14
+        assert os.path.exists(os.path.join(output_dir, 'posts.csv'))
+
+    def test_resume(self, skeb_api, tmp_path):
+        output_dir = str(tmp_path)
+        with open(os.path.join(output_dir, 'shard_1.json'), 'w') as f:
+            json.dump({'shard': 1, 'next_page': 3, 'finished': False, 'users': 2, 'posts': 4}, f)
+        crawl_users_shard(output_dir, 1, 2, page_size=2, client=SkebClient())
+
+        checkpoint = load_checkpoint(output_dir, 1)
+        assert checkpoint == {'shard': 1, 'next_page': 5, 'finished': True, 'users': 3, 'posts': 6,
+                              'num_shards': 2, 'user_sort': 'popularity', 'work_role': 'client', 'page_size': 2}
+        users_requested = [call.request.url for call in skeb_api.calls if 'works' not in call.request.url]
+        assert all('offset=2&' not in url for url in users_requested)
+
+    def test_resume_with_other_settings(self, skeb_api, tmp_path):
+        output_dir = str(tmp_path)
+        crawl_users_shard(output_dir, 0, 3, page_size=2, client=SkebClient())
+        assert load_checkpoint(output_dir, 0)['num_shards'] == 3
+
+        with pytest.raises(ValueError, match='num_shards 3 saved but 2 given'):
+            crawl_users_shard(output_dir, 0, 2, page_size=2, client=SkebClient())
+        with pytest.raises(ValueError, match='user_sort'):
+            crawl_users_shard(output_dir, 0, 3, user_sort='date', page_size=2, client=SkebClient())
+        with pytest.raises(ValueError, match='page_size'):
+            crawl_users_shard(output_dir, 0, 3, page_size=3, client=SkebClient())
+
+        # checked before starting any worker
+        with pytest.raises(ValueError, match='num_shards'):
+            run_sharded_crawl(output_dir, num_shards=2, page_size=2)
@@ -0,0 +1,129 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip('ditk')
+
+from . import sids as sids_module  # noqa: E402
+from .sids import SidCodec, SidStore  # noqa: E402
+
+
+@pytest.fixture()
+def hf_fs(fake_hf_fs, monkeypatch):
+    monkeypatch.setattr(sids_module, 'get_hf_fs', lambda: fake_hf_fs)
+    return fake_hf_fs
+
+
+def _npy(values) -> bytes:
+    with io.BytesIO() as f:
+        np.save(f, np.asarray(values, dtype=np.uint64))
+        return f.getvalue()
+
+
+def _flush(store: SidStore, hf_fs, workdir: str, name: str):
+    hf_fs.commit(store.repository, store.make_operations(workdir, name))
+    store.mark_flushed(name)
+
+
+@pytest.mark.unittest
+class TestPrepareSids:
+    @pytest.mark.parametrize(['sid_format', 'sid'], [
+        ('suit_{}', 'suit_0'),
+        ('suit_{}', 'suit_114514'),
+        ('suit_{}', f'suit_{2 ** 64 - 1}'),
+        ('act_{}_lottery_{}', 'act_0_lottery_0'),
+        ('act_{}_lottery_{}', 'act_12_lottery_34'),
+        ('act_{}_lottery_{}', f'act_{2 ** 32 - 1}_lottery_{2 ** 32 - 1}'),
+    ])
+    def test_codec_round_trip(self, sid_format, sid):
+        codec = SidCodec(sid_format)
+        value = codec.encode(sid)
+        assert 0 <= value < 2 ** 64
+        assert codec.decode(value) == sid
+        assert codec.decode(np.uint64(value)) == sid
+
+    def test_codec_two_fields_distinct(self):
+        codec = SidCodec('act_{}_lottery_{}')
+        assert codec.encode('act_1_lottery_2') != codec.encode('act_2_lottery_1')
+        assert codec.encode('act_1_lottery_2') == (1 << 32) | 2
+
+    @pytest.mark.parametrize(['sid_format', 'sid'], [
+        ('suit_{}', 'lottery_1'),
+        ('suit_{}', 'suit_x'),
+        ('suit_{}', f'suit_{2 ** 64}'),
+        ('act_{}_lottery_{}', 'act_1'),
+        ('act_{}_lottery_{}', f'act_{2 ** 32}_lottery_1'),
+        ('act_{}_lottery_{}', f'act_1_lottery_{2 ** 32}'),
+    ])
+    def test_codec_invalid(self, sid_format, sid):
+        with pytest.raises(ValueError):
+            SidCodec(sid_format).encode(sid)
+
+    def test_codec_invalid_format(self):
+        with pytest.raises(ValueError):
+            SidCodec('suit')
+        with pytest.raises(ValueError):
+            SidCodec('{}_{}_{}')
+
+    def test_migrate_legacy(self, hf_fs, tmp_path):
+        hf_fs.files['datasets/repo/exist_sids.json'] = json.dumps(['suit_3', 'suit_1', 'suit_2']).encode()
+        store = SidStore('repo')
+        assert len(store) == 3
+        assert 'suit_2' in store
+        assert 'suit_4' not in store
+
+        store.add('suit_4')
+        store.add('suit_1')
+        assert store.pending_count == 1
+        # compacted on the first flush, the legacy file is removed
+        _flush(store, hf_fs, str(tmp_path), 'delta_1')
+        assert hf_fs.commits[-1] == ['exist_sids.npy', 'exist_sids.json']
+        assert 'datasets/repo/exist_sids.json' not in hf_fs.files
+        assert np.load(io.BytesIO(hf_fs.files['datasets/repo/exist_sids.npy'])).tolist() == [1, 2, 3, 4]
+
+        reloaded = SidStore('repo')
+        assert len(reloaded) == 4
+        assert all(f'suit_{i}' in reloaded for i in range(1, 5))
+
+    def test_delta_append(self, hf_fs, tmp_path):
+        hf_fs.files['datasets/repo/exist_sids.npy'] = _npy([1, 2])
+        store = SidStore('repo')
+        store.add('suit_5')
+        store.add('suit_3')
+        _flush(store, hf_fs, str(tmp_path), 'delta_1')
+        assert hf_fs.commits[-1] == ['exist_sids/delta_1.npy']
+        assert np.load(io.BytesIO(hf_fs.files['datasets/repo/exist_sids/delta_1.npy'])).tolist() == [3, 5]
+        assert store.pending_count == 0
+        assert len(store) == 4
+
+        store.add('suit_4')
+        _flush(store, hf_fs, str(tmp_path), 'delta_2')
+        assert hf_fs.commits[-1] == ['exist_sids/delta_2.npy']
+
+        reloaded = SidStore('repo')
+        assert len(reloaded) == 5
+        assert all(f'suit_{i}' in reloaded for i in range(1, 6))
+
+    def test_compaction(self, hf_fs, tmp_path):
+        hf_fs.files['datasets/repo/exist_sids.npy'] = _npy([0])
+        store = SidStore('repo', max_deltas=2)
+        for i in range(1, 4):
+            store.add(f'suit_{i}')
+            _flush(store, hf_fs, str(tmp_path / str(i)), f'delta_{i}')
+
+        # the third flush is past max_deltas, the deltas are merged into the base
+        assert hf_fs.commits == [
+            ['exist_sids/delta_1.npy'],
+            ['exist_sids/delta_2.npy'],
+            ['exist_sids.npy', 'exist_sids/delta_1.npy', 'exist_sids/delta_2.npy'],
+        ]
+        assert hf_fs.glob('datasets/repo/exist_sids/*.npy') == []
+        assert np.load(io.BytesIO(hf_fs.files['datasets/repo/exist_sids.npy'])).tolist() == [0, 1, 2, 3]
+
+        # starts appending deltas again
+        store.add('suit_4')
+        _flush(store, hf_fs, str(tmp_path / '4'), 'delta_4')
+        assert hf_fs.commits[-1] == ['exist_sids/delta_4.npy']
+        assert len(SidStore('repo', max_deltas=2)) == 5
@@ -0,0 +1,74 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+pytest.importorskip('PIL')
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from .thumbs import image_phash, make_thumbnail_and_hash, create_thumbnails  # noqa: E402
+
+
+def _hamming(x: str, y: str) -> int:
+    return bin(int(x, 16) ^ int(y, 16)).count('1')
+
+
+def _make_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    rs = np.random.RandomState(seed)
+    # smooth random pattern, so that the resized copies are similar
+    pattern = rs.rand(8, 8, 3) * 255
+    return Image.fromarray(pattern.astype(np.uint8)).resize((width, height), Image.BICUBIC)
+
+
+@pytest.mark.unittest
+class TestPrepareThumbs:
+    def test_image_phash(self):
+        image = _make_image(640, 480)
+        phash = image_phash(image)
+        assert len(phash) == 16
+        assert _hamming(phash, image_phash(image.resize((320, 240)))) <= 4
+        assert _hamming(phash, image_phash(_make_image(640, 480, seed=1))) > 10
+
+    def test_make_thumbnail_and_hash(self, tmp_path):
+        image = _make_image(2000, 1000)
+        png_file, jpg_file = str(tmp_path / 'image.png'), str(tmp_path / 'image.jpg')
+        image.save(png_file)
+        image.save(jpg_file, quality=95)
+
+        png_hash, png_thumbnail = make_thumbnail_and_hash(png_file, size=256)
+        jpg_hash, jpg_thumbnail = make_thumbnail_and_hash(jpg_file, size=256)
+        with Image.open(io.BytesIO(png_thumbnail)) as thumbnail:
+            assert thumbnail.format == 'WEBP'
+            assert thumbnail.size == (256, 128)
+        with Image.open(io.BytesIO(jpg_thumbnail)) as thumbnail:
+            assert thumbnail.size == (256, 128)
+        assert _hamming(png_hash, jpg_hash) <= 4
+
+        text_file = str(tmp_path / 'text.png')
+        with open(text_file, 'w') as f:
+            f.write('not an image')
+        assert make_thumbnail_and_hash(text_file) == (None, None)
+
+    def test_create_thumbnails(self, tmp_path):
+        files = []
+        for i in range(5):
+            filename = str(tmp_path / 'images' / f'{i}.png')
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            _make_image(300, 200, seed=i).save(filename)
+            files.append((str(i), filename))
+        broken_file = str(tmp_path / 'images' / 'broken.png')
+        with open(broken_file, 'wb') as f:
+            f.write(b'broken')
+        files.append(('broken', broken_file))
+
+        thumb_tar_file = str(tmp_path / 'thumbs' / 'pack.tar')
+        result = create_thumbnails(files, thumb_tar_file, size=64, max_workers=2)
+        assert sorted(result) == ['0', '1', '2', '3', '4']
+        with tarfile.open(thumb_tar_file) as tar:
+            assert sorted(tar.getnames()) == [f'{i}.webp' for i in range(5)]
+        phash, thumbnail_file = result['3']
+        assert thumbnail_file == '3.webp'
+        assert phash == make_thumbnail_and_hash(files[3][1], size=64)[0]
@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+xurls = pytest.importorskip('xurls')
+
+from .url import extract_urls, normalize_url  # noqa: E402
+
+_HOSTS = {'drive.google.com', 'imgur.com', 'dropbox.com', 'www.dropbox.com'}
+
+
+def _post_bodies(count: int = 500):
+    rnd = random.Random(count)
+    links = [
+        'https://drive.google.com/file/d/1AbCdEfGhIjK/view?usp=sharing',
+        'https://imgur.com/a/XyZ123',
+        'https://www.dropbox.com/s/abcdef/pack.zip?dl=0',
+        'https://twitter.com/artist/status/1234567890',
+        'https://www.pixiv.net/users/114514',
+        'https://fanbox.cc/@artist',
+    ]
+    bodies = []
+    for _ in range(count):
+        lines = ['いつもお世話になっております。キャラクターの立ち絵をお願いします。' * rnd.randint(1, 6)]
+        for _ in range(rnd.choice([0, 0, 0, 1, 2])):
+            lines.append(f'参考資料：{rnd.choice(links)}')
+        bodies.append('\n'.join(lines))
+    return bodies
+
+
+_CORPUS = _post_bodies()
+
+
+@pytest.mark.unittest
+class TestPrepareUrl:
+    def test_extract_urls(self):
+        text = '資料 https://drive.google.com/file/d/abc/view?usp=sharing）と HTTPS://WWW.Dropbox.com/s/x/y.zip?dl=0#top\n' \
+               'http://imgur.com/a/xyz https://twitter.com/a/status/1 https://drive.google.com/file/d/abc/view?usp=sharing'
+        assert extract_urls(text) == [
+            'http://imgur.com/a/xyz',
+            'https://drive.google.com/file/d/abc/view?usp=sharing',
+            'https://twitter.com/a/status/1',
+            'https://www.dropbox.com/s/x/y.zip?dl=0',
+        ]
+        assert extract_urls(text, hosts=_HOSTS, fn_check=lambda x: 'dropbox' not in x) == [
+            'http://imgur.com/a/xyz',
+            'https://drive.google.com/file/d/abc/view?usp=sharing',
+        ]
+        assert extract_urls('see https://twitter.com/a/status/1', hosts=_HOSTS) == []
+
+    def test_normalize_url(self):
+        assert normalize_url('HTTPS://Imgur.COM/a/XyZ#frag') == 'https://imgur.com/a/XyZ'
+
+
+@pytest.mark.benchmark
+class TestPrepareUrlBenchmark:
+    def test_extract_urls_all(self, benchmark):
+        benchmark.group = 'extract_urls'
+        benchmark(lambda: [extract_urls(body) for body in _CORPUS])
+
+    def test_extract_urls_known_hosts(self, benchmark):
+        benchmark.group = 'extract_urls'
+        benchmark(lambda: [extract_urls(body, hosts=_HOSTS) for body in _CORPUS])
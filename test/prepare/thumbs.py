@@ -0,0 +1,88 @@
+import io
+import os
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple, List, Dict
+
+import numpy as np
+from PIL import Image
+
+# the images larger than this are not decoded for thumbnails, unless they can be decoded in reduced scale (jpeg)
+MAX_THUMBNAIL_PIXELS = 17000 ** 2
+
+
+@lru_cache()
+def _dct_matrix(n: int) -> np.ndarray:
+    k, i = np.arange(n)[:, None], np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+
+
+def image_phash(image: Image.Image, hash_size: int = 8, highfreq_factor: int = 4) -> str:
+    """
+    Perceptual hash of the image, the signs of the low frequency DCT coefficients compared with their median.
+
+    :return: The 64-bit hash in 16 hex digits (when ``hash_size`` is 8).
+    """
+    size = hash_size * highfreq_factor
+    pixels = np.asarray(image.convert('L').resize((size, size), Image.LANCZOS), dtype=np.float64)
+    matrix = _dct_matrix(size)
+    low = (matrix @ pixels @ matrix.T)[:hash_size, :hash_size]
+    bits = (low > np.median(low)).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+def make_thumbnail_and_hash(filepath: str, size: int = 256, quality: int = 80) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    Make the webp thumbnail and the perceptual hash of the image in one decoding pass.
+    The jpeg images are decoded in reduced scale by ``draft``.
+
+    :return: The perceptual hash and the thumbnail bytes, ``(None, None)`` when it cannot be decoded.
+    """
+    try:
+        with Image.open(filepath) as image:
+            if image.format != 'JPEG' and image.width * image.height > MAX_THUMBNAIL_PIXELS:
+                return None, None
+            image.draft('RGB', (size, size))
+            image = image.convert('RGB')
+            image.thumbnail((size, size))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None, None
+
+    with io.BytesIO() as f:
+        image.save(f, format='webp', quality=quality)
+        thumbnail = f.getvalue()
+    return image_phash(image), thumbnail
+
+
+def _make_thumbnail_and_hash(args):
+    return make_thumbnail_and_hash(*args)
+
+
+def create_thumbnails(files: List[Tuple[str, str]], thumb_tar_file: str, size: int = 256,
+                      max_workers: Optional[int] = None) -> Dict[str, Tuple[str, str]]:
+    """
+    Create the thumbnails shard of the images with a process pool.
+
+    :param files: Names of the thumbnails in shard (without extension) and paths of the images.
+    :param thumb_tar_file: Tar file of the thumbnails.
+    :param size: Max width and height of the thumbnails.
+    :param max_workers: Max worker processes, cpu count by default.
+    :return: Mapping of the names to the perceptual hashes and the names of thumbnails in shard,
+        the images cannot be decoded are not included.
+    """
+    if os.path.dirname(thumb_tar_file):
+        os.makedirs(os.path.dirname(thumb_tar_file), exist_ok=True)
+
+    retval = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, tarfile.open(thumb_tar_file, 'w') as tar:
+        results = executor.map(_make_thumbnail_and_hash, [(filepath, size) for _, filepath in files], chunksize=8)
+        for (name, _), (phash, thumbnail) in zip(files, results):
+            if phash is None:
+                continue
+            info = tarfile.TarInfo(f'{name}.webp')
+            info.size = len(thumbnail)
+            tar.addfile(info, io.BytesIO(thumbnail))
+            retval[name] = (phash, info.name)
+
+    return retval
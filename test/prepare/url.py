@@ -1,15 +1,55 @@
-from typing import List
+from typing import List, Optional, Callable, Iterable
+from urllib.parse import urlsplit, urlunsplit
 
 import xurls
 
+# compiled once, matches both http and https urls in one pass
+_EXTRACTOR = xurls.StrictScheme(r'https?://')
 
-def extract_urls(text) -> List[str]:
-    extractors = [
-        xurls.StrictScheme('https://'),
-        xurls.StrictScheme('http://'),
-    ]
-    urls = []
-    for extractor in extractors:
-        urls.extend(extractor.findall(text))
 
-    return sorted(set(urls))
+def _mentions_host(line: str, hosts) -> bool:
+    line = line.lower()
+    return any(host in line for host in hosts)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize the url, the scheme and host are lowercased and the fragment is dropped.
+    """
+    splitted = urlsplit(url)
+    return urlunsplit((splitted.scheme.lower(), splitted.netloc.lower(), splitted.path, splitted.query, ''))
+
+
+def extract_urls(text, hosts: Optional[Iterable[str]] = None,
+                 fn_check: Optional[Callable[[str], bool]] = None) -> List[str]:
+    """
+    Extract the normalized urls from text.
+
+    :param text: Text to scan.
+    :param hosts: Only keep the urls of these hosts. Only the lines mentioning any of them are
+        scanned by the extractor, urls never span lines.
+    :param fn_check: Only keep the urls accepted by this function.
+    :return: Sorted list of unique urls.
+    """
+    if hosts is not None:
+        hosts = set(hosts)
+        text = '\n'.join(
+            line for line in text.splitlines()
+            if _mentions_host(line, hosts)
+        )
+        if not text:
+            return []
+
+    urls = set()
+    for url in _EXTRACTOR.findall(text):
+        try:
+            url = normalize_url(url)
+        except ValueError:  # malformed netloc
+            continue
+        if hosts is not None and urlsplit(url).hostname not in hosts:
+            continue
+        if fn_check is not None and not fn_check(url):
+            continue
+        urls.add(url)
+
+    return sorted(urls)
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+import requests
+import responses
+
+from pyskeb.models import Work
+from pyskeb.utils import json_loads, response_json, get_json_backend, set_json_backend
+from pyskeb.utils.jsons import get_json_backends
+from ..benchmark.payloads import skeb_works_payload, danbooru_artists_payload
+
+_PAYLOADS = {
+    'skeb_works': json.dumps(skeb_works_payload(), ensure_ascii=False).encode(),
+    'danbooru_artists': json.dumps(danbooru_artists_payload(), ensure_ascii=False).encode(),
+}
+
+
+@pytest.fixture()
+def reset_backend():
+    try:
+        yield
+    finally:
+        set_json_backend(None)
+
+
+@pytest.mark.unittest
+class TestUtilsJsons:
+    @pytest.mark.parametrize('backend', get_json_backends())
+    def test_json_loads(self, backend):
+        for data in _PAYLOADS.values():
+            assert json_loads(data, backend=backend) == json.loads(data)
+        assert json_loads('{"a": [1, 2]}', backend=backend) == {'a': [1, 2]}
+        with pytest.raises(ValueError):
+            json_loads(b'{"a": ', backend=backend)
+
+    def test_json_loads_factory(self):
+        assert json_loads(b'[{"a": 1}, {"a": 2}]', factory=lambda x: x['a']) == [1, 2]
+        assert json_loads(b'{"a": 1}', factory=lambda x: x['a']) == 1
+
+    def test_set_json_backend(self, reset_backend):
+        set_json_backend('json')
+        assert get_json_backend() == 'json'
+        with pytest.raises(ValueError):
+            set_json_backend('simdjson')
+        set_json_backend(None)
+        assert get_json_backend() == get_json_backends()[0]
+
+    @responses.activate
+    def test_response_json(self):
+        responses.add(responses.GET, 'https://skeb.jp/api/works', body=_PAYLOADS['skeb_works'],
+                      content_type='application/json; charset=utf-8')
+        responses.add(responses.GET, 'https://skeb.jp/api/broken', body=b'<html></html>',
+                      content_type='text/html')
+
+        resp = requests.get('https://skeb.jp/api/works')
+        assert response_json(resp) == resp.json()
+        with pytest.raises(requests.exceptions.JSONDecodeError):
+            response_json(requests.get('https://skeb.jp/api/broken'))
+
+    @responses.activate
+    def test_response_json_factory_error(self):
+        responses.add(responses.GET, 'https://skeb.jp/api/works', json=[{'path': '/@user/works/1'}])
+        responses.add(responses.GET, 'https://skeb.jp/api/changed', json=[{'path': '/users/user/works/1'}])
+
+        works = response_json(requests.get('https://skeb.jp/api/works'), factory=Work.from_json)
+        assert [(work.username, work.work_id) for work in works] == [('user', 1)]
+        # the body is valid, the error of the unexpected path is raised as it is
+        with pytest.raises(ValueError, match='Invalid work path') as ei:
+            response_json(requests.get('https://skeb.jp/api/changed'), factory=Work.from_json)
+        assert not isinstance(ei.value, requests.exceptions.JSONDecodeError)
+
+
+@pytest.mark.benchmark
+class TestUtilsJsonsBenchmark:
+    @pytest.mark.parametrize('payload', sorted(_PAYLOADS))
+    @pytest.mark.parametrize('backend', get_json_backends())
+    def test_json_loads(self, benchmark, backend, payload):
+        benchmark.group = f'json_loads-{payload}'
+        benchmark(json_loads, _PAYLOADS[payload], backend=backend)
@@ -0,0 +1,160 @@
+import json
+
+import pytest
+import requests
+import responses
+from urllib3 import HTTPResponse
+
+from pyskeb.utils import RequestMetrics, RetryPolicy, enable_request_metrics, disable_request_metrics, \
+    get_request_metrics, get_requests_session
+from pyskeb.utils.metrics import _endpoint
+from pyskeb.utils.session import srequest, _AttemptTracker, _MetricsRetry, _attempts
+
+
+@pytest.fixture()
+def global_metrics():
+    try:
+        yield enable_request_metrics()
+    finally:
+        disable_request_metrics()
+
+
+@pytest.mark.unittest
+class TestUtilsMetrics:
+    def test_endpoint(self):
+        assert _endpoint('/api/users/@xxx/works/12') == '/api/users/@{user}/...'
+        assert _endpoint('/api/works/12') == '/api/works/{id}'
+        assert _endpoint('/@xxx/works/12') == '/@{user}/works/{id}'
+        assert _endpoint('') == '/'
+
+    def test_record(self):
+        metrics = RequestMetrics(buckets=(0.1, 1.0))
+        assert metrics.buckets == (0.1, 1.0, float('inf'))
+        metrics.record_response('https://skeb.jp/api/works/1', 200, 0.05, 100)
+        metrics.record_response('https://skeb.jp/api/works/2', 200, 0.5, 50)
+        metrics.record_error('https://skeb.jp/api/works/3', requests.exceptions.ConnectionError(), 3.0)
+        metrics.record_retry('https://skeb.jp/api/works/3', 'error', 2.0)
+
+        summary, = metrics.summary()
+        assert summary['host'] == 'skeb.jp'
+        assert summary['endpoint'] == '/api/works/{id}'
+        assert summary['requests'] == 3
+        assert summary['statuses'] == {'200': 2}
+        assert summary['errors'] == {'ConnectionError': 1}
+        assert summary['bytes'] == 150
+        assert summary['latency_p50'] == 1.0
+        assert summary['latency_p99'] == float('inf')
+        assert summary['retries'] == {'error': 1}
+        assert summary['retry_wait'] == {'error': 2.0}
+        assert json.loads(metrics.to_json())['endpoints'][0]['requests'] == 3
+
+        text = metrics.to_prometheus()
+        labels = 'host="skeb.jp",endpoint="/api/works/{id}"'
+        assert f'pyskeb_http_requests_total{{{labels},status="200"}} 2' in text
+        assert f'pyskeb_http_errors_total{{{labels},error="ConnectionError"}} 1' in text
+        assert f'pyskeb_http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1' in text
+        assert f'pyskeb_http_request_duration_seconds_bucket{{{labels},le="1.0"}} 2' in text
+        assert f'pyskeb_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+        assert f'pyskeb_http_request_duration_seconds_count{{{labels}}} 3' in text
+        assert f'pyskeb_http_retries_total{{{labels},reason="error"}} 1' in text
+
+        metrics.reset()
+        assert metrics.summary() == []
+
+    @responses.activate
+    def test_session_metrics(self):
+        responses.add(responses.GET, 'https://skeb.jp/api/users/@xxx', json={'ok': True})
+        metrics = RequestMetrics()
+        session = get_requests_session(metrics=metrics)
+        for _ in range(3):
+            session.get('https://skeb.jp/api/users/@xxx')
+
+        summary, = metrics.summary()
+        assert summary['endpoint'] == '/api/users/@{user}'
+        assert summary['statuses'] == {'200': 3}
+        assert get_request_metrics() is None
+
+    @responses.activate
+    def test_session_bytes(self):
+        # no Content-Length, the bytes actually read are counted
+        responses.add(responses.GET, 'https://example.com/file', body=b'x' * 10000)
+        metrics = RequestMetrics()
+        session = get_requests_session(metrics=metrics)
+        assert len(session.get('https://example.com/file').content) == 10000
+        resp = session.get('https://example.com/file', stream=True)
+        assert 'Content-Length' not in resp.headers
+        assert sum(len(chunk) for chunk in resp.iter_content(1024)) == 10000
+
+        summary, = metrics.summary()
+        assert summary['requests'] == 2
+        assert summary['bytes'] == 20000
+
+    @responses.activate
+    def test_session_retries(self):
+        responses.add(responses.GET, 'https://example.com/api', status=503)
+        responses.add(responses.GET, 'https://example.com/api', status=429, headers={'Retry-After': '0'})
+        responses.add(responses.GET, 'https://example.com/api', json={'ok': True})
+        metrics = RequestMetrics()
+        # retried inside urllib3, each attempt is recorded
+        assert get_requests_session(metrics=metrics).get('https://example.com/api').json() == {'ok': True}
+
+        summary, = metrics.summary()
+        assert summary['requests'] == 3
+        assert summary['statuses'] == {'200': 1, '429': 1, '503': 1}
+        assert summary['errors'] == {}
+        assert summary['retries'] == {'rate_limit': 1, 'status': 1}
+
+    @responses.activate
+    def test_session_retries_exhausted(self):
+        responses.add(responses.GET, 'https://example.com/api', status=503)
+        metrics = RequestMetrics()
+        with pytest.raises(requests.exceptions.RetryError):
+            get_requests_session(max_retries=1, metrics=metrics).get('https://example.com/api')
+
+        summary, = metrics.summary()
+        assert summary['requests'] == 2
+        assert summary['statuses'] == {'503': 2}
+        assert summary['errors'] == {}
+        assert summary['retries'] == {'status': 1}
+
+    def test_retry_sleep(self):
+        metrics = RequestMetrics()
+        tracker = _AttemptTracker(metrics, 'https://example.com/api')
+        _attempts.tracker = tracker
+        try:
+            response = HTTPResponse(status=429, headers={'Retry-After': '0'})
+            retry = _MetricsRetry(total=3, status_forcelist=[429])
+            retry = retry.increment('GET', '/api', response=response)
+            retry.sleep(response)
+        finally:
+            _attempts.tracker = None
+
+        summary, = metrics.summary()
+        assert summary['statuses'] == {'429': 1}
+        assert summary['retries'] == {'rate_limit': 1}
+        assert 'rate_limit' in summary['retry_wait']
+        assert tracker.latency() < 0.5
+
+    @responses.activate
+    def test_srequest_retries(self, global_metrics):
+        responses.add(responses.GET, 'https://example.com/api', status=503)
+        responses.add(responses.GET, 'https://example.com/api', status=429, headers={'Retry-After': '0'})
+        responses.add(responses.GET, 'https://example.com/api', body=requests.exceptions.ConnectionError('boom'))
+        responses.add(responses.GET, 'https://example.com/api', json={'ok': True})
+        policy = RetryPolicy(max_retries=5, base_delay=0.01, max_delay=0.05)
+        resp = srequest(get_requests_session(max_retries=0), 'GET', 'https://example.com/api', retry_policy=policy)
+        assert resp.json() == {'ok': True}
+
+        summary, = global_metrics.summary()
+        assert summary['requests'] == 4
+        assert summary['statuses'] == {'200': 1, '429': 1, '503': 1}
+        assert summary['errors'] == {'ConnectionError': 1}
+        assert summary['retries'] == {'error': 1, 'rate_limit': 1, 'status': 1}
+
+    def test_reporter(self, tmp_path):
+        metrics = RequestMetrics()
+        metrics.record_response('https://skeb.jp/api', 200, 0.1)
+        reporter = metrics.start_reporter(interval=60, filename=str(tmp_path / 'metrics.json'))
+        reporter.stop()
+        with open(tmp_path / 'metrics.json') as f:
+            assert json.load(f)['endpoints'][0]['requests'] == 1
@@ -0,0 +1,245 @@
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+import responses
+
+from pyskeb.utils import ProxyPool, RetryPolicy, get_requests_session
+from pyskeb.utils.session import srequest
+
+
+def _make_proxy_server(status_code: int = 200):
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = self.server.server_address[1].__str__().encode()
+            self.send_response(status_code)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _dead_proxy():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}'
+
+
+@pytest.fixture()
+def proxy_servers():
+    servers = [_make_proxy_server(200), _make_proxy_server(429)]
+    try:
+        yield servers
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+@pytest.mark.unittest
+class TestUtilsSessionProxyPool:
+    def test_proxy_pool(self, proxy_servers):
+        good, limited = proxy_servers
+        good_proxy = f'http://127.0.0.1:{good.server_address[1]}'
+        limited_proxy = f'http://127.0.0.1:{limited.server_address[1]}'
+        dead_proxy = _dead_proxy()
+        pool = ProxyPool([good_proxy, limited_proxy, dead_proxy], max_failures=1, timeout=5)
+
+        for _ in range(30):
+            resp = srequest(pool, 'GET', 'http://example.invalid/api', max_retries=10)
+            assert resp.status_code == 200
+            assert resp.text == str(good.server_address[1])
+
+        states = {state.proxy: state for state in pool.states}
+        assert not states[good_proxy].is_ejected()
+        assert states[good_proxy].failures == 0
+        assert states[good_proxy].requests >= 30
+        assert states[limited_proxy].rate_limit_rate > 0.0
+        assert states[limited_proxy].score > states[good_proxy].score
+        assert states[dead_proxy].is_ejected()
+
+    def test_proxy_pool_all_ejected(self):
+        pool = ProxyPool([_dead_proxy()], max_failures=1, timeout=5)
+        with pytest.raises(requests.exceptions.ProxyError):
+            srequest(pool, 'GET', 'http://example.invalid/api', max_retries=3)
+        state, = pool.states
+        assert state.is_ejected()
+        assert state.ejections == 3
+
+    def test_proxy_pool_empty(self):
+        with pytest.raises(ValueError):
+            ProxyPool([])
+
+
+@pytest.mark.unittest
+class TestUtilsSessionRetryPolicy:
+    def test_parse_retry_after(self):
+        assert RetryPolicy.parse_retry_after(None) is None
+        assert RetryPolicy.parse_retry_after('') is None
+        assert RetryPolicy.parse_retry_after('120') == 120.0
+        assert RetryPolicy.parse_retry_after('not a date') is None
+        assert 55 <= RetryPolicy.parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+        assert RetryPolicy.parse_retry_after(formatdate(time.time() - 60, usegmt=True)) == 0.0
+
+    def test_next_delay(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+        assert policy.next_delay() == 1.0
+        delay = None
+        for _ in range(100):
+            delay = policy.next_delay(delay)
+            assert 1.0 <= delay <= 10.0
+
+    @responses.activate
+    def test_srequest_status_retry(self):
+        responses.add(responses.GET, 'https://example.com/api', status=503)
+        responses.add(responses.GET, 'https://example.com/api', status=429, headers={'Retry-After': '0'})
+        responses.add(responses.GET, 'https://example.com/api', json={'ok': True})
+        policy = RetryPolicy(max_retries=5, base_delay=0.01, max_delay=0.05)
+        resp = srequest(requests.session(), 'GET', 'https://example.com/api', retry_policy=policy)
+        assert resp.json() == {'ok': True}
+        assert len(responses.calls) == 3
+
+    @responses.activate
+    def test_srequest_no_retry_on_client_error(self):
+        responses.add(responses.GET, 'https://example.com/api', status=404)
+        policy = RetryPolicy(max_retries=5, base_delay=0.01)
+        with pytest.raises(requests.exceptions.HTTPError):
+            srequest(requests.session(), 'GET', 'https://example.com/api', retry_policy=policy)
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_srequest_error(self):
+        responses.add(responses.GET, 'https://example.com/api', body=requests.exceptions.ConnectionError('boom'))
+        policy = RetryPolicy(max_retries=3, base_delay=0.01)
+        with pytest.raises(requests.exceptions.ConnectionError):
+            srequest(requests.session(), 'GET', 'https://example.com/api', retry_policy=policy)
+        assert len(responses.calls) == 3
+
+    @responses.activate
+    def test_srequest_deadline(self):
+        responses.add(responses.GET, 'https://example.com/api', status=503, headers={'Retry-After': '30'})
+        policy = RetryPolicy(max_retries=5, base_delay=0.01, deadline=1.0)
+        start_time = time.time()
+        resp = srequest(requests.session(), 'GET', 'https://example.com/api',
+                        retry_policy=policy, raise_for_status=False)
+        assert resp.status_code == 503
+        assert len(responses.calls) == 1
+        assert time.time() - start_time < 1.0
+
+
+def _make_web_server(ssl_context: ssl.SSLContext = None):
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path.startswith('/slow'):
+                time.sleep(2)
+            body = b'x' * 100000 if self.path.startswith('/large') else self.path.encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Set-Cookie', 'token=abc; Path=/')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    if ssl_context is not None:
+        server.socket = ssl_context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture()
+def tls_web_server(tmp_path):
+    if not shutil.which('openssl'):
+        pytest.skip('openssl not found.')
+    cert_file, key_file = str(tmp_path / 'cert.pem'), str(tmp_path / 'key.pem')
+    # self-signed, used as the server certificate, the client certificate and the ca of both
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-keyout', key_file, '-out', cert_file, '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+    ], check=True, capture_output=True)
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_file, key_file)
+    context.load_verify_locations(cafile=cert_file)
+    context.verify_mode = ssl.CERT_REQUIRED
+    server = _make_web_server(context)
+    try:
+        yield f'https://127.0.0.1:{server.server_address[1]}', cert_file, key_file
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture()
+def web_server():
+    server = _make_web_server()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.unittest
+class TestUtilsSessionBackend:
+    def test_host_pool_sizes(self):
+        session = get_requests_session(pool_size=16, host_pool_sizes={'skeb.jp': 4})
+        assert session.get_adapter('https://skeb.jp/api/works')._pool_maxsize == 4
+        assert session.get_adapter('https://example.com/')._pool_maxsize == 16
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            get_requests_session(backend='urllib')
+
+    def test_httpx_backend(self, web_server):
+        pytest.importorskip('httpx')
+        from pyskeb.utils.http2 import HttpxHTTPAdapter
+
+        host = web_server.split('://', maxsplit=1)[1]
+        session = get_requests_session(backend='httpx', host_pool_sizes={host: 4})
+        assert isinstance(session.get_adapter(f'{web_server}/'), HttpxHTTPAdapter)
+        assert session.get_adapter(f'{web_server}/').pool_maxsize == 4
+
+        resp = session.get(f'{web_server}/api/works?page=1')
+        resp.raise_for_status()
+        assert resp.text == '/api/works?page=1'
+        assert session.cookies.get('token') == 'abc'
+
+        with session.get(f'{web_server}/large', stream=True) as resp:
+            assert b''.join(resp.iter_content(chunk_size=4096)) == b'x' * 100000
+
+    def test_httpx_backend_cert(self, tls_web_server):
+        pytest.importorskip('httpx')
+        url, cert_file, key_file = tls_web_server
+        session = get_requests_session(backend='httpx')
+        with pytest.raises(requests.exceptions.ConnectionError):
+            session.get(f'{url}/api', verify=cert_file)
+
+        session.cert = (cert_file, key_file)
+        resp = session.get(f'{url}/api', verify=cert_file)
+        resp.raise_for_status()
+        assert resp.text == '/api'
+
+    def test_httpx_backend_timeout(self, web_server):
+        pytest.importorskip('httpx')
+        session = get_requests_session(backend='httpx', timeout=0.5)
+        with pytest.raises(requests.exceptions.Timeout):
+            session.get(f'{web_server}/slow')